@@ -2,13 +2,39 @@
 read in only once, and then re-used from memory.
 
 This includes the :ref:`reddening laws <pysynphot-extinction>`
-(``pysynphot.locations.RedLaws``)
-and some indices for the `~pysynphot.catalog` model atlases
-(``pysynphot.Cache.CATALOG_CACHE``).
+(``pysynphot.locations.RedLaws``),
+some indices for the `~pysynphot.catalog` model atlases
+(``pysynphot.Cache.CATALOG_CACHE``),
+interpolated tables of tabular spectra
+(``pysynphot.Cache.INTERP_CACHE``),
+spectra and bandpasses loaded from reference files
+(``pysynphot.Cache.REFFILE_CACHE``),
+bandpasses built from observation modes
+(``pysynphot.Cache.BANDPASS_CACHE``),
+thermal models of observation modes
+(``pysynphot.Cache.THERMAL_CACHE``),
+detector pixel scales
+(``pysynphot.Cache.DETECTOR_CACHE``),
+binned wavelength sets of the wavelength table
+(``pysynphot.Cache.BINSET_CACHE``),
+optional memory-mapped copies of FITS table columns
+(``pysynphot.Cache.MMAP_DIR``),
+and optional on-disk snapshots of parsed graph and component tables
+and catalog indices (``pysynphot.Cache.SNAPSHOT_DIR``).
 
 """
 from __future__ import division
 
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
 from .locations import RedLaws
 
 # if PYSYN_CDBS is undefined RedLaws will be an empty dictionary
@@ -27,3 +53,441 @@ def reset_catalog_cache():
     global CATALOG_CACHE
 
     CATALOG_CACHE.clear()
+
+
+class LRUCache(object):
+    """Thread-safe least-recently-used cache with a memory budget.
+
+    Each entry is stored with its size in bytes. When the total size
+    exceeds the budget, the least recently used entries are evicted.
+    An entry larger than the whole budget is not stored.
+
+    Parameters
+    ----------
+    maxbytes : int
+        Memory budget in bytes.
+
+    Attributes
+    ----------
+    maxbytes
+        Same as input. It may be changed at any time; the new budget
+        is enforced on the next insertion.
+
+    nbytes : int
+        Total size of the cached entries in bytes.
+
+    hits, misses, evictions : int
+        Lookup and eviction counts since creation or :meth:`clear`.
+
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it as most recently
+        used, or return ``default`` if it is not cached."""
+        with self._lock:
+            try:
+                value, nbytes = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = (value, nbytes)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, nbytes):
+        """Store ``value`` under ``key``, evicting least recently used
+        entries as needed to stay within the budget."""
+        with self._lock:
+            self.pop(key)
+            if nbytes > self.maxbytes:
+                return
+            self._data[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.maxbytes:
+                oldvalue, oldbytes = self._data.popitem(last=False)[1]
+                self.nbytes -= oldbytes
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove ``key`` and return its value, or ``default`` if it
+        is not cached. This does not count as a lookup."""
+        with self._lock:
+            try:
+                value, nbytes = self._data.pop(key)
+            except KeyError:
+                return default
+            self.nbytes -= nbytes
+            return value
+
+    def keys(self):
+        """Return the cached keys, least recently used first."""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return cache statistics.
+
+        Returns
+        -------
+        stats : dict
+            Number of ``entries``, ``nbytes``, ``maxbytes``, ``hits``,
+            ``misses``, and ``evictions``.
+
+        """
+        with self._lock:
+            return {'entries': len(self._data), 'nbytes': self.nbytes,
+                    'maxbytes': self.maxbytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+#: Tables of tabular spectra interpolated onto frequently used
+#: wavelength sets.
+INTERP_CACHE = LRUCache(64 * 1024 * 1024)
+
+
+def reset_interp_cache():
+    """
+    Empty the ``INTERP_CACHE`` global variable.
+    """
+    INTERP_CACHE.clear()
+
+
+#: Spectra and bandpasses loaded from files, keyed by file path, size,
+#: modification time, and loading options. Cached table arrays are
+#: read-only and shared by all objects loaded from the same file.
+REFFILE_CACHE = LRUCache(256 * 1024 * 1024)
+
+
+def reset_reffile_cache():
+    """
+    Empty the ``REFFILE_CACHE`` global variable.
+    """
+    REFFILE_CACHE.clear()
+
+
+def reffile_key(filename, *args):
+    """Return the ``REFFILE_CACHE`` key of a file.
+
+    Parameters
+    ----------
+    filename : str
+        File name.
+
+    args
+        Hashable loading options, e.g., the class and column name.
+
+    Returns
+    -------
+    key : tuple or `None`
+        Absolute path, size, and modification time of the file,
+        the current :data:`MMAP_DIR`, and ``args``. `None` if the file cannot be found
+        (e.g., a URL), in which case it should not be cached.
+
+    """
+    try:
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (filename, st.st_size, st.st_mtime_ns, MMAP_DIR) + args
+
+
+#: Bandpasses built from observation modes, keyed by the canonical
+#: observation mode, graph table, component table, and telescope area.
+#: See `~pysynphot.obsbandpass.ObsBandpass`.
+BANDPASS_CACHE = LRUCache(64 * 1024 * 1024)
+
+
+def reset_bandpass_cache():
+    """
+    Empty the ``BANDPASS_CACHE`` global variable.
+    """
+    BANDPASS_CACHE.clear()
+
+
+#: Thermal models of observation modes, keyed by observation mode,
+#: graph table, component table, and thermal component table.
+#: See `~pysynphot.observationmode.ObservationMode.ThermalSpectrum`.
+THERMAL_CACHE = LRUCache(64 * 1024 * 1024)
+
+
+def reset_thermal_cache():
+    """
+    Empty the ``THERMAL_CACHE`` global variable.
+    """
+    THERMAL_CACHE.clear()
+
+
+#: Tokenized lines of detector files, keyed by file name. See
+#: `~pysynphot.observationmode.ObservationMode.ThermalSpectrum`.
+DETECTOR_CACHE = {}
+
+
+def reset_detector_cache():
+    """
+    Empty the ``DETECTOR_CACHE`` global variable.
+    """
+    DETECTOR_CACHE.clear()
+
+
+#: Binned wavelength sets of observation modes, keyed by their
+#: :ref:`wavelength table <pysynphot-wavelength-table>` entry (and the
+#: size and modification time of the file, if any). Cached arrays are
+#: read-only. See
+#: `~pysynphot.observationmode.BaseObservationMode.bandWave`.
+BINSET_CACHE = LRUCache(16 * 1024 * 1024)
+
+
+def reset_binset_cache():
+    """
+    Empty the ``BINSET_CACHE`` global variable.
+    """
+    BINSET_CACHE.clear()
+
+
+def _env_dir(name):
+    """Return the directory named by an environment variable, created
+    if necessary, or `None` if the variable is not set."""
+    path = os.environ.get(name)
+    if not path:
+        return None
+    path = os.path.abspath(os.path.expanduser(path))
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    except OSError:
+        # Writes to it fail later and fall back to not caching.
+        pass
+    return path
+
+
+#: Directory holding native-endian copies of FITS table columns, or
+#: `None` to disable memory mapping (the default). Set it with
+#: :func:`set_mmap_dir` or the ``PYSYN_MMAP_DIR`` environment variable.
+MMAP_DIR = _env_dir('PYSYN_MMAP_DIR')
+
+
+def set_mmap_dir(path=None):
+    """Enable or disable memory-mapped loading of FITS tables.
+
+    When enabled, each column read by tabular spectra and bandpasses
+    is written once to ``path`` as a native-endian ``.npy`` file and
+    then loaded as a read-only memory-mapped array. Processes that use
+    the same directory share the pages through the operating system
+    page cache instead of each holding a private copy. Columns that
+    need unit conversion are still converted to private arrays.
+
+    Stored columns are keyed by the file path, size, and modification
+    time, so a changed file is read again. The directory is never
+    cleaned automatically.
+
+    Parameters
+    ----------
+    path : str or `None`
+        Directory to use; it is created if necessary. If `None`,
+        columns are copied into memory as usual.
+
+    """
+    global MMAP_DIR
+
+    if path is not None:
+        path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    MMAP_DIR = path
+
+
+def _mmap_path(filename, ext, name):
+    """Return the path of the stored copy of a FITS table column."""
+    filename = os.path.abspath(filename)
+    st = os.stat(filename)
+    key = '%s|%d|%d|%d|%s' % (filename, st.st_size, st.st_mtime_ns,
+                              ext, name.lower())
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(MMAP_DIR, digest + '.npy')
+
+
+def read_columns(hdulist, names, ext=1):
+    """Read columns from a FITS table.
+
+    Without :data:`MMAP_DIR`, the columns are copied out of the file,
+    so that it can be closed. Otherwise, read-only memory-mapped
+    native-endian arrays are returned (see :func:`set_mmap_dir`).
+
+    Parameters
+    ----------
+    hdulist : `astropy.io.fits.HDUList`
+        Opened FITS file.
+
+    names : list of str
+        Column names (case-insensitive).
+
+    ext : int
+        Extension with the table.
+
+    Returns
+    -------
+    columns : list of array_like
+        Column data, in the order of ``names``.
+
+    """
+    data = hdulist[ext].data
+    filename = hdulist.filename()
+    if MMAP_DIR is None or filename is None:
+        return [data.field(name).copy() for name in names]
+
+    columns = []
+    for name in names:
+        path = _mmap_path(filename, ext, name)
+        try:
+            col = np.load(path, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            col = data.field(name)
+            col = col.astype(col.dtype.newbyteorder('='))
+
+            # Write to a temporary file first, so that other processes
+            # never see a partial file.
+            tmpname = None
+            try:
+                fd, tmpname = tempfile.mkstemp(suffix='.npy', dir=MMAP_DIR)
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, col)
+                os.replace(tmpname, path)
+                col = np.load(path, mmap_mode='r')
+            except OSError as e:
+                if tmpname is not None and os.path.exists(tmpname):
+                    os.remove(tmpname)
+                warnings.warn('Cannot store column {0} of {1} in {2}: {3}; '
+                              'reading it into memory.'.format(
+                                  name, filename, MMAP_DIR, e))
+                col = data.field(name).copy()
+        columns.append(col)
+    return columns
+
+
+#: Directory holding snapshots of parsed graph, component, and thermal
+#: tables, or `None` to disable them (the default). Set it with
+#: :func:`set_snapshot_dir` or the ``PYSYN_SNAPSHOT_DIR`` environment
+#: variable.
+SNAPSHOT_DIR = _env_dir('PYSYN_SNAPSHOT_DIR')
+
+# Bump when the layout of stored snapshots changes.
+_SNAPSHOT_VERSION = 1
+
+
+def set_snapshot_dir(path=None):
+    """Enable or disable on-disk snapshots of parsed tables.
+
+    When enabled, `~pysynphot.tables.GraphTable` and
+    `~pysynphot.tables.CompTable` store their parsed contents (the
+    graph index and resolved component file names), and
+    `~pysynphot.catalog.Icat` the parameter grids of catalogs, in
+    ``path`` the first time a table is read. Later processes load the
+    snapshot instead of parsing the FITS table again.
+
+    Snapshots are keyed by the file path, size, and modification
+    time, so a changed table is read again. Resolved file names are
+    redone when ``pysynphot.locations.CONVERTDICT`` or the
+    environment variables they depend on change. The directory is
+    never cleaned automatically. Snapshots are pickles, so only use a
+    directory that is not writable by untrusted users.
+
+    Parameters
+    ----------
+    path : str or `None`
+        Directory to use; it is created if necessary. If `None`,
+        tables are parsed as usual.
+
+    """
+    global SNAPSHOT_DIR
+
+    if path is not None:
+        path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    SNAPSHOT_DIR = path
+
+
+def _snapshot_path(filename, kind):
+    """Return the path of the stored snapshot of a parsed table."""
+    filename = os.path.abspath(filename)
+    st = os.stat(filename)
+    key = '%s|%d|%d|%s|%d' % (filename, st.st_size, st.st_mtime_ns,
+                              kind, _SNAPSHOT_VERSION)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, digest + '.pkl')
+
+
+def load_snapshot(filename, kind):
+    """Load the stored snapshot of a parsed table.
+
+    Parameters
+    ----------
+    filename : str
+        Table file name.
+
+    kind : str
+        Kind of parsed object, e.g., the class name.
+
+    Returns
+    -------
+    value : object or `None`
+        Stored value, or `None` if :data:`SNAPSHOT_DIR` is not set or
+        there is no usable snapshot.
+
+    """
+    if SNAPSHOT_DIR is None:
+        return None
+    try:
+        with open(_snapshot_path(filename, kind), 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing, partial, or incompatible snapshots are rebuilt.
+        return None
+
+
+def save_snapshot(filename, kind, value):
+    """Store the snapshot of a parsed table, if :data:`SNAPSHOT_DIR`
+    is set. See :func:`load_snapshot`."""
+    if SNAPSHOT_DIR is None:
+        return
+    try:
+        path = _snapshot_path(filename, kind)
+    except (OSError, TypeError, ValueError):
+        return
+
+    # Write to a temporary file first, so that other processes
+    # never see a partial file. A snapshot that cannot be written is
+    # skipped.
+    tmpname = None
+    try:
+        fd, tmpname = tempfile.mkstemp(suffix='.pkl', dir=SNAPSHOT_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, path)
+    except OSError:
+        if tmpname is not None and os.path.exists(tmpname):
+            os.remove(tmpname)
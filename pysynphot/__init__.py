@@ -26,6 +26,7 @@ from .spectrum import Powerlaw as PowerLaw  # noqa
 # Tabular Spectra
 from .spectrum import FileSourceSpectrum as FileSpectrum  # noqa
 from .spectrum import ArraySourceSpectrum as ArraySpectrum  # noqa
+from .spectrum import SpectrumGrid  # noqa
 from .catalog import Icat  # noqa
 # Analytic Spectral Elements
 from .spectrum import Box, UniformTransmission  # noqa
@@ -37,6 +38,7 @@ from .obsbandpass import ObsBandpass  # noqa
 from .reddening import Extinction  # noqa
 # Observations
 from .observation import Observation  # noqa
+from .bandpassbank import BandpassBank  # noqa
 # Other constructs
 from .observationmode import ObservationMode as Obsmode  # noqa
 from numpy import arange as Waveset  # noqa
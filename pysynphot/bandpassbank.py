@@ -0,0 +1,263 @@
+"""This module handles synthetic photometry of many source spectra
+through many bandpasses at once.
+
+A `BandpassBank` samples a set of bandpasses on one common wavelength
+set and stores their integration weights as a matrix, so that count
+rates and effective stimuli of a whole set of spectra are computed
+with a single matrix product.
+
+"""
+from __future__ import absolute_import, division
+
+import numpy as np
+
+from . import binning
+from . import refs
+from . import units
+from .spectrum import (MergeWaveSets, SourceSpectrum, SpectrumGrid,
+                       _fluxcheck)
+
+
+class BandpassBank(object):
+    """Class to handle synthetic photometry through a set of bandpasses.
+
+    Every bandpass is evaluated on a common wavelength set. Row ``m``
+    of the weight matrix holds the trapezoid integration weights of
+    that wavelength set multiplied by the throughput of bandpass ``m``,
+    so that the integrated ``photlam`` flux of spectrum ``n`` through
+    bandpass ``m`` is element ``(n, m)`` of ``flux.dot(weights.T)``.
+    Weights for input flux in other linear units (e.g., the factor of
+    :math:`\\lambda / hc` for ``flam``) and for count rates (collecting
+    area and bin widths) are derived from it on first use and cached.
+
+    Results equal those of `~pysynphot.observation.Observation`
+    calculations on the native dataset, if the spectra are tabulated
+    on the same wavelength set.
+
+    Parameters
+    ----------
+    bandpasses : list of `~pysynphot.spectrum.SpectralElement`
+        Bandpasses, e.g., from `~pysynphot.obsbandpass.ObsBandpass`.
+
+    wave : array_like or `None`
+        Common wavelength set in Angstrom. If `None`, the union of the
+        wavelength sets of all the bandpasses is used.
+
+    Attributes
+    ----------
+    bandpasses
+        Same as input.
+
+    names : list of str
+        Name of each bandpass.
+
+    wave : array_like
+        Common wavelength set in Angstrom.
+
+    throughput : array_like
+        Throughput of each bandpass on ``wave``, with shape
+        ``(nband, nwave)``.
+
+    weights : array_like
+        Integration weights with shape ``(nband, nwave)``.
+
+    primary_area : array_like
+        :ref:`pysynphot-area` used for each bandpass.
+
+    Raises
+    ------
+    ValueError
+        No wavelength set is defined.
+
+    """
+    def __init__(self, bandpasses, wave=None):
+        self.bandpasses = list(bandpasses)
+        self.names = [str(bp) for bp in self.bandpasses]
+
+        if wave is None:
+            for bp in self.bandpasses:
+                wave = MergeWaveSets(wave, bp.GetWaveSet())
+            if wave is None:
+                raise ValueError('Bandpasses have no defined wavelength set; '
+                                 'wave must be given')
+        self.wave = np.array(wave, dtype=np.float64)
+
+        self.throughput = np.empty((len(self.bandpasses), self.wave.size))
+        for i, bp in enumerate(self.bandpasses):
+            self.throughput[i] = bp(self.wave)
+
+        # Trapezoid weights: each point gets half of its two intervals.
+        trapz = np.zeros_like(self.wave)
+        if self.wave.size > 1:
+            deltas = 0.5 * np.abs(np.diff(self.wave))
+            trapz[:-1] += deltas
+            trapz[1:] += deltas
+        self.weights = self.throughput * trapz
+
+        self.primary_area = np.array(
+            [getattr(bp, 'primary_area', None) or refs.PRIMARY_AREA
+             for bp in self.bandpasses], dtype=np.float64)
+
+        self._factors = {'photlam': 1.0}
+        self._unitweights = {'photlam': self.weights}
+        self._countweights = None
+        self._responses = {}
+
+    def __len__(self):
+        return len(self.bandpasses)
+
+    def _getfactor(self, fluxunits):
+        """Return the factor converting flux in the given linear unit
+        to ``photlam`` on ``self.wave``. For internal use only."""
+        fluxunits = units.Units(fluxunits)
+        try:
+            return self._factors[fluxunits.name]
+        except KeyError:
+            pass
+
+        if fluxunits.isMag:
+            raise ValueError('Input flux must be in linear units, not %s' %
+                             fluxunits.name)
+
+        # All linear units are proportional to photlam at each wavelength;
+        # e.g., the factor for flam is wave / hc.
+        factor = fluxunits.Convert(self.wave, np.ones_like(self.wave),
+                                   'photlam')
+        self._factors[fluxunits.name] = factor
+        return factor
+
+    def _getweights(self, fluxunits):
+        """Return the weight matrix for input flux in the given linear
+        unit. For internal use only."""
+        fluxunits = units.Units(fluxunits)
+        try:
+            return self._unitweights[fluxunits.name]
+        except KeyError:
+            weights = self.weights * self._getfactor(fluxunits)
+            self._unitweights[fluxunits.name] = weights
+            return weights
+
+    def _getcountweights(self):
+        """Return the weight matrix for count rates, using bin widths
+        as ``counts`` unit conversion does. For internal use only."""
+        if self._countweights is None:
+            widths = binning.calculate_bin_widths(
+                binning.calculate_bin_edges(self.wave))
+            self._countweights = (self.throughput * widths *
+                                  self.primary_area[:, np.newaxis])
+        return self._countweights
+
+    def _getflux(self, spectra, fluxunits):
+        """Return a 2-D flux array on ``self.wave``, its unit, and
+        whether the input was a single spectrum. For internal use only."""
+        if isinstance(spectra, SourceSpectrum):
+            return spectra(self.wave)[np.newaxis, :], 'photlam', True
+
+        if isinstance(spectra, SpectrumGrid):
+            return spectra(self.wave), 'photlam', False
+
+        if len(spectra) > 0 and isinstance(spectra[0], SourceSpectrum):
+            flux = np.empty((len(spectra), self.wave.size))
+            for i, sp in enumerate(spectra):
+                flux[i] = sp(self.wave)
+            return flux, 'photlam', False
+
+        flux = np.asarray(spectra, dtype=np.float64)
+        single = flux.ndim == 1
+        flux = np.atleast_2d(flux)
+        if flux.shape[-1] != self.wave.size:
+            raise ValueError('Flux array must have %d columns to match the '
+                             'bank wavelength set' % self.wave.size)
+        return flux, fluxunits, single
+
+    def _response(self, fluxunits):
+        """Return :meth:`~pysynphot.units.FluxUnits.unitResponse` of
+        every bandpass for the given unit. For internal use only."""
+        try:
+            return self._responses[fluxunits.name]
+        except KeyError:
+            ans = np.array([fluxunits.unitResponse(bp)
+                            for bp in self.bandpasses])
+            self._responses[fluxunits.name] = ans
+            return ans
+
+    def countrate(self, spectra, fluxunits='photlam'):
+        """Calculate count rates of all spectra through all bandpasses.
+
+        This is the native count rate of
+        :meth:`~pysynphot.observation.Observation.countrate` with
+        ``binned=False``.
+
+        Parameters
+        ----------
+        spectra : `~pysynphot.spectrum.SourceSpectrum`, list, `~pysynphot.spectrum.SpectrumGrid`, or array_like
+            Source spectra. An array gives flux sampled on ``self.wave``,
+            with one row per spectrum.
+
+        fluxunits : str
+            Linear flux unit of an input array. Ignored for spectrum
+            objects. Default is ``photlam``.
+
+        Returns
+        -------
+        ans : array_like
+            Count rates with shape ``(nspec, nband)``, or ``(nband,)``
+            for a single spectrum.
+
+        """
+        flux, fluxunits, single = self._getflux(spectra, fluxunits)
+        weights = self._getcountweights() * self._getfactor(fluxunits)
+        ans = flux.dot(weights.T)
+        if single:
+            ans = ans[0]
+        return ans
+
+    def effstim(self, spectra, fluxunits='photlam', influxunits='photlam'):
+        """Compute :ref:`effective stimulus <pysynphot-formula-effstim>`
+        of all spectra through all bandpasses.
+
+        This is the same calculation as
+        :meth:`~pysynphot.observation.Observation.effstim`.
+
+        Parameters
+        ----------
+        spectra
+            See :meth:`countrate`.
+
+        fluxunits : str
+            Output flux unit.
+
+        influxunits : str
+            Linear flux unit of an input array. Ignored for spectrum
+            objects. Default is ``photlam``.
+
+        Returns
+        -------
+        ans : array_like
+            Effective stimulus with shape ``(nspec, nband)``, or
+            ``(nband,)`` for a single spectrum.
+
+        Raises
+        ------
+        ValueError
+            Invalid integrated flux.
+
+        """
+        x = units.Units(fluxunits)
+        if x.isDensity:
+            flux, influxunits, single = self._getflux(spectra, influxunits)
+            rate = flux.dot(self._getweights(influxunits).T)
+            _fluxcheck(rate)
+            if x.isMag:
+                ans = self._response(x) - 2.5 * np.log10(rate)
+            else:
+                ans = rate * self._response(x)
+            if single:
+                ans = ans[0]
+        else:
+            ans = self.countrate(spectra, fluxunits=influxunits)
+            _fluxcheck(ans)
+            if x.isMag:
+                ans = -2.5 * np.log10(ans)
+
+        return ans
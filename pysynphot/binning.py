@@ -3,6 +3,11 @@ from __future__ import division
 
 import numpy as np
 
+try:
+    from . import pysynphot_utils
+except ImportError:
+    pysynphot_utils = None
+
 
 def calculate_bin_edges(centers):
     """
@@ -99,3 +104,80 @@ def calculate_bin_centers(edges):
         centers[i] = 2. * edges[i] - centers[i - 1]
 
     return centers
+
+
+def calculate_binflux(indices, indices_last, avflux, deltaw, binflux=None,
+                      intwave=None):
+    """
+    Calculate the average flux in wavelength bins.
+
+    Bin ``i`` covers the intervals ``indices[i]`` to ``indices_last[i] - 1``
+    of a fine wavelength set, where each interval has a width in ``deltaw``
+    and an average flux in ``avflux``. The binned flux is the
+    width-weighted mean of the interval fluxes.
+
+    The ``pysynphot.pysynphot_utils`` C extension is used if it is
+    available; it releases the GIL while summing, so that many
+    observations can be binned in parallel threads. Otherwise, the
+    bins are summed with `numpy.add.reduceat`.
+
+    Parameters
+    ----------
+    indices, indices_last : array_like
+        First and one-past-last interval index of each bin.
+
+    avflux, deltaw : array_like
+        Average flux and width of each interval.
+
+    binflux, intwave : ndarray or `None`
+        Optional float64 output arrays with one value per bin, which
+        are filled in place instead of allocating new arrays.
+
+    Returns
+    -------
+    binflux : ndarray
+        Average flux in each bin.
+
+    intwave : ndarray
+        Width of each bin.
+
+    Raises
+    ------
+    ZeroDivisionError
+        A bin has zero width.
+
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    indices_last = np.asarray(indices_last, dtype=np.int64)
+
+    if pysynphot_utils is not None:
+        return pysynphot_utils.calcbinflux(
+            indices.size, indices, indices_last,
+            np.asarray(avflux, dtype=np.float64),
+            np.asarray(deltaw, dtype=np.float64), binflux, intwave)
+
+    if binflux is None:
+        binflux = np.empty(indices.size, dtype=np.float64)
+    if intwave is None:
+        intwave = np.empty(indices.size, dtype=np.float64)
+    if indices.size == 0:
+        return binflux, intwave
+
+    # Sum each [first, last) slice with one reduceat call over the
+    # interleaved boundaries; the even results are the bin sums. A zero
+    # is appended so that the last boundary may be one past the end.
+    bounds = np.empty(2 * indices.size, dtype=np.intp)
+    bounds[0::2] = indices
+    bounds[1::2] = indices_last
+    deltaw = np.append(deltaw, 0.0)
+    intwave[:] = np.add.reduceat(deltaw, bounds)[0::2]
+    binflux[:] = np.add.reduceat(np.append(avflux, 0.0) * deltaw,
+                                 bounds)[0::2]
+
+    # reduceat returns the first element, not zero, for empty slices.
+    if np.any((indices_last <= indices) | (intwave == 0)):
+        raise ZeroDivisionError(
+            'Division by zero in binned flux calculation.')
+    binflux /= intwave
+
+    return binflux, intwave
@@ -23,13 +23,224 @@ import os
 import numpy as N
 from astropy.io import fits as pyfits
 
+from . import Cache
 from . import spectrum
 from . import locations
+from . import units
 
 from .Cache import CATALOG_CACHE
 
 import pysynphot.exceptions as exceptions
 
+# Parameter grids of the catalogs, keyed by catalog file name. Each
+# entry is (indices, grid), where indices is the CATALOG_CACHE entry
+# the grid was built from.
+_GRIDS = {}
+
+
+class _CatalogGrid(object):
+    """Parameter grid of a catalog, built from the list of
+    ``[Teff, metallicity, log_g, filename]`` entries of its index.
+
+    Catalogs are not regular grids: the available metallicities depend
+    on :math:`T_{\\mathrm{eff}}`, and the available :math:`\\log g` on
+    both. The grid is therefore stored by level. Duplicate entries
+    resolve to the first one in the index. For internal use only.
+
+    Attributes
+    ----------
+    entries : list
+        Same as input.
+
+    teff : array_like
+        Sorted distinct :math:`T_{\\mathrm{eff}}`.
+
+    metallicity : list of array_like
+        Sorted distinct metallicities for each element of ``teff``.
+
+    log_g : list of list of array_like
+        Sorted distinct :math:`\\log g` for each pair of
+        ``teff`` and ``metallicity`` elements.
+
+    rows : list of list of array_like
+        Index of the entry for each element of ``log_g``.
+
+    params : array_like
+        Parameters of each entry, with shape ``(nentries, 3)``.
+
+    validity : array_like
+        State of the spectrum of each entry: 1 if it has valid data,
+        0 if not, and -1 if it has not been checked yet. It is stored
+        with the snapshot.
+
+    checked : array_like
+        `True` for the entries whose spectra have been checked in this
+        process. The stored validity is only used to reject entries;
+        the spectrum of any other entry is checked on its first read.
+
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        pars = N.array([e[:3] for e in entries], dtype=N.float64)
+        pars = pars.reshape(len(entries), 3)
+        self.params = pars
+        order = N.lexsort((N.arange(len(entries)), pars[:, 2], pars[:, 1],
+                           pars[:, 0]))
+
+        self.teff, tstart = N.unique(pars[order, 0], return_index=True)
+        self.metallicity = []
+        self.log_g = []
+        self.rows = []
+        self.validity = N.full(len(entries), -1, dtype=N.int8)
+        self.checked = N.zeros(len(entries), dtype=bool)
+        for tslice in N.split(order, tstart[1:]):
+            zvals, zstart = N.unique(pars[tslice, 1], return_index=True)
+            self.metallicity.append(zvals)
+            glist = []
+            rlist = []
+            for zslice in N.split(tslice, zstart[1:]):
+                gvals, gstart = N.unique(pars[zslice, 2], return_index=True)
+                glist.append(gvals)
+                rlist.append(zslice[gstart])
+            self.log_g.append(glist)
+            self.rows.append(rlist)
+
+    @classmethod
+    def load(cls, filename):
+        """Load the grid of the catalog file ``filename`` from its
+        snapshot (see `~pysynphot.Cache.set_snapshot_dir`), or return
+        `None` if there is none."""
+        snapshot = Cache.load_snapshot(filename, 'Catalog')
+        if snapshot is None:
+            return None
+        grid = cls.__new__(cls)
+        grid.__dict__.update(snapshot)
+        grid.checked = N.zeros(len(grid.entries), dtype=bool)
+        return grid
+
+    def save(self, filename):
+        """Store the snapshot of the grid of the catalog file
+        ``filename``, including what is known of the validity of
+        its entries, if snapshots are enabled."""
+        state = dict(self.__dict__)
+        del state['checked']
+        Cache.save_snapshot(filename, 'Catalog', state)
+
+    def check(self, rows, catdir):
+        """Find out the validity of the given entries, reading the
+        spectra of those not checked yet."""
+        for row in rows:
+            if self.validity[row] < 0:
+                try:
+                    Icat._getCorner(self, row, catdir)
+                except exceptions.ParameterOutOfBounds:
+                    pass
+
+    def locate(self, teff, metallicity, log_g):
+        """Find the basis spectra of many models at once.
+
+        Parameters
+        ----------
+        teff, metallicity, log_g : array_like
+            1-D arrays of model parameters.
+
+        Returns
+        -------
+        corners : array_like
+            Indices of the eight entries bracketing each model, in the
+            order used by `Icat`, with shape ``(nmodels, 8)``.
+
+        valid : array_like
+            `False` for models with out-of-bounds parameters, whose
+            ``corners`` are undefined.
+
+        """
+        corners = N.zeros((teff.size, 8), dtype=N.intp)
+        valid = N.ones(teff.size, dtype=bool)
+
+        tpair, ok = _bracketRows(self.teff, teff)
+        valid &= ok
+        for p in range(2):
+            for i in N.unique(tpair[valid, p]):
+                sel = N.flatnonzero(valid & (tpair[:, p] == i))
+                zpair, ok = _bracketRows(self.metallicity[i], metallicity[sel])
+                valid[sel[~ok]] = False
+                sel, zpair = sel[ok], zpair[ok]
+                for q in range(2):
+                    for j in N.unique(zpair[:, q]):
+                        sub = sel[zpair[:, q] == j]
+                        gpair, ok = _bracketRows(self.log_g[i][j], log_g[sub])
+                        valid[sub[~ok]] = False
+                        gpair = gpair.clip(0, self.log_g[i][j].size - 1)
+                        corners[sub, 4 * p + 2 * q:4 * p + 2 * q + 2] = \
+                            self.rows[i][j][gpair]
+
+        return corners, valid
+
+
+def _bracketRows(values, pars):
+    """Vectorized `Icat._bracket`. Return the indices of the nearest
+    elements of ``values`` above and below each element of ``pars``,
+    with shape ``(npars, 2)``, and a mask of the valid ones."""
+    upper = N.searchsorted(values, pars, side='left')
+    lower = N.searchsorted(values, pars, side='right') - 1
+    ok = (upper < values.size) & (lower >= 0)
+    return N.stack([upper, lower], axis=1), ok
+
+
+def _broadcastParams(teff, metallicity, log_g):
+    """Return model parameters as 1-D float arrays of the same size."""
+    pars = N.broadcast_arrays(*[N.atleast_1d(N.asarray(x, dtype=N.float64))
+                                for x in (teff, metallicity, log_g)])
+    if pars[0].ndim != 1:
+        raise ValueError('Parameters must be numbers or 1-D arrays')
+    return pars
+
+
+def _interpolateRows(table, corners, params, pars, out, rows):
+    """Vectorized `Icat._interpolateFlux`.
+
+    Parameters
+    ----------
+    table : array_like
+        Flux of the basis spectra, with shape ``(nspectra, nwave)``.
+
+    corners : array_like
+        Rows of ``table`` for each model, with shape ``(nmodels, 8)``.
+
+    params : array_like
+        Parameters of the corners, with shape ``(nmodels, 8, 3)``.
+
+    pars : list of array_like
+        Teff, metallicity, and log g of the models.
+
+    out : array_like
+        Output array; the flux of model ``i`` goes to ``out[rows[i]]``.
+
+    rows : array_like
+        Row of ``out`` for each model.
+
+    """
+    # Work on blocks of models to bound the size of temporary arrays.
+    step = max(1, (1 << 22) // max(table.shape[1], 1))
+    for start in range(0, len(corners), step):
+        block = slice(start, start + step)
+        values = [(table[corners[block, c]], params[block, c])
+                  for c in range(8)]
+        for level in (2, 1, 0):
+            par = pars[level][block]
+            result = []
+            for (flux1, par1), (flux2, par2) in zip(values[::2], values[1::2]):
+                same = (par1[:, level] == par2[:, level])[:, None]
+                with N.errstate(divide='ignore', invalid='ignore'):
+                    a = ((par1[:, level] - par) /
+                         (par1[:, level] - par2[:, level]))[:, None]
+                b = 1.0 - a
+                result.append((N.where(same, flux1, flux2 * a + flux1 * b),
+                               par1))
+            values = result
+        out[rows[block]] = values[0][0]
+
 
 class Icat(spectrum.TabularSourceSpectrum):
     """This class constructs a model from the grid available in
@@ -87,6 +298,10 @@ class Icat(spectrum.TabularSourceSpectrum):
     --------
     >>> spec = S.Icat('k93models', 6440, 0, 4.3)
 
+    See Also
+    --------
+    batch : Many models at once.
+
     """
     def __init__(self,catdir,Teff,metallicity,log_g):
         self.isAnalytic=False
@@ -95,41 +310,209 @@ class Icat(spectrum.TabularSourceSpectrum):
         # causing the problems.
         self.parameter_names = ['Teff','metallicity','log G']
 
-        filename = locations.CAT_TEMPLATE.replace('*',catdir)
         self.name="%s(Teff=%g,metallicity=%g,logG=%g)"%(catdir,Teff,metallicity,log_g)
 
+        grid = self._getGrid(catdir)
+
+        # Bracket the parameters in the same order as _breakList(), so
+        # that out-of-bounds values raise the same errors.
+        tpair = self._bracket(grid.teff, 0, Teff)
+        zpairs = [self._bracket(grid.metallicity[i], 1, metallicity)
+                  for i in tpair]
+        gpairs = [[self._bracket(grid.log_g[i][j], 2, log_g) for j in zpair]
+                  for i, zpair in zip(tpair, zpairs)]
+
+        rows = []
+        for i, zpair, gpair in zip(tpair, zpairs, gpairs):
+            for j, kpair in zip(zpair, gpair):
+                for k in kpair:
+                    rows.append(grid.rows[i][j][k])
+
+        # Entries known to have no valid data are rejected before
+        # reading any spectrum, unless an earlier one is unchecked.
+        for row in rows:
+            if grid.validity[row] < 0:
+                break
+            if grid.validity[row] == 0:
+                self._getCorner(grid, row, catdir)
+        spectra = [self._getCorner(grid, row, catdir) for row in rows]
+
+        ans = self._interpolateFlux(spectra, (Teff, metallicity, log_g))
+        if ans is not None:
+            sp = spectra[0][-1]
+            self._wavetable, self._fluxtable = ans
+            self.waveunits = units.Units(str(sp.waveunits))
+            self.fluxunits = units.Units(str(sp.fluxunits))
+            self.warnings = {}
+            return
+
+        self._interpolateSpectra(spectra, Teff, metallicity, log_g)
+
+    @classmethod
+    def batch(cls, catdir, Teff, metallicity, log_g):
+        """Construct many models from a catalog at once.
+
+        Each basis spectrum is read once for the whole batch, and the
+        interpolation is done with array arithmetic on all models.
+        Models are tabulated on the wavelength set shared by the
+        basis spectra (the union of their wavelength sets if they
+        differ). Where it is the same as that of `Icat`, the results
+        are the same too.
+
+        Parameters
+        ----------
+        catdir : {'ck04models', 'k93models', 'phoenix'}
+            Name of directory holding the catalogs.
+
+        Teff, metallicity, log_g : array_like
+            Model parameters, broadcast together into 1-D arrays.
+
+        Returns
+        -------
+        grid : `~pysynphot.spectrum.SpectrumGrid`
+            One spectrum per model. Flux is zero for invalid models.
+
+        valid : array_like
+            Boolean mask, `False` for models that would raise
+            `~pysynphot.exceptions.ParameterOutOfBounds` in `Icat`.
+
+        Raises
+        ------
+        pysynphot.exceptions.ParameterOutOfBounds
+            No model is valid.
+
+        Examples
+        --------
+        >>> grid, valid = S.Icat.batch('k93models', [5000, 6440], 0, 4.3)
+
+        """
+        grid = cls._getGrid(catdir)
+        pars = _broadcastParams(Teff, metallicity, log_g)
+        nrows = pars[0].size
+
+        corners, valid = grid.locate(*pars)
+        valid[valid] = (grid.validity[corners[valid]] != 0).all(axis=1)
+
+        # Read every basis spectrum once.
+        used, inverse = N.unique(corners[valid], return_inverse=True)
+        spectra = []
+        bad = N.zeros(used.size, dtype=bool)
+        for i, row in enumerate(used):
+            try:
+                spectra.append(cls._getCorner(grid, row, catdir)[-1])
+            except exceptions.ParameterOutOfBounds:
+                spectra.append(None)
+                bad[i] = True
+        inverse = inverse.reshape(-1, 8)
+        ok = ~bad[inverse].any(axis=1)
+        valid[valid] = ok
+        inverse = inverse[ok]
+        rows = N.flatnonzero(valid)
+        if rows.size == 0:
+            raise exceptions.ParameterOutOfBounds(
+                "No valid models in %s." % catdir)
+
+        good = [sp for sp in spectra if sp is not None]
+        wave = good[0]._wavetable
+        if all(N.array_equal(sp._wavetable, wave) for sp in good):
+            fluxes = [sp._fluxtable if sp is not None else None
+                      for sp in spectra]
+        else:
+            wave = None
+            for sp in good:
+                wave = spectrum.MergeWaveSets(wave, sp.GetWaveSet())
+            fluxes = [sp(wave) if sp is not None else None for sp in spectra]
+        table = N.zeros((len(spectra), wave.size), dtype=N.float64)
+        for i, flux in enumerate(fluxes):
+            if flux is not None:
+                table[i] = flux
+
+        flux = N.zeros((nrows, wave.size), dtype=N.float64)
+        _interpolateRows(table, inverse, grid.params[corners[rows]],
+                         [x[rows] for x in pars], flux, rows)
+
+        names = ["%s(Teff=%g,metallicity=%g,logG=%g)" % (catdir, t, z, g)
+                 for t, z, g in zip(*pars)]
+        ans = spectrum.SpectrumGrid(wave, flux, names=names, keepneg=True,
+                                    name=catdir)
+        ans.waveunits = units.Units(str(good[0].waveunits))
+        ans.fluxunits = units.Units(str(good[0].fluxunits))
+        return ans, valid
+
+    @classmethod
+    def isvalid(cls, catdir, Teff, metallicity, log_g):
+        """Check which models can be constructed from a catalog,
+        without constructing them.
+
+        The validity of the basis spectra of a catalog is found out
+        when they are first read, and is stored with its index
+        snapshot by :func:`preload`. Unchecked basis spectra needed
+        here are read.
+
+        Parameters
+        ----------
+        catdir : {'ck04models', 'k93models', 'phoenix'}
+            Name of directory holding the catalogs.
+
+        Teff, metallicity, log_g : array_like
+            Model parameters, broadcast together into 1-D arrays.
+
+        Returns
+        -------
+        valid : array_like
+            Boolean mask, `False` for models that would raise
+            `~pysynphot.exceptions.ParameterOutOfBounds` in `Icat`.
+
+        Examples
+        --------
+        >>> teff = np.arange(3000, 50000, 100)
+        >>> ok = S.Icat.isvalid('ck04models', teff, 0, 4.5)
+        >>> grid, valid = S.Icat.batch('ck04models', teff[ok], 0, 4.5)
+
+        """
+        grid = cls._getGrid(catdir)
+        pars = _broadcastParams(Teff, metallicity, log_g)
+
+        corners, valid = grid.locate(*pars)
+        grid.check(N.unique(corners[valid]), catdir)
+        valid[valid] = (grid.validity[corners[valid]] == 1).all(axis=1)
+        return valid
+
+    @classmethod
+    def _getGrid(cls, catdir):
+        """Return the `_CatalogGrid` of a catalog, reading its index
+        if needed."""
+        filename = locations.CAT_TEMPLATE.replace('*',catdir)
+
         if filename in CATALOG_CACHE:
             indices = CATALOG_CACHE[filename]
         else:
-            table = pyfits.open(filename)
+            grid = _CatalogGrid.load(filename)
+            if grid is None:
+                table = pyfits.open(filename)
 
-            indexList = table[1].data.field('INDEX')
-            filenameList = table[1].data.field('FILENAME')
+                indexList = table[1].data.field('INDEX')
+                filenameList = table[1].data.field('FILENAME')
 
-            table.close()
+                table.close()
 
-            indices = self._getArgs(indexList, filenameList)
+                grid = _CatalogGrid(cls._getArgs(indexList, filenameList))
+                grid.save(filename)
 
+            indices = grid.entries
             CATALOG_CACHE[filename] = indices
+            _GRIDS[filename] = (indices, grid)
 
-        list0,list1 = self._breakList(indices, 0, Teff)
-
-        list2,list3 = self._breakList(list0, 1, metallicity)
-        list4,list5 = self._breakList(list1, 1, metallicity)
+        grid = _GRIDS.get(filename)
+        if grid is None or grid[0] is not indices:
+            grid = (indices, _CatalogGrid(indices))
+            _GRIDS[filename] = grid
+        return grid[1]
 
-        list6,list7   = self._breakList(list2, 2, log_g)
-        list8,list9   = self._breakList(list3, 2, log_g)
-        list10,list11 = self._breakList(list4, 2, log_g)
-        list12,list13 = self._breakList(list5, 2, log_g)
-
-        sp1 = self._getSpectrum(list6[0],  catdir)
-        sp2 = self._getSpectrum(list7[0],  catdir)
-        sp3 = self._getSpectrum(list8[0],  catdir)
-        sp4 = self._getSpectrum(list9[0],  catdir)
-        sp5 = self._getSpectrum(list10[0], catdir)
-        sp6 = self._getSpectrum(list11[0], catdir)
-        sp7 = self._getSpectrum(list12[0], catdir)
-        sp8 = self._getSpectrum(list13[0], catdir)
+    def _interpolateSpectra(self, spectra, Teff, metallicity, log_g):
+        """Combine the basis spectra into a composite spectrum and
+        tabulate it on its merged wavelength set."""
+        (sp1, sp2, sp3, sp4, sp5, sp6, sp7, sp8) = spectra
 
         spa1 = self._interpolateSpectrum(sp1, sp2, log_g)
         spa2 = self._interpolateSpectrum(sp3, sp4, log_g)
@@ -149,12 +532,79 @@ class Icat(spectrum.TabularSourceSpectrum):
         self.fluxunits = sp.fluxunits
         self.warnings = {}
 
-    def _getArgs(self, indices, filenames):
+    def _interpolateFlux(self, spectra, pars):
+        """Interpolate the fluxes of the basis spectra directly.
+        The arithmetic is that of the composite spectrum built by
+        :meth:`_interpolateSpectrum`, so results are the same.
+
+        Returns
+        -------
+        wave, flux : array_like or `None`
+            `None` if the spectra are not tabulated on the same
+            wavelength set.
+
+        """
+        wave = spectra[0][-1]._wavetable
+        for sp in spectra:
+            w = sp[-1]._wavetable
+            if w is not wave and not N.array_equal(w, wave):
+                return None
+        if not (N.diff(wave) > spectrum.MERGETHRESH).all():
+            return None
+
+        # Innermost parameter first; each level halves the list.
+        # Fluxes are in float64, like those of evaluated spectra.
+        values = [(N.asarray(sp[-1]._fluxtable, dtype=N.float64), sp[:3],
+                   False) for sp in spectra]
+        for level in (2, 1, 0):
+            par = pars[level]
+            result = []
+            for (flux1, par1, comp1), (flux2, par2, comp2) in zip(
+                    values[::2], values[1::2]):
+                if par1[level] == par2[level]:
+                    result.append((flux1, par1, comp1))
+                else:
+                    a = (par1[level] - par) / (par1[level] - par2[level])
+                    b = 1.0 - a
+                    result.append((flux2 * a + flux1 * b, par1, True))
+            values = result
+
+        flux, par, composite = values[0]
+        if composite:
+            # as returned by CompositeSourceSpectrum.GetWaveSet()
+            wave = spectrum.MergeWaveSets(wave, wave)
+        return wave.copy(), N.array(flux)
+
+    def _bracket(self, values, index, parameter):
+        """Return the indices of the nearest elements of the sorted
+        array ``values`` above and below ``parameter``. Same as
+        :meth:`_breakList` for a grid level."""
+        par = float(parameter)
+
+        upper = N.searchsorted(values, par, side='left')
+        lower = N.searchsorted(values, par, side='right') - 1
+
+        if upper == values.size:
+            maxAllowed = values.max()
+            s = "Parameter '%s' exceeds data. Max allowed=%f, entered=%f."
+            s = s % (self.parameter_names[index], maxAllowed, parameter)
+            raise exceptions.ParameterOutOfBounds(s)
+
+        elif lower < 0:
+            minAllowed = values.min()
+            s = "Parameter '%s' exceeds data. Min allowed=%f, entered=%f."
+            s = s % (self.parameter_names[index], minAllowed, parameter)
+            raise exceptions.ParameterOutOfBounds(s)
+
+        return upper, lower
+
+    @staticmethod
+    def _getArgs(indices, filenames):
         results = []
 
         for i,index in enumerate(indices):
             list1 = [float(x) for x in index.split(',')]
-            list1.append(filenames[i])
+            list1.append(str(filenames[i]))
             results.append(list1)
 
         return results
@@ -194,7 +644,27 @@ class Icat(spectrum.TabularSourceSpectrum):
 
         return upperList, lowerList
 
-    def _getSpectrum(self, parlist, basename):
+    @staticmethod
+    def _getCorner(grid, row, catdir):
+        """Return the result of :meth:`_getSpectrum` for an entry of
+        a `_CatalogGrid`, and record its validity. An entry known
+        to have no valid data is rejected without reading it; other
+        entries are checked on their first read in this process."""
+        if grid.validity[row] == 0:
+            raise exceptions.ParameterOutOfBounds(
+                "Parameter '{0}' has no valid data.".format(grid.entries[row]))
+        try:
+            ans = Icat._getSpectrum(grid.entries[row], catdir,
+                                    check=not grid.checked[row])
+        except exceptions.ParameterOutOfBounds:
+            grid.validity[row] = 0
+            raise
+        grid.validity[row] = 1
+        grid.checked[row] = True
+        return ans
+
+    @staticmethod
+    def _getSpectrum(parlist, basename, check=True):
         name = parlist[3]
 
         filename = name.split('[')[0]
@@ -204,7 +674,7 @@ class Icat(spectrum.TabularSourceSpectrum):
                                                   os.path.join(basename,filename))
         sp = spectrum.TabularSourceSpectrum(filename, fluxname=column)
 
-        totflux = sp.integrate()
+        totflux = sp.integrate() if check else 1.0
         if not N.isfinite(totflux) or totflux <= 0:
             raise exceptions.ParameterOutOfBounds(
                 "Parameter '{0}' has no valid data.".format(parlist))
@@ -238,3 +708,37 @@ class Icat(spectrum.TabularSourceSpectrum):
         result.append(sp)
 
         return result
+
+
+def preload(catdirs=('ck04models', 'k93models', 'phoenix'), validate=False):
+    """Read the indices of catalogs ahead of use, e.g., when a worker
+    process starts, so that the first `Icat` call does not have to.
+
+    Indices are kept in ``pysynphot.Cache.CATALOG_CACHE``. If
+    snapshots are enabled (see `~pysynphot.Cache.set_snapshot_dir`),
+    a parsed index is also stored on disk, and later processes load
+    it in one read instead of parsing the catalog again.
+
+    Parameters
+    ----------
+    catdirs : list of str
+        Names of directories holding the catalogs.
+
+    validate : bool
+        Also read every basis spectrum once to find out which ones
+        have valid data, and store the result with the index
+        snapshot. `Icat` then rejects invalid grid points without
+        reading them. Remove the snapshot after replacing basis
+        spectra that had no valid data.
+
+    Examples
+    --------
+    >>> S.Cache.set_snapshot_dir('~/.cache/pysynphot')
+    >>> S.catalog.preload(['ck04models'], validate=True)
+
+    """
+    for catdir in catdirs:
+        grid = Icat._getGrid(catdir)
+        if validate and (grid.validity < 0).any():
+            grid.check(N.flatnonzero(grid.validity < 0), catdir)
+            grid.save(locations.CAT_TEMPLATE.replace('*', catdir))
@@ -1,14 +1,21 @@
 """This module handle bandpass of observation modes."""
 from __future__ import division, print_function
+import copy
 import numpy as np
 
-from .observationmode import ObservationMode
-from .spectrum import CompositeSpectralElement, TabularSpectralElement
+from .bandpassbank import BandpassBank
+from .observationmode import ObservationMode, _stripband
+from .spectrum import (ArraySpectralElement, CompositeSpectralElement,
+                       InterpolatedThroughputTable, TabularSpectralElement,
+                       _interprows, _samestate)
+from . import Cache
+from . import refs
 from . import units
 from . import exceptions
 
 
-def ObsBandpass(obstring, graphtable=None, comptable=None, component_dict={}):
+def ObsBandpass(obstring, graphtable=None, comptable=None,
+                component_dict=None, params=None):
     """Generate a bandpass object from observation mode.
 
     If the bandpass consists of multiple throughput files
@@ -28,16 +35,74 @@ def ObsBandpass(obstring, graphtable=None, comptable=None, component_dict={}):
     graphtable, comptable, component_dict
         See `~pysynphot.observationmode.ObservationMode`.
 
+    params : dict or `None`
+        Maps parameterized keywords (e.g., ``'mjd'``) to arrays of
+        values. If given, a `~pysynphot.bandpassbank.BandpassBank` with
+        one bandpass per value is returned instead, computed with
+        `~pysynphot.spectrum.InterpolatedThroughputTable`. Arrays
+        for different keywords are broadcast together. The keywords
+        must be in ``obstring``, with or without a value (e.g.,
+        ``'acs,wfc1,f555w,mjd#'``).
+
     Returns
     -------
-    bp : `~pysynphot.spectrum.TabularSpectralElement` or `ObsModeBandpass`
+    bp : `~pysynphot.spectrum.TabularSpectralElement`, `ObsModeBandpass`, or `~pysynphot.bandpassbank.BandpassBank`
+
+    Notes
+    -----
+    Unless ``component_dict`` is given, bandpasses are cached in
+    ``pysynphot.Cache.BANDPASS_CACHE``, keyed by observation mode,
+    graph table, component table, and telescope area. Case and the
+    formatting of parameter values do not matter, but keyword order
+    does, as it decides which keyword applies at a graph node that
+    matches several of them.
+    Each call returns a new shallow copy of the cached bandpass,
+    whose units may be changed without affecting other copies.
+    Use ``pysynphot.Cache.reset_bandpass_cache()`` after changing
+    throughput files on disk.
 
     Examples
     --------
     >>> bp1 = S.ObsBandpass('acs,hrc,f555w')
     >>> bp2 = S.ObsBandpass('johnson,v')
+    >>> bank = S.ObsBandpass('acs,wfc1,f555w,mjd#',
+    ...                      params={'mjd': np.arange(53000, 57000, 10)})
 
     """
+    if params:
+        if component_dict is None:
+            component_dict = {}
+        return _makeBandpassStack(obstring, graphtable, comptable,
+                                  component_dict, params)
+
+    if component_dict is not None:
+        return _makeBandpass(obstring, graphtable, comptable, component_dict)
+
+    key = _bandpassKey(obstring, graphtable, comptable)
+    if key is None:
+        return _makeBandpass(obstring, graphtable, comptable, {})
+
+    bp = Cache.BANDPASS_CACHE.get(key)
+    if bp is None:
+        bp = _makeBandpass(obstring, graphtable, comptable, {})
+        if isinstance(bp, CompositeSpectralElement):
+            # copies share the plan and the tabulated throughput,
+            # so they are only built once
+            bp.compile()
+            if getattr(bp, 'collapse', False):
+                bp._tabulate()
+        Cache.BANDPASS_CACHE.put(key, bp, _bandpassBytes(bp))
+
+    # Never hand out the cached object itself.
+    ans = copy.copy(bp)
+    if isinstance(ans, ObsModeBandpass):
+        ans.obsmode = copy.copy(ans.obsmode)
+        ans.obsmode._obsmode = ans.name = _stripband(obstring)
+    return ans
+
+
+def _makeBandpass(obstring, graphtable, comptable, component_dict):
+    """Build the bandpass for :func:`ObsBandpass` without caching."""
     ##Temporarily create an Obsmode to determine whether an
     ##ObsModeBandpass or a TabularSpectralElement will be returned.
     ob=ObservationMode(obstring,graphtable=graphtable,
@@ -48,6 +113,103 @@ def ObsBandpass(obstring, graphtable=None, comptable=None, component_dict={}):
         return TabularSpectralElement(ob.components[0].throughput_name)
 
 
+def _makeBandpassStack(obstring, graphtable, comptable, component_dict,
+                       params):
+    """Build the `~pysynphot.bandpassbank.BandpassBank` for
+    :func:`ObsBandpass` with arrays of parameter values."""
+    arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                   for v in params.values()])
+    if arrays[0].ndim != 1:
+        raise ValueError('Parameter values must be 1-D arrays')
+    values = dict(zip([k.lower() for k in params], arrays))
+
+    # Build the observation mode with the first set of values, then
+    # replace its parameterized components.
+    modes = _stripband(obstring).split(',')
+    swept = [(i, m.split('#')[0].lower()) for i, m in enumerate(modes)
+             if '#' in m and m.split('#')[0].lower() in values]
+    missing = set(values).difference(kw for i, kw in swept)
+    if missing:
+        raise ValueError('%s not parameterized keywords of %s' %
+                         (sorted(missing), obstring))
+
+    def obsmode(j):
+        ans = list(modes)
+        for i, kw in swept:
+            ans[i] = '%s#%r' % (kw, float(values[kw][j]))
+        return ','.join(ans)
+
+    ob = ObservationMode(obsmode(0), graphtable=graphtable,
+                         comptable=comptable, component_dict=component_dict)
+
+    if len(ob) > 1:
+        wave = ObsModeBandpass(ob).GetWaveSet()
+    else:
+        wave = ob.components[0].throughput.GetWaveSet()
+
+    # Multiply the components in the order used by ObsModeBandpass.
+    thru = None
+    for component in ob.components:
+        kw = None
+        if component.throughput_name.endswith('#]'):
+            kw = component.throughput_name.split('[')[1][:-2].lower()
+        if kw in values:
+            table = InterpolatedThroughputTable(component.throughput_name)
+            twave, rows = table.wave, table(values[kw])
+            if twave[0] > twave[-1]:
+                twave, rows = twave[::-1], rows[:, ::-1]
+            t = _interprows(wave, twave, rows)
+        else:
+            t = component.throughput(wave)
+        thru = t if thru is None else thru * t
+
+    bandpasses = []
+    thru = np.broadcast_to(thru, (arrays[0].size, wave.size))
+    for j, row in enumerate(thru):
+        bp = ArraySpectralElement(wave=wave, throughput=row,
+                                  waveunits='angstrom', name=obsmode(j))
+        bp.primary_area = ob.primary_area
+        bandpasses.append(bp)
+    return BandpassBank(bandpasses, wave=wave)
+
+
+def _bandpassKey(obstring, graphtable, comptable):
+    """Return the ``BANDPASS_CACHE`` key of an observation mode, or
+    `None` if it cannot be parsed (the error is then left to
+    `~pysynphot.observationmode.ObservationMode`)."""
+    try:
+        modes = []
+        for m in _stripband(obstring).lower().split(','):
+            if '#' in m:
+                kw, val = m.split('#')
+                m = '%s#%r' % (kw, float(val))
+            modes.append(m)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+    if graphtable is None:
+        graphtable = refs.GRAPHTABLE
+    if comptable is None:
+        comptable = refs.COMPTABLE
+
+    return (','.join(modes), graphtable, comptable,
+            refs.PRIMARY_AREA)
+
+
+def _bandpassBytes(bp):
+    """Return the size of the tables of a bandpass in bytes."""
+    try:
+        comps = bp.complist()
+    except AttributeError:
+        comps = [bp]
+    arrays = [getattr(bp, 'binset', None)]
+    arrays.extend(getattr(bp, '_table', ())[1:])
+    for comp in comps:
+        arrays.append(getattr(comp, '_wavetable', None))
+        arrays.append(getattr(comp, '_throughputtable', None))
+    return sum(x.nbytes for x in arrays if isinstance(x, np.ndarray))
+
+
 class ObsModeBandpass(CompositeSpectralElement):
     """Bandpass instantiated from an ``obsmode`` string.
     Also see :ref:`pysynphot-obsmode-bandpass`, :ref:`pysynphot-appendixb`,
@@ -58,11 +220,21 @@ class ObsModeBandpass(CompositeSpectralElement):
     ob : str
         Observation mode.
 
+    collapse : bool
+        If `True` (default), the throughput of all components is
+        multiplied out once on their merged wavelength set, and
+        looked up there instead of evaluating every component again.
+        Throughput at other wavelengths is still evaluated from the
+        components, so the results are the same either way.
+
     Attributes
     ----------
     obsmode, name
         Same as input ``ob``.
 
+    collapse
+        Same as input.
+
     component1, component2 : `CompositeSpectralElement` or `SpectralElement`
         Components and sub-components that belong to the observation mode.
 
@@ -102,7 +274,7 @@ class ObsModeBandpass(CompositeSpectralElement):
     # Instantiate a COmpositeSpectralElement by means of an
     # ObservationMode (which the caller must have already created from
     # an  obstring
-    def __init__(self,ob):
+    def __init__(self,ob,collapse=True):
         #Chain the individual components
         chain=ob.components[0].throughput*ob.components[1].throughput
 
@@ -116,6 +288,7 @@ class ObsModeBandpass(CompositeSpectralElement):
         self.obsmode = ob
         self.name = self.obsmode._obsmode #str(self.obsmode)
         self.primary_area = ob.primary_area
+        self.collapse = collapse
 
         #Check for valid bounds
         self._checkbounds()
@@ -132,6 +305,61 @@ class ObsModeBandpass(CompositeSpectralElement):
         """Defer to ObservationMode component """
         return self.name #self.obsmode._obsmode
 
+    def __call__(self, wavelength):
+        """Evaluate the throughput, using the tabulated throughput
+        where possible if ``self.collapse`` is set."""
+        if not self.collapse:
+            return CompositeSpectralElement.__call__(self, wavelength)
+
+        wave, thru = self._tabulate()
+        x = np.asarray(wavelength)
+        if x.ndim != 1 or wave is None or wave.size == 0:
+            return CompositeSpectralElement.__call__(self, wavelength)
+
+        idx = np.searchsorted(wave, x)
+        np.minimum(idx, wave.size - 1, out=idx)
+        found = wave[idx] == x
+        if found.all():
+            return thru[idx]
+
+        ans = np.empty(x.shape, dtype=np.float64)
+        ans[found] = thru[idx[found]]
+        missing = ~found
+        ans[missing] = CompositeSpectralElement.__call__(self, x[missing])
+        return ans
+
+    def _tabulate(self):
+        """Return the merged wavelength set of the components, and the
+        throughput multiplied out on it. They are cached until any of
+        the components changes (see
+        :meth:`~pysynphot.spectrum.Integrator.invalidate`)."""
+        state = self._arraystate()
+        table = getattr(self, '_table', None)
+        if table is not None and _samestate(table[0], state):
+            return table[1], table[2]
+
+        plan = self.compile()
+        wave = plan.waveset
+        thru = None
+        if wave is not None:
+            thru = np.asarray(plan(wave), dtype=np.float64)
+            thru.setflags(write=False)
+        if state is not None:
+            self._table = (state, wave, thru)
+        return wave, thru
+
+    def __copy__(self):
+        new = CompositeSpectralElement.__copy__(self)
+        # the tabulated throughput stays valid for the copy
+        table = self.__dict__.get('_table')
+        if table is not None:
+            del new._table
+            if _samestate(table[0], self._arraystate()):
+                state = new._arraystate()
+                if state is not None:
+                    new._table = (state,) + table[1:]
+        return new
+
     def __len__(self):
         """Defer to ObservationMode component """
         return len(self.obsmode)
@@ -148,7 +376,7 @@ class ObsModeBandpass(CompositeSpectralElement):
         if thru[0] != 0 or thru[-1] != 0:
             print("Warning: throughput for this obsmode is not bounded by zeros. Endpoints: thru[0]=%g, thru[-1]=%g"%(thru[0],thru[-1]))
 
-    def thermback(self):
+    def thermback(self, temperatures=None):
         """Calculate thermal background count rate for ``self.obsmode``.
 
         Calculation uses
@@ -164,10 +392,18 @@ class ObsModeBandpass(CompositeSpectralElement):
 
             Similar to IRAF STSDAS SYNPHOT ``thermback`` task.
 
+        Parameters
+        ----------
+        temperatures : dict or `None`
+            Temperatures in Kelvin of some or all thermal components,
+            e.g., ``{'wfc3_ir_primary': np.linspace(270, 290, 21)}``.
+            See :func:`~pysynphot.observationmode.ObservationMode.ThermalSpectrum`.
+
         Returns
         -------
-        ans : float
-            Thermal background count rate.
+        ans : float or array_like
+            Thermal background count rate. If ``temperatures`` is
+            given, one value per set of temperatures.
 
         Raises
         ------
@@ -177,7 +413,7 @@ class ObsModeBandpass(CompositeSpectralElement):
         """
         #The obsmode.ThermalSpectrum method will raise an exception if there is
         #no thermal information, and that will just propagate up.
-        sp=self.obsmode.ThermalSpectrum()
+        sp=self.obsmode.ThermalSpectrum(temperatures=temperatures)
 
         #Thermback is always provided in this non-standard set of units.
         #This code was copied from etc.py.
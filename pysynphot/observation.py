@@ -16,11 +16,63 @@ from .obsbandpass import pixel_range, wave_range
 from .spectrum import ArraySourceSpectrum
 
 
-try:
-    import pysynphot_utils
-    utils_imported = True
-except ImportError:
-    utils_imported = False
+def _merge_sorted(waveset1, waveset2):
+    """Return the union of two sorted wavelength sets.
+
+    This gives the same result as
+    :func:`~pysynphot.spectrum.MergeWaveSets`, but the two sorted
+    runs are merged in linear time with a stable sort.
+
+    """
+    if waveset1 is None or waveset2 is None:
+        return spectrum.MergeWaveSets(waveset1, waveset2)
+
+    merged = np.concatenate((waveset1, waveset2)).astype(np.float64)
+    merged.sort(kind='stable')
+
+    # As in MergeWaveSets, keep the upper of values that are too close.
+    keep = np.diff(merged) > spectrum.MERGETHRESH
+    if not keep.all():
+        merged = np.append(merged[:-1][keep], merged[-1])
+
+    return merged
+
+
+def _subset(wave, flux, subwave):
+    """Return the values of ``flux`` at ``subwave``, which should be
+    contained in the sorted ``wave``, or `None` if it is not."""
+    idx = np.searchsorted(wave, subwave)
+    if idx.size and idx[-1] >= wave.size:
+        return None
+    if not np.array_equal(wave[idx], subwave):
+        return None
+    return flux[idx]
+
+
+def _binning_plan(band, binwave):
+    """Return bin edges and their union with bin centers.
+
+    These only depend on the binned wavelength set, so they are
+    cached on the bandpass and reused by every observation through
+    it, as long as its ``binset`` is unchanged.
+
+    """
+    plan = getattr(band, '_binplan', None)
+    if plan is not None and np.array_equal(plan[0], binwave):
+        return plan[1], plan[2]
+
+    edges = binning.calculate_bin_edges(binwave)
+    grid = spectrum.MergeWaveSets(edges, binwave)
+    plan = (np.array(binwave, dtype=np.float64), edges, grid)
+    for x in plan:
+        x.setflags(write=False)
+
+    try:
+        band._binplan = plan
+    except AttributeError:
+        pass
+
+    return edges, grid
 
 
 def check_overlap(a, b):
@@ -297,49 +349,73 @@ class Observation(spectrum.CompositeSourceSpectrum):
             Assumes that the wavelength values in the binned
             wavelength set are the *centers* of the bins.
 
-            Uses ``pysynphot.pysynphot_utils.calcbinflux()`` C-extension,
-            if available, for binned flux calculation.
+            Uses :func:`~pysynphot.binning.calculate_binflux` for
+            binned flux calculation.
+
+            Bin edges are cached on the bandpass for its binned
+            wavelength set, so only the natural waveset has to be
+            merged in for each observation.
+
+        """
+        (spwave, flux, endpoints, indices, deltaw,
+         binflux, intwave) = self._calcbinflux()
+
+        self._indices = indices[:-1]
+        self._indices_last = indices[1:]
+        self._deltaw = deltaw
+        self._binflux, self._intwave = binflux, intwave
+
+        #Save the endpoints for future use
+        self._bin_edges = endpoints
+
+    def _calcbinflux(self):
+        """Calculate binned flux without storing it.
+        See :meth:`initbinflux`. For internal use only.
+
+        Returns
+        -------
+        spwave, flux : array_like
+            Natural waveset merged with bin edges and centers,
+            and ``photlam`` flux evaluated on it.
+
+        endpoints, indices : array_like
+            Bin edges, and their indices in ``spwave``.
+
+        deltaw : array_like
+            Width of each interval of ``spwave``.
+
+        binflux, intwave : array_like
+            Binned flux in ``photlam``, and width of each bin.
 
         """
-        endpoints = binning.calculate_bin_edges(self.binwave)
+        # the endpoints and their merge with the binned waveset are
+        # shared by all observations through the same bandpass
+        endpoints, grid = _binning_plan(self.bandpass, self.binwave)
 
-        # merge these endpoints in with the natural waveset
-        spwave = spectrum.MergeWaveSets(self.wave, endpoints)
-        spwave = spectrum.MergeWaveSets(spwave,self.binwave)
+        # merge these in with the natural waveset
+        spwave = _merge_sorted(self.wave, grid)
 
         # compute indices associated to each endpoint.
         indices = np.searchsorted(spwave, endpoints)
-        self._indices = indices[:-1]
-        self._indices_last = indices[1:]
 
         # prepare integration variables.
         flux = self(spwave)
         avflux = (flux[1:] + flux[:-1]) / 2.0
-        self._deltaw = spwave[1:] - spwave[:-1]
-
-        # sum over each bin.
-        if utils_imported is True:
-            self._binflux, self._intwave = \
-              pysynphot_utils.calcbinflux(len(self.binwave),
-                                          self._indices,
-                                          self._indices_last,
-                                          avflux,
-                                          self._deltaw)
-        else:
-            #Note that, like all Python striding, the range over which
-            #we integrate is [first:last).
-            self._binflux = np.empty(shape=self.binwave.shape,dtype=np.float64)
-            self._intwave = np.empty(shape=self.binwave.shape,dtype=np.float64)
-            for i in range(len(self._indices)):
-                first = self._indices[i]
-                last = self._indices_last[i]
-                self._binflux[i]=(avflux[first:last]*self._deltaw[first:last]).sum()/self._deltaw[first:last].sum()
-                self._intwave[i]=self._deltaw[first:last].sum()
+        deltaw = spwave[1:] - spwave[:-1]
 
-        #Save the endpoints for future use
-        self._bin_edges = endpoints
+        # sum over each bin; like all Python striding, the range over
+        # which we integrate is [first:last).
+        binflux, intwave = binning.calculate_binflux(
+            indices[:-1], indices[1:], avflux, deltaw)
+
+        return spwave, flux, endpoints, indices, deltaw, binflux, intwave
 
     def _getBinfluxProp(self):
+        return self._convertbinflux(self.fluxunits)
+
+    def _convertbinflux(self, fluxunits):
+        """Return binned flux in the given unit, without changing
+        ``self.fluxunits``. For internal use only."""
         if self._binflux is None:
             self.initbinflux()
 
@@ -350,7 +426,7 @@ class Observation(spectrum.CompositeSourceSpectrum):
 
         binflux = units.Photlam().Convert(self.binwave,
                                           self._binflux,
-                                          self.fluxunits.name,
+                                          units.Units(fluxunits).name,
                                           area=area)
         return binflux
 
@@ -471,8 +547,6 @@ class Observation(spectrum.CompositeSourceSpectrum):
         if self._binflux is None:
           self.initbinflux()
 
-        myfluxunits = self.fluxunits.name
-        self.convert('counts')
         warn=False
         if binned:
             #No range specified - use full range
@@ -499,16 +573,15 @@ class Observation(spectrum.CompositeSourceSpectrum):
                     ux=np.searchsorted(self._bin_edges,range[1])
 
 
-            ans = math.fsum(self.binflux[lx:ux])
+            ans = math.fsum(self._convertbinflux('counts')[lx:ux])
             if warn and not force:
                 raise exceptions.PartialOverlap("%s does not fully overlap binwave range %s. Countrate in overlap area is %f"%(range,[self.binwave[0],self.binwave[-1]],ans))
 
         else:
             if range is None:
-                ans = math.fsum(self.flux)
+                ans = math.fsum(self.getArrays(fluxunits='counts')[1])
             else:
                 raise NotImplementedError("Sorry, range+binned=False not yet implemented")
-        self.convert(myfluxunits)
         return ans
 
     def effstim(self,fluxunits='photlam'):
@@ -533,30 +606,23 @@ class Observation(spectrum.CompositeSourceSpectrum):
             Invalid integrated flux.
 
         """
-        oldunits=self.fluxunits
-        self.convert(fluxunits)
         x=units.Units(fluxunits)
-        try:
-            if x.isDensity:
-                rate=self.integrate()
-                self._fluxcheck(rate)
-                if x.isMag:
-                    ans=x.unitResponse(self.bandpass) - 2.5*math.log10(rate)
-                else:
-                    ans=rate*x.unitResponse(self.bandpass)
+        if x.isDensity:
+            rate=self.integrate()
+            self._fluxcheck(rate)
+            if x.isMag:
+                ans=x.unitResponse(self.bandpass) - 2.5*math.log10(rate)
             else:
-                if x.isMag:
-                    #its linear unit must be counts
-                    self.convert('counts')
-                    total=self.flux.sum()
-                    self._fluxcheck(total)
-                    ans=-2.5*math.log10(total)
-                else:
-                    ans=self.flux.sum()
-                    self._fluxcheck(ans)
-        finally:
-            self.convert(oldunits)
-            del x
+                ans=rate*x.unitResponse(self.bandpass)
+        else:
+            if x.isMag:
+                #its linear unit must be counts
+                total=self.getArrays(fluxunits='counts')[1].sum()
+                self._fluxcheck(total)
+                ans=-2.5*math.log10(total)
+            else:
+                ans=self.getArrays(fluxunits=x)[1].sum()
+                self._fluxcheck(ans)
 
         return ans
 
@@ -624,24 +690,146 @@ class Observation(spectrum.CompositeSourceSpectrum):
             Effective wavelength.
 
         """
-        myfluxunits=self.fluxunits.name
-        self.convert('flam')
         if binned:
             wave=self.binwave
-            flux=self.binflux
+            flux=self._convertbinflux('flam')
         else:
-            wave=self.wave
-            flux=self.flux
+            wave,flux=self.getArrays(fluxunits='flam')
 
         num = self.trapezoidIntegration(wave,flux*wave*wave)
         den = self.trapezoidIntegration(wave,flux*wave)
-        self.convert(myfluxunits)
 
         if num == 0.0 or den == 0.0:
             return 0.0
 
         return num/den
 
+    def photometry(self, fluxunits=('photlam',), binned=True):
+        """Calculate all standard photometric quantities at once.
+
+        The observation is evaluated only once, and every quantity
+        is calculated from the same arrays. Unlike :meth:`countrate`,
+        :meth:`effstim`, :meth:`pivot`, and :meth:`efflam`, this never
+        changes ``self.fluxunits`` or stores binned flux, so it can be
+        called from several threads on a shared observation.
+
+        .. note::
+
+            Pivot and effective wavelengths are in Angstrom.
+            They are the same as from the individual methods
+            when ``self.waveunits`` is Angstrom.
+
+        Parameters
+        ----------
+        fluxunits : str or list of str
+            Flux unit(s) for effective stimulus.
+
+        binned : bool
+            Use binned dataset for count rate, pivot, and effective
+            wavelength. Otherwise, use native dataset.
+
+        Returns
+        -------
+        ans : dict
+            Count rate (``'countrate'``), effective stimulus for each
+            flux unit (``'effstim'``, a dict keyed by unit), pivot
+            wavelength (``'pivot'``), effective wavelength
+            (``'efflam'``), and bandpass equivalent width
+            (``'equivwidth'``).
+
+        Raises
+        ------
+        ValueError
+            Invalid integrated flux.
+
+        """
+        if isinstance(fluxunits, str):
+            fluxunits = [fluxunits]
+
+        wave = self.GetWaveSet()
+        if binned:
+            (spwave, spflux, endpoints, indices, deltaw,
+             binflux, intwave) = self._calcbinflux()
+            flux = _subset(spwave, spflux, wave)
+            if flux is None:
+                flux = self(wave)
+            binwave = np.asarray(self.binwave, dtype=np.float64)
+            bincenter = _subset(spwave, spflux, binwave)
+            if bincenter is None:
+                bincenter = self(binwave)
+        else:
+            flux = self(wave)
+
+        if hasattr(self, 'primary_area'):
+            area = self.primary_area
+        else:
+            area = None
+        counts = units.Photlam().Convert(wave, flux, 'counts', area=area)
+
+        # all density units share the same integral in photlam
+        rate = None
+        effstim = {}
+        for name in fluxunits:
+            x = units.Units(name)
+            if x.isDensity:
+                if rate is None:
+                    rate = self._exactIntegral()
+                    if rate is None:
+                        uwave = units.Angstrom().Convert(
+                            wave, self.waveunits.name)
+                        rate = self.trapezoidIntegration(uwave, flux)
+                    self._fluxcheck(rate)
+                if x.isMag:
+                    ans = x.unitResponse(self.bandpass) - 2.5*math.log10(rate)
+                else:
+                    ans = rate*x.unitResponse(self.bandpass)
+            elif x.isMag:
+                #its linear unit must be counts
+                total = counts.sum()
+                self._fluxcheck(total)
+                ans = -2.5*math.log10(total)
+            else:
+                ans = units.Photlam().Convert(
+                    wave, flux, x.name, area=area).sum()
+                self._fluxcheck(ans)
+            effstim[name] = ans
+
+        if binned:
+            if hasattr(self.bandpass, 'primary_area'):
+                binarea = self.bandpass.primary_area
+            else:
+                binarea = None
+            countrate = math.fsum(units.Photlam().Convert(
+                binwave, binflux, 'counts', area=binarea))
+            pivwave, pivflux = binwave, bincenter
+            effwave, effflux = binwave, units.Photlam().Convert(
+                binwave, binflux, 'flam', area=binarea)
+        else:
+            countrate = math.fsum(counts)
+            pivwave, pivflux = wave, flux
+            effwave, effflux = wave, units.Photlam().Convert(
+                wave, flux, 'flam', area=area)
+
+        num = self.trapezoidIntegration(pivwave, pivflux*pivwave)
+        den = self.trapezoidIntegration(pivwave, pivflux/pivwave)
+        if num == 0.0 or den == 0.0:
+            pivot = 0.0
+        else:
+            pivot = math.sqrt(num/den)
+
+        num = self.trapezoidIntegration(effwave, effflux*effwave*effwave)
+        den = self.trapezoidIntegration(effwave, effflux*effwave)
+        if num == 0.0 or den == 0.0:
+            efflam = 0.0
+        else:
+            efflam = num/den
+
+        return {'countrate': countrate,
+                'effstim': effstim,
+                'pivot': pivot,
+                'efflam': efflam,
+                'equivwidth': self.bandpass.equivwidth()}
+
     def sample(self, swave, binned=True, fluxunits='counts'):
         """Sample the observation at the given wavelength.
         Also see :ref:`pysynphot-command-sample`.
@@ -678,12 +866,6 @@ class Observation(spectrum.CompositeSourceSpectrum):
         if fluxunits != 'counts':
             s = "Sorry, only counts are supported at this time"
             raise NotImplementedError(s)
-        else:
-            #Save current fluxunits, in case they're different
-            saveunits = None
-            if not units.ismatch('counts', self.fluxunits):
-                saveunits = self.fluxunits
-                self.convert('counts')
 
 
         if binned:
@@ -698,7 +880,7 @@ class Observation(spectrum.CompositeSourceSpectrum):
                 #idx[-1] is the largest edge that is still smaller
                 #than swave
                 try:
-                    ans = self.binflux[idx[-1]]
+                    ans = self._convertbinflux('counts')[idx[-1]]
                 except IndexError:
                     s = 'Value out of range: wavelength %g not contained in range [%g, %g]'
                     s = s % (swave, self.binwave[0], self.binwave[-1])
@@ -711,18 +893,15 @@ class Observation(spectrum.CompositeSourceSpectrum):
 
         else:
             #Then we do interpolate on wave/flux
+            wave, flux = self.getArrays(fluxunits='counts')
             if np.isscalar(swave):
                 delta = 0.00001
                 wv = np.array([swave - delta, swave, swave + delta])
-                ans = np.interp(wv, self.wave, self.flux)[1]
+                ans = np.interp(wv, wave, flux)[1]
             else:
                 # This raises UnboundLocalError -- needs to be fixed!
-                ans = np.interp(wv, self.wave, self.flux)
-
+                ans = np.interp(wv, wave, flux)
 
-        #Change units back, if necessary, then return
-        if saveunits is not None:
-            self.convert(saveunits)
         return ans
 
     def pixel_range(self, waverange, waveunits=None, round='round'):
@@ -14,6 +14,7 @@
 """
 from __future__ import absolute_import, division, print_function
 
+import copy
 import glob
 import re
 import os
@@ -21,6 +22,7 @@ import warnings
 import numpy as N
 from astropy.io import fits as pyfits
 
+from . import Cache
 from . import refs
 from . import spectrum
 from . import units
@@ -41,6 +43,13 @@ wavecat = locations.wavecat
 
 CLEAR = 'clear'
 
+def _stripband(obsmode):
+    """Strip ``band()`` syntax from an observation mode, if present."""
+    tmatch=re.search(r'band\((.*?)\)',obsmode,re.IGNORECASE)
+    if tmatch:
+        obsmode=tmatch.group(1)
+    return obsmode
+
 
 class BaseObservationMode(object):
     """Class that handles the graph table, common to both optical and
@@ -83,9 +92,7 @@ class BaseObservationMode(object):
     """
     def __init__(self, obsmode, method='HSTGraphTable', graphtable=None):
         #Strip "band()" syntax if present
-        tmatch=re.search(r'band\((.*?)\)',obsmode,re.IGNORECASE)
-        if tmatch:
-            obsmode=tmatch.group(1)
+        obsmode = _stripband(obsmode)
         self._obsmode = obsmode
 
         if graphtable is None:
@@ -150,13 +157,9 @@ class BaseObservationMode(object):
         files = []
         for compname in compnames:
             if compname not in [None, '', CLEAR]:
-                index = N.where(comptable.compnames == compname)
-                try:
-                    iraffilename = comptable.filenames[index[0][0]]
-                    filename = irafconvert(iraffilename)
-                    files.append(filename.lstrip())
-                except IndexError:
+                if compname not in comptable:
                     raise IndexError("Can't find %s in comptable %s"%(compname,comptable.name))
+                files.append(comptable.GetFileName(compname))
             else:
                 files.append(CLEAR)
 
@@ -190,25 +193,39 @@ class BaseObservationMode(object):
         observation mode, as defined by ``pysynphot.locations.wavecat``.
         Also see :ref:`pysynphot-refdata`.
 
+        Results are cached in ``pysynphot.Cache.BINSET_CACHE``.
+
         Returns
         -------
         bandwave : array_like
+            Read-only wavelength set in Angstrom.
 
         """
         if self.binset.startswith('('):
-            return self._computeBandwave(self.binset)
+            key = self.binset
+        else:
+            key = Cache.reffile_key(irafconvert(self.binset), 'binset')
+
+        result = None if key is None else Cache.BINSET_CACHE.get(key)
+        if result is not None:
+            return result
+
+        if self.binset.startswith('('):
+            result = self._computeBandwave(self.binset)
         else:
-            return self._getBandwaveFomFile(self.binset)
+            result = self._getBandwaveFomFile(self.binset)
+
+        if key is not None:
+            result.flags.writeable = False
+            Cache.BINSET_CACHE.put(key, result, result.nbytes)
+        return result
 
     def _computeBandwave(self, coeff):
         (a,b,c,nwave) = self._computeQuadraticCoefficients(coeff)
 
-        result = N.zeros(shape=[nwave,], dtype=N.float64)
+        i = N.arange(nwave, dtype=N.float64)
 
-        for i in range(nwave):
-            result[i] = ((a * i) + b) * i + c
-
-        return result
+        return ((a * i) + b) * i + c
 
     def _computeQuadraticCoefficients(self, coeff):
 
@@ -261,8 +278,10 @@ class ObservationMode(BaseObservationMode):
     comptable : str or `None`
         Component table name. If `None`, it is taken from `~pysynphot.refs`.
 
-    component_dict : dict
+    component_dict : dict or `None`
         Maps component filename to corresponding component object.
+        New components are added to it. If `None`, components are
+        only shared within this observation mode.
 
     Attributes
     ----------
@@ -297,8 +316,10 @@ class ObservationMode(BaseObservationMode):
 
     """
     def __init__(self, obsmode, method='HSTGraphTable',graphtable=None,
-                 comptable=None, component_dict = {}):
+                 comptable=None, component_dict=None):
 
+        if component_dict is None:
+            component_dict = {}
         if graphtable is None:
             graphtable = refs.GRAPHTABLE
         if comptable is None:
@@ -401,28 +422,63 @@ class ObservationMode(BaseObservationMode):
         return product
 
 
-    def ThermalSpectrum(self):
+    def ThermalSpectrum(self, temperatures=None):
         """Calculate thermal spectrum.
 
+        The thermal model of the observation mode is built once and
+        cached in ``pysynphot.Cache.THERMAL_CACHE``, keyed by
+        observation mode, graph table, component table, and thermal
+        component table. Use ``pysynphot.Cache.reset_thermal_cache()``
+        after changing thermal files on disk.
+
+        Parameters
+        ----------
+        temperatures : dict or `None`
+            Temperatures in Kelvin, keyed by thermal component name
+            (see ``self.thcompnames``). Values may be numbers or 1-D
+            arrays, which are broadcast together. Components not given
+            keep their default temperature. If `None` (default), all
+            components are at their default temperature.
+
         Returns
         -------
-        sp : `~pysynphot.spectrum.CompositeSourceSpectrum`
-            Thermal spectrum in ``photlam``.
+        sp : `~pysynphot.spectrum.SourceSpectrum` or `~pysynphot.spectrum.SpectrumGrid`
+            Thermal spectrum in ``photlam``. If ``temperatures`` is
+            given, a grid with one spectrum per set of temperatures.
 
         Raises
         ------
         IndexError
             Calculation failed.
 
+        KeyError
+            Unknown thermal component in ``temperatures``.
+
         """
         try:
             # delegate to subclass.
-            thom = _ThermalObservationMode(self._obsmode)
-            self.pixscale = thom.pixscale
-            return thom._getSpectrum()
+            thom = self._getThermalMode()
         except IndexError:   # graph table is broken.
             raise IndexError("Cannot calculate thermal spectrum; graphtable may be broken")
 
+        self.pixscale = thom.pixscale
+        if temperatures is None:
+            return thom._getSpectrum()
+        return thom._getSpectrumGrid(temperatures)
+
+    def _getThermalMode(self):
+        """Return the cached `_ThermalObservationMode` of this
+        observation mode, building it if needed."""
+        key = (self._obsmode, self.gtname, self.ctname, refs.THERMTABLE)
+        thom = Cache.THERMAL_CACHE.get(key)
+        if thom is None or thom._default_waveset is not refs._default_waveset:
+            thom = _ThermalObservationMode(self._obsmode,
+                                           graphtable=self.gtname,
+                                           comptable=self.ctname)
+            thom._getSpectrum()
+            Cache.THERMAL_CACHE.put(key, thom, thom._nbytes())
+        return thom
+
 
 class _ThermalObservationMode(BaseObservationMode):
     """Class to handle thermal observation mode."""
@@ -474,19 +530,27 @@ class _ThermalObservationMode(BaseObservationMode):
         self.pixscale = self._getPixelScale()
         self.name = obsmode+" (thermal)"
 
+        # Built on first call of _getSpectrum().
+        self._default_waveset = refs._default_waveset
+        self._spectrum = None
+        self._program = None
+
     def _getPixelScale(self):
         obsmode = self._obsmode.split(',')
         obsmode = str(obsmode[0]) + ',' + str(obsmode[1])
 
         fname= locations.get_data_filename('detectors.dat')
-        fs = open(fname,mode='r')
-        lines = fs.readlines()
-        fs.close()
+        if fname not in Cache.DETECTOR_CACHE:
+            fs = open(fname,mode='r')
+            lines = fs.readlines()
+            fs.close()
 
-        regx = re.compile(r'\S+', re.IGNORECASE)
-        for line in lines:
+            regx = re.compile(r'\S+', re.IGNORECASE)
+            Cache.DETECTOR_CACHE[fname] = [regx.findall(line)
+                                           for line in lines]
+
+        for tokens in Cache.DETECTOR_CACHE[fname]:
             try:
-                tokens = regx.findall(line)
                 if tokens[0] == obsmode:
                     break
             except Exception as e:
@@ -507,6 +571,7 @@ class _ThermalObservationMode(BaseObservationMode):
 
             component = _ThermalComponent(throughput_name, thermal_name, \
                                           interpval=self.pardict.get(parkey))
+            component.thcompname = self.thcompnames[i]
             if not component.isEmpty():
                 components.append(component)
 
@@ -524,6 +589,22 @@ class _ThermalObservationMode(BaseObservationMode):
         return BaseObservationMode._multiplyThroughputs(self, index)
 
     def _getSpectrum(self):
+        """Return a copy of the thermal spectrum at default temperatures."""
+        if self._spectrum is None:
+            self._buildSpectrum()
+        return copy.copy(self._spectrum)
+
+    def _buildSpectrum(self):
+        """Compute the thermal spectrum at default temperatures.
+
+        Every emitting component adds its emission to the spectrum
+        transmitted so far, and the sum is tabulated on its merged
+        wavelength set. The evaluation plans of these sums are kept
+        in ``self._program`` so that :meth:`_getSpectrumGrid` can
+        repeat the calculation for other temperatures on the same
+        wavelength sets.
+
+        """
         wave=self._getWavesetIntersection()
         sp = spectrum.ArraySourceSpectrum(wave=wave,
                        flux=N.zeros(shape=wave.shape,dtype=N.float64),
@@ -535,6 +616,10 @@ class _ThermalObservationMode(BaseObservationMode):
         minw = sp._wavetable[0]
         maxw = sp._wavetable[-1]
 
+        # Each step is (component, tabulated spectrum, blackbody, plan).
+        program = []
+        tab = sp
+
         for component in self.components:
             # transmissive section
             if component.throughput != None:
@@ -550,11 +635,114 @@ class _ThermalObservationMode(BaseObservationMode):
                           component.emissivity
 
                 sp = sp + sp_comp
+                program.append((component, tab, bb, sp.compile()))
 
                 sp = spectrum.trimSpectrum(sp, minw, maxw)
+                tab = sp
 
+        if sp is not tab:
+            program.append((None, tab, None, sp.compile()))
+
+        self._spectrum = sp
+        self._program = program
         return sp
 
+    def _getSpectrumGrid(self, temperatures):
+        """Compute the thermal spectrum for arrays of temperatures.
+
+        The steps of :meth:`_buildSpectrum` are repeated on the same
+        wavelength sets with one row per set of temperatures, and the
+        blackbodies of all the components are evaluated in one call of
+        :func:`~pysynphot.planck.bb_photlam_arcsec`.
+
+        Parameters
+        ----------
+        temperatures : dict
+            See :meth:`ObservationMode.ThermalSpectrum`.
+
+        Returns
+        -------
+        grid : `~pysynphot.spectrum.SpectrumGrid`
+
+        Raises
+        ------
+        KeyError
+            Unknown thermal component in ``temperatures``.
+
+        """
+        self._getSpectrum()
+        emitting = [step for step in self._program if step[2] is not None]
+
+        names = set(step[0].thcompname.lower() for step in emitting)
+        temperatures = dict((str(k).lower(), v)
+                            for k, v in temperatures.items())
+        unknown = set(temperatures).difference(names)
+        if unknown:
+            raise KeyError('%s not thermal components of %s' %
+                           (sorted(unknown), self._obsmode))
+
+        temps = [temperatures.get(step[0].thcompname.lower(),
+                                  step[0].emissivity.temperature)
+                 for step in emitting]
+        temps = N.broadcast_arrays(*[N.atleast_1d(N.asarray(t, dtype=N.float64))
+                                     for t in temps])
+        if temps and temps[0].ndim != 1:
+            raise ValueError('Temperatures must be numbers or 1-D arrays')
+        nrows = temps[0].size if temps else 1
+
+        # Blackbodies of all the components at once.
+        bbwave = [step[2]._wavetable for step in emitting]
+        if emitting:
+            cols = N.concatenate([N.repeat(t[:, None], w.size, axis=1)
+                                  for t, w in zip(temps, bbwave)], axis=1)
+            bbflux = planck.bb_photlam_arcsec(N.concatenate(bbwave), cols)
+            bbflux = N.split(bbflux, N.cumsum([w.size for w in bbwave])[:-1],
+                             axis=1)
+
+        tab = self._program[0][1] if self._program else self._spectrum
+        wave = tab._wavetable
+        flux = N.zeros((nrows, wave.size), dtype=N.float64)
+        minw = wave[0]
+        maxw = wave[-1]
+        k = 0
+
+        for component, oldtab, bb, plan in self._program:
+            wave = plan.waveset
+            values = []
+            for leaf in plan.leaves:
+                if leaf is oldtab:
+                    values.append(spectrum._interprows(wave, oldtab._wavetable,
+                                                       flux))
+                elif leaf is bb:
+                    values.append(spectrum._interprows(wave, bb._wavetable,
+                                                       bbflux[k]))
+                else:
+                    values.append(leaf(wave))
+            flux = N.broadcast_to(plan._combine(values), (nrows, wave.size))
+
+            if bb is not None:
+                k += 1
+                # same as trimSpectrum()
+                mask = (wave >= minw) & (wave <= maxw)
+                wave = wave[mask]
+                flux = flux[:, mask]
+
+        return spectrum.SpectrumGrid(wave, flux, keepneg=True,
+                                     name="%s %s" % (self.name, 'ThermalSpectrum'))
+
+    def _nbytes(self):
+        """Return the approximate size of the tables of this object
+        in bytes."""
+        arrays = [getattr(self._spectrum, '_wavetable', None),
+                  getattr(self._spectrum, '_fluxtable', None)]
+        for component in self.components:
+            for sp in (component.throughput, component.emissivity):
+                arrays.append(getattr(sp, '_wavetable', None))
+                arrays.append(getattr(sp, '_throughputtable', None))
+        for step in self._program or ():
+            arrays.append(step[3].waveset)
+        return sum(x.nbytes for x in arrays if isinstance(x, N.ndarray))
+
     def _getWavesetIntersection(self):
         minw = refs._default_waveset[0]
         maxw = refs._default_waveset[-1]
@@ -30,6 +30,9 @@ class ExtinctionSpectralElement(ArraySpectralElement):
     def GetThroughput(self):
         return self.__call__(self._wavetable)
 
+    def _getInternalArrays(self):
+        return self._wavetable, self(self._wavetable)
+
     throughput = property(GetThroughput, doc='Throughput property.')
 
 
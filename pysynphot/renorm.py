@@ -1,10 +1,9 @@
 """This module handles normalization of source spectrum flux."""
 from __future__ import division, print_function
 
-import math
 import numpy as np
 from . import units
-from .spectrum import FlatSpectrum, Vega
+from .spectrum import FlatSpectrum, SpectrumGrid, Vega, _fluxcheck
 from .refs import _default_waveset
 from .exceptions import DisjointError, OverlapError
 
@@ -93,18 +92,6 @@ def StdRenorm(spectrum, band, RNval, RNunitstring, force=False):
             raise DisjointError('Spectrum and renormalization band are '
                                 'disjoint.')
 
-    # Compute the flux of the spectrum through the bandpass and make sure
-    # the result makes sense.
-    sp = spectrum * band
-
-    totalflux = sp.integrate()
-    if totalflux <= 0.0:
-        raise ValueError('Integrated flux is <= 0')
-    if np.isnan(totalflux):
-        raise ValueError('Integrated flux is NaN')
-    if np.isinf(totalflux):
-        raise ValueError('Integrated flux is infinite')
-
     # Get the standard unit spectrum in the renormalization units
     RNunits = units.Units(RNunitstring)
     if RNunits.isDensity:
@@ -112,15 +99,33 @@ def StdRenorm(spectrum, band, RNval, RNunitstring, force=False):
     else:
         up = RNunits.StdSpectrum
 
+    # Compute the flux of the spectrum through the bandpass and make sure
+    # the result makes sense. Closed-form integrals are only used if both
+    # are analytic, so that sampling errors cancel in the ratio.
+    sp = spectrum * band
+    if isinstance(sp, SpectrumGrid):
+        # This is an array with one value per spectrum.
+        totalflux = sp.integrate()
+        upflux = None
+    else:
+        totalflux = sp._exactIntegral()
+        upflux = None if totalflux is None else up._exactIntegral()
+        if upflux is None:
+            totalflux = sp._sampledIntegral()
+    if upflux is None:
+        upflux = up._sampledIntegral()
+
+    _fluxcheck(totalflux)
+
     # Renormalize in magnitudes....
     if RNunits.isMag:
-        ratio = totalflux / up.integrate()
-        dmag = RNval + 2.5 * math.log10(ratio)
+        ratio = totalflux / upflux
+        dmag = RNval + 2.5 * np.log10(ratio)
         newsp = spectrum.addmag(dmag)
 
     #...or in linear flux units.
     else:
-        const = RNval * (up.integrate() / totalflux)
+        const = RNval * (upflux / totalflux)
         newsp = spectrum * const
 
     # Return the new spectrum
@@ -11,11 +11,13 @@ import re
 import os
 import math
 import warnings
+import weakref
 
 from astropy.io import fits as pyfits
 from astropy.utils.data import get_file_contents
 import numpy as N
 
+from . import Cache
 from . import refs
 from . import units
 from . import locations
@@ -47,6 +49,12 @@ MERGETHRESH = 1.e-12
 # synphot to read the entries as distinct single-precision numbers.
 syn_epsilon = 0.00032
 
+# Closed-form integration of analytic objects (see Integrator._quadrature):
+# Gauss-Legendre nodes per interval, and the largest ratio of the end
+# wavelengths of an interval between two breakpoints.
+QUAD_NODES, QUAD_WEIGHTS = N.polynomial.legendre.leggauss(16)
+QUAD_MAXRATIO = 1.1
+
 
 def MergeWaveSets(waveset1, waveset2):
     """Return the union of the two wavelength sets.
@@ -140,11 +148,497 @@ def trimSpectrum(sp, minw, maxw):
     return result
 
 
+def _isfrozen(a):
+    """Return `True` if ``a`` and any array it is a view of are read-only,
+    so that its contents cannot change. For internal use only."""
+    while isinstance(a, N.ndarray):
+        if a.flags.writeable:
+            return False
+        a = a.base
+    return True
+
+
+#: Bookkeeping cost in bytes charged for each entry of
+#: ``pysynphot.Cache.INTERP_CACHE``, so that keys seen only once are
+#: evicted like any other entry.
+_INTERP_ENTRY_BYTES = 256
+
+
+def _interp(x, xp, fp, version=0):
+    """Linearly interpolate ``fp``, defined on ascending ``xp``, at
+    ``x``, using :func:`numpy.interp`.
+
+    Tabular spectra are interpolated onto the same wavelength sets over
+    and over (e.g., every component of a bandpass onto the merged
+    wavelength set of an observation). If the three arrays are
+    read-only, like the wavelength sets of evaluation plans and tables
+    loaded from reference files, results are therefore cached in
+    ``pysynphot.Cache.INTERP_CACHE``, keyed by the identity of the
+    arrays and the ``version`` of the object owning the tables, and a
+    copy is returned. A result is only stored the second time a key is
+    seen, so that arrays used once do not fill the cache, and it is
+    dropped when any of the arrays is deleted. Writable arrays may
+    change in place, so they are always interpolated.
+    For internal use only.
+
+    """
+    if (not isinstance(x, N.ndarray) or x.size < 2 or
+            not isinstance(xp, N.ndarray) or not isinstance(fp, N.ndarray) or
+            xp.size == 0 or
+            not (_isfrozen(x) and _isfrozen(xp) and _isfrozen(fp))):
+        return N.interp(x, xp, fp)
+
+    key = (id(x), id(xp), id(fp))
+    fingerprint = (version, x.shape, x.flat[0], x.flat[-1],
+                   xp.size, xp[0], xp[-1], fp[0], fp[-1])
+    entry = Cache.INTERP_CACHE.get(key)
+    if (entry is not None and entry[0]() is x and entry[1]() is xp and
+            entry[2]() is fp and entry[3] == fingerprint):
+        if entry[4] is not None:
+            return entry[4].copy()
+        ans = N.interp(x, xp, fp)
+        cached = ans.copy()
+        nbytes = cached.nbytes + _INTERP_ENTRY_BYTES
+    else:
+        # First sighting: only remember the key.
+        ans = N.interp(x, xp, fp)
+        cached = None
+        nbytes = _INTERP_ENTRY_BYTES
+
+    def _discard(ref, key=key):
+        Cache.INTERP_CACHE.pop(key)
+
+    try:
+        wrefs = tuple(weakref.ref(a, _discard) for a in (x, xp, fp))
+    except TypeError:
+        return ans
+    Cache.INTERP_CACHE.put(key, wrefs + (fingerprint, cached), nbytes)
+    return ans
+
+
+def _interprows(x, xp, fp):
+    """Linearly interpolate every row of ``fp`` at ``x``, with values
+    outside ``xp`` extrapolated at constant value. This is
+    :func:`numpy.interp` for a 2-D ``fp`` sharing one ascending ``xp``.
+    For internal use only."""
+    shape = fp.shape[:1] + N.shape(x)
+    x = N.atleast_1d(x)
+    if xp.size == 1:
+        return N.repeat(fp, x.size, axis=1).reshape(shape)
+
+    j = N.clip(N.searchsorted(xp, x, side='right') - 1, 0, xp.size - 2)
+    x0 = xp[j]
+    f0 = fp[:, j]
+    ans = (fp[:, j + 1] - f0) / (xp[j + 1] - x0) * (x - x0) + f0
+    ans[:, x < xp[0]] = fp[:, :1]
+    ans[:, x >= xp[-1]] = fp[:, -1:]
+    return ans.reshape(shape)
+
+
+def _fluxcheck(totalflux):
+    """Raise `ValueError` if any integrated flux is invalid.
+    For internal use only."""
+    if N.any(totalflux <= 0.0):
+        raise ValueError('Integrated flux is <= 0')
+    if N.any(N.isnan(totalflux)):
+        raise ValueError('Integrated flux is NaN')
+    if N.any(N.isinf(totalflux)):
+        raise ValueError('Integrated flux is infinite')
+
+
+def _treeleaves(node):
+    """Yield the non-composite objects in the tree of ``node``, as
+    flattened by `EvaluationPlan`, without merging wavelength sets.
+    For internal use only."""
+    if _isflattenable(node):
+        for leaf in _treeleaves(node.component1):
+            yield leaf
+        for leaf in _treeleaves(node.component2):
+            yield leaf
+    else:
+        yield node
+
+
+def _treecall(node, wave):
+    """Evaluate ``node`` at the given wavelengths by walking its tree,
+    without merging wavelength sets. For internal use only."""
+    if not _isflattenable(node):
+        return node(wave)
+    a = _treecall(node.component1, wave)
+    b = _treecall(node.component2, wave)
+    if getattr(node, 'operation', 'multiply') == 'add':
+        return a + b
+    return a * b
+
+
+def _smoothunits(fluxunits):
+    """Return `True` if conversion from the given flux unit to
+    ``photlam`` is a smooth function of wavelength alone, i.e., it does
+    not depend on bin widths (counts) or on a tabulated spectrum (Vega).
+    For internal use only."""
+    return fluxunits.isDensity and not isinstance(fluxunits, units.VegaMag)
+
+
+def _linearwaveunits(waveunits):
+    """Return the factor converting Angstrom to the given wavelength
+    unit, or `None` if the conversion is not linear. For internal use
+    only."""
+    if isinstance(waveunits, (units.Angstrom, units._MetricWavelength)):
+        return units.Angstrom().Convert(1.0, waveunits.name)
+    return None
+
+
+def _ismapped(table):
+    """Return `True` if ``table`` is a read-only memory-mapped array
+    (see `~pysynphot.Cache.set_mmap_dir`). For internal use only."""
+    return isinstance(table, N.memmap) and not table.flags.writeable
+
+
+def _samestate(a, b):
+    """Return `True` if two states from ``_arraystate`` are the same.
+    For internal use only."""
+    if a is None or b is None:
+        return False
+    return (a[0] == b[0] and len(a[1]) == len(b[1]) and
+            all(x is y for x, y in zip(a[1], b[1])))
+
+
+def _scalarstate(obj):
+    """Return the names and values of the scalar attributes of ``obj``,
+    which define objects given in closed form. For internal use only."""
+    return tuple((k, v) for k, v in sorted(obj.__dict__.items())
+                 if not isinstance(v, (N.ndarray, dict, list, tuple)))
+
+
+def _planstate(node):
+    """Return the ``_arraystate`` of a composite object, combining
+    its evaluation plan with the states of all the plan leaves.
+    For internal use only."""
+    plan = node.compile()
+    versions = [node._version]
+    objects = [plan]
+    for leaf in plan.leaves:
+        state = None if leaf is node else leaf._arraystate()
+        if state is None:
+            return None
+        versions.extend(state[0])
+        objects.extend(state[1])
+    return tuple(versions), tuple(objects)
+
+
+def _copycomposite(node):
+    """Return a shallow copy of a composite object. The copy shares the
+    cached evaluation plan, which is checked against the copy from then
+    on. For internal use only."""
+    new = node.__class__.__new__(node.__class__)
+    new.__dict__.update(node.__dict__)
+    new.__dict__.pop('_arrays', None)
+    plan = node.__dict__.get('_plan')
+    if plan is not None:
+        new._plan = plan._rebind(node, new)
+    return new
+
+
+def _isflattenable(node):
+    """Return `True` if ``node`` is a composite whose evaluation is
+    exactly the combination of its two components. Subclasses that
+    override ``__call__`` are treated as opaque leaves."""
+    if isinstance(node, CompositeSourceSpectrum):
+        return type(node).__call__ is CompositeSourceSpectrum.__call__
+    if isinstance(node, CompositeSpectralElement):
+        return type(node).__call__ is CompositeSpectralElement.__call__
+    return False
+
+
+class EvaluationPlan(object):
+    """Flat evaluation plan for a composite spectrum or bandpass.
+
+    A composite object is a binary tree of components. Evaluating it
+    recursively re-merges the wavelength sets at every level of the
+    tree. The plan walks the tree once and records the distinct leaves,
+    a postfix program of ``'add'`` and ``'multiply'`` steps, and the
+    merged wavelength set. Evaluation then calls each leaf once and
+    combines the results in place.
+
+    Plans are built by :meth:`CompositeSourceSpectrum.compile` and
+    :meth:`CompositeSpectralElement.compile`, which rebuild them when
+    a composite node in the tree is given new components, when any
+    object in the tree is invalidated (see :meth:`Integrator.invalidate`),
+    or when the default wavelength set changes.
+
+    Parameters
+    ----------
+    root : `CompositeSourceSpectrum` or `CompositeSpectralElement`
+        Composite object to flatten.
+
+    Attributes
+    ----------
+    leaves : list
+        Distinct non-composite objects in the tree, in evaluation order.
+
+    steps : list
+        Postfix program. An integer pushes the value of the leaf with
+        that index; ``'add'`` or ``'multiply'`` combines the top two values.
+
+    waveset : array_like or `None`
+        Merged wavelength set of the tree, in internal unit.
+
+    """
+    def __init__(self, root):
+        self.leaves = []
+        self.steps = []
+        self._nodes = []
+        self._versions = []
+        self._leafwave = []
+        self._leafindex = {}
+        self._default_waveset = refs._default_waveset
+        self.waveset = self._flatten(root, isroot=True)
+        del self._leafindex
+
+        # The merged set is never modified, so that interpolation onto
+        # it is cached by identity (see _interp).
+        if self.waveset is not None and not _isfrozen(self.waveset):
+            self.waveset = self.waveset.copy()
+            self.waveset.setflags(write=False)
+
+    def _flatten(self, node, isroot=False):
+        # The root is always flattened, even if it is opaque to the
+        # plans of composites containing it.
+        if isroot or _isflattenable(node):
+            comp1, comp2 = node.component1, node.component2
+            self._nodes.append((node, comp1, comp2, node._version))
+            wave1 = self._flatten(comp1)
+            wave2 = self._flatten(comp2)
+            self.steps.append(getattr(node, 'operation', 'multiply'))
+            return MergeWaveSets(wave1, wave2)
+
+        try:
+            index = self._leafindex[id(node)]
+        except KeyError:
+            index = len(self.leaves)
+            self._leafindex[id(node)] = index
+            self.leaves.append(node)
+            self._versions.append((node._version, node._parameters()))
+            self._leafwave.append(node.GetWaveSet())
+        self.steps.append(index)
+        return self._leafwave[index]
+
+    def _rebind(self, old, new):
+        """Return a copy of this plan where the composite node ``old``
+        is replaced by its shallow copy ``new``. For internal use only."""
+        plan = EvaluationPlan.__new__(EvaluationPlan)
+        plan.__dict__.update(self.__dict__)
+        plan._nodes = [(new if node is old else node, comp1, comp2, version)
+                       for node, comp1, comp2, version in self._nodes]
+        return plan
+
+    def isvalid(self):
+        """Check that no object in the tree has changed since the plan
+        was built.
+
+        Returns
+        -------
+        ans : bool
+
+        """
+        if refs._default_waveset is not self._default_waveset:
+            return False
+        for node, comp1, comp2, version in self._nodes:
+            if (node.component1 is not comp1 or
+                    node.component2 is not comp2 or
+                    node._version != version):
+                return False
+        for leaf, (version, params) in zip(self.leaves, self._versions):
+            if leaf._version != version or leaf._parameters() != params:
+                return False
+        return True
+
+    def __call__(self, wavelength=None):
+        """Evaluate the plan.
+
+        Parameters
+        ----------
+        wavelength : number, array_like, or `None`
+            Wavelength(s) in Angstrom. If `None`, ``self.waveset`` is used.
+
+        Returns
+        -------
+        ans : number or array_like
+            Flux in ``photlam`` or unitless throughput.
+
+        """
+        if wavelength is None:
+            wavelength = self.waveset
+
+        return self._combine([leaf(wavelength) for leaf in self.leaves])
+
+    def _combine(self, values):
+        """Run the postfix program on the given leaf values, which may
+        also be 2-D arrays with one row per spectrum. For internal use only."""
+        # Each stack entry is (value, owned); owned arrays were allocated
+        # here and may be overwritten by the next step.
+        stack = []
+        for step in self.steps:
+            if not isinstance(step, str):
+                stack.append((values[step], False))
+                continue
+
+            b, bown = stack.pop()
+            a, aown = stack.pop()
+            if step == 'add':
+                ufunc = N.add
+            else:
+                ufunc = N.multiply
+
+            if aown and N.shape(b) == a.shape and \
+                    N.result_type(a, b) == a.dtype:
+                ans = ufunc(a, b, out=a)
+            elif bown and N.shape(a) == b.shape and \
+                    N.result_type(a, b) == b.dtype:
+                ans = ufunc(a, b, out=b)
+            else:
+                ans = ufunc(a, b)
+            stack.append((ans, isinstance(ans, N.ndarray) and ans.ndim > 0))
+
+        return stack[0][0]
+
+
 class Integrator(object):
     """Integrator engine, which is the base class for
     `SourceSpectrum` and `SpectralElement`.
 
     """
+    # Incremented whenever the internal tables change; see invalidate().
+    _version = 0
+
+    def invalidate(self):
+        """Mark the internal tables of this object as changed.
+
+        Composite objects containing this one cache their merged
+        wavelength set and evaluation plan; they are rebuilt on next
+        use after this is called. Methods that change the internal
+        tables, such as ``ToInternal`` and ``_reverse_wave``, call this
+        automatically. It only needs to be called explicitly after
+        modifying the tables directly.
+
+        """
+        self._version += 1
+
+    def _parameters(self):
+        """Return the values of the parameters that define this object
+        in closed form, which may be changed directly without calling
+        :meth:`invalidate`. Tabular objects have none. For internal use only."""
+        return ()
+
+    def _arraystate(self):
+        """Return ``(versions, objects)`` identifying the current state
+        of the internal tables, or `None` if it cannot be identified.
+        Two states are the same if the versions are equal and the
+        objects are identical. For internal use only."""
+        return ((self._version, self._parameters()),
+                (refs._default_waveset,
+                 getattr(self, '_wavetable', None),
+                 getattr(self, '_fluxtable', None),
+                 getattr(self, '_throughputtable', None)))
+
+    def _breakpoints(self):
+        """Return wavelengths in Angstrom where this object, or one of
+        its derivatives, is discontinuous, or where it varies on a
+        scale much smaller than the wavelength.
+
+        Objects with a closed-form definition that is smooth between
+        these wavelengths are integrated exactly by :meth:`_quadrature`.
+        The default, `None`, means that the object is only known at
+        sampled wavelengths and is integrated with
+        :meth:`trapezoidIntegration`. For internal use only.
+
+        """
+        return None
+
+    def _quadrature(self):
+        """Return ``(wave, weights, values)`` to integrate this object
+        in closed form over the range of its wavelength set, or `None`
+        if any of its components does not support it. Composite objects
+        are handled component by component, without building their
+        merged wavelength set.
+
+        The range is split at :meth:`_breakpoints`, and further into
+        intervals whose end wavelengths differ by at most a factor of
+        ``QUAD_MAXRATIO``, each with ``QUAD_NODES`` Gauss-Legendre
+        nodes. The integral of ``f(wave, values)`` over the range is
+        then ``(weights * f(wave, values)).sum()``, which is exact for
+        piecewise polynomials such as a flat spectrum in a box, and
+        accurate to near machine precision for the smooth analytic
+        spectra. For internal use only.
+
+        """
+        bps = []
+        lo = hi = None
+        for leaf in _treeleaves(self):
+            leafbps = leaf._breakpoints()
+            if leafbps is None:
+                return None
+            bps.append(N.asarray(leafbps, dtype=N.float64))
+
+            waveset = leaf.GetWaveSet()
+            if waveset is not None and waveset.size > 0:
+                lo = min(waveset.min(), lo if lo is not None else N.inf)
+                hi = max(waveset.max(), hi if hi is not None else 0)
+        if lo is None or lo >= hi:
+            return None
+
+        bps = N.concatenate(bps)
+        edges = N.unique(N.concatenate(
+            [[lo, hi], bps[(bps > lo) & (bps < hi)]]))
+        # Split each interval into nsub geometric steps.
+        logratio = N.log(edges[1:] / edges[:-1])
+        nsub = N.ceil(logratio / math.log(QUAD_MAXRATIO)).astype(int)
+        start = N.repeat(N.cumsum(nsub) - nsub, nsub)
+        step = N.arange(start.size) - start
+        index = N.repeat(N.arange(nsub.size), nsub)
+        edges = N.append(
+            edges[index] * N.exp(logratio[index] * step / nsub[index]), hi)
+
+        half = 0.5 * (edges[1:] - edges[:-1])
+        mid = 0.5 * (edges[1:] + edges[:-1])
+        wave = (mid[:, N.newaxis] +
+                half[:, N.newaxis] * QUAD_NODES).ravel()
+        weights = (half[:, N.newaxis] * QUAD_WEIGHTS).ravel()
+        return wave, weights, _treecall(self, wave)
+
+    def _fromReffileCache(self, key):
+        """Restore the state of an object loaded earlier from the same
+        reference file (see `~pysynphot.Cache.REFFILE_CACHE`). Return
+        `True` on success. For internal use only."""
+        if key is None:
+            return False
+        state = Cache.REFFILE_CACHE.get(key)
+        if state is None:
+            return False
+        for name, value in state.items():
+            if isinstance(value, dict):
+                value = value.copy()  # e.g., fheader
+            setattr(self, name, value)
+        return True
+
+    def _toReffileCache(self, key):
+        """Store the state of an object just loaded from a reference
+        file. Its table arrays become read-only, as they are shared with
+        every other object loaded from the cache. For internal use only."""
+        if key is None:
+            return
+        state = {}
+        nbytes = 0
+        for name, value in self.__dict__.items():
+            if isinstance(value, N.ndarray):
+                value.flags.writeable = False
+                if not _ismapped(value):
+                    nbytes += value.nbytes
+            elif isinstance(value, dict):
+                value = value.copy()
+            state[name] = value
+        Cache.REFFILE_CACHE.put(key, state, nbytes)
+
     def trapezoidIntegration(self, x, y):
         """Perform trapezoid integration.
 
@@ -175,6 +669,26 @@ class Integrator(object):
         else:
             return 0.0
 
+    def _ascendingTables(self, table):
+        """Return the wavelength table and the given table of values
+        ordered by ascending wavelength, as needed by :func:`numpy.interp`.
+
+        Descending tables are reversed with views, once per pair of
+        tables; the result is reused until either table is replaced.
+        This is for internal use only.
+
+        """
+        cache = getattr(self, '_asctables', None)
+        if (cache is None or cache[0] is not self._wavetable or
+                cache[1] is not table):
+            wave = self._wavetable
+            if wave[0] < wave[-1]:
+                cache = (wave, table, wave, table)
+            else:
+                cache = (wave, table, wave[::-1], table[::-1])
+            self._asctables = cache
+        return cache[2], cache[3]
+
     def _columnsFromASCII(self, filename):
         """Following synphot/TABLES, ASCII files may contain blank lines,
         comment lines (beginning with '#'), or terminal comments. This routine
@@ -256,6 +770,9 @@ class Integrator(object):
         """
         # neg. magnitudes are legal
         if ((not self.fluxunits.isMag) and (self._fluxtable.min() < 0)):
+            if not self._fluxtable.flags.writeable:
+                # Memory-mapped tables are read-only.
+                self._fluxtable = self._fluxtable.copy()
             idx = N.where(self._fluxtable < 0)
             self._fluxtable[idx] = 0.0
             print("Warning, %d of %d bins contained negative fluxes; they "
@@ -331,32 +848,71 @@ class SourceSpectrum(Integrator):
         else:
             raise TypeError(".addmag() only takes a constant scalar argument")
 
-    def getArrays(self):
+    def getArrays(self, waveunits=None, fluxunits=None):
         """Return wavelength and flux arrays in user units.
 
+        The arrays are cached for each combination of units and area,
+        and recalculated only when the internal tables of this spectrum
+        or of any of its components change (see
+        :meth:`~Integrator.invalidate`).
+
+        Parameters
+        ----------
+        waveunits, fluxunits : str or `None`
+            Units of the returned arrays. If `None`, ``self.waveunits``
+            or ``self.fluxunits`` is used. Passing units here does not
+            change the units of the spectrum.
+
         Returns
         -------
         wave : array_like
-            Wavelength array in ``self.waveunits``.
+            Wavelength array in the requested unit.
 
         flux : array_like
-            Flux array in ``self.fluxunits``.
+            Flux array in the requested unit.
             When necessary, ``self.primary_area`` is used for unit conversion.
 
         """
+        if waveunits is None:
+            waveunits = self.waveunits
+        else:
+            waveunits = units.Units(waveunits)
+        if fluxunits is None:
+            fluxunits = self.fluxunits
+        else:
+            fluxunits = units.Units(fluxunits)
+
         if hasattr(self, 'primary_area'):
             area = self.primary_area
         else:
             area = None
 
-        wave = self.GetWaveSet()
-        flux = self(wave)
-
-        flux = units.Photlam().Convert(
-            wave, flux, self.fluxunits.name, area=area)
-        wave = units.Angstrom().Convert(wave, self.waveunits.name)
+        # Cached arrays are dropped as soon as the state changes.
+        state = self._arraystate()
+        cache = getattr(self, '_arrays', None)
+        if cache is None or not _samestate(cache[0], state):
+            cache = self._arrays = (state, {})
 
-        return wave, flux
+        key = (waveunits.name, fluxunits.name, area)
+        try:
+            wave, flux = cache[1][key]
+        except KeyError:
+            wave, flux = self._getInternalArrays()
+            flux = units.Photlam().Convert(
+                wave, flux, fluxunits.name, area=area)
+            wave = units.Angstrom().Convert(wave, waveunits.name)
+            if state is None:
+                return wave, flux
+            cache[1][key] = (wave, flux)
+
+        # Callers may modify the arrays in place.
+        return wave.copy(), flux.copy()
+
+    def _getInternalArrays(self):
+        """Return wavelength and flux arrays in internal units
+        (Angstrom and ``photlam``). For internal use only."""
+        wave = self.GetWaveSet()
+        return wave, self(wave)
 
     # Define properties for consistent UI
     def _getWaveProp(self):
@@ -545,7 +1101,10 @@ class SourceSpectrum(Integrator):
 
         Integration is done using :meth:`~Integrator.trapezoidIntegration`
         with ``x=wave`` and ``y=flux``, where flux has been
-        convert to given unit first.
+        convert to given unit first. If the spectrum and all its
+        components are analytic, the flux is in a linear flux-density
+        unit, and the wavelength is in a metric unit, the integral over
+        the range of ``wave`` is calculated in closed form instead.
 
         .. math::
 
@@ -565,11 +1124,31 @@ class SourceSpectrum(Integrator):
             is ``photon/s/cm^2``.
 
         """
+        ans = self._exactIntegral(fluxunits)
+        if ans is None:
+            ans = self._sampledIntegral(fluxunits)
+        return ans
+
+    def _exactIntegral(self, fluxunits='photlam'):
+        """Return :meth:`integrate` in closed form, or `None` if that
+        is not supported. For internal use only."""
+        fluxunits = units.Units(fluxunits)
+        scale = _linearwaveunits(self.waveunits)
+        if scale is None or not fluxunits.isDensity or fluxunits.isMag:
+            return None
+        quad = self._quadrature()
+        if quad is None:
+            return None
+
+        wave, weights, flux = quad
+        flux = units.Photlam().Convert(wave, flux, fluxunits.name)
+        return (weights * flux).sum() * scale
+
+    def _sampledIntegral(self, fluxunits='photlam'):
+        """Return :meth:`integrate` calculated with trapezoid integration
+        on the wavelength set. For internal use only."""
         # Extract the flux in the desired units
-        u = self.fluxunits
-        self.convert(fluxunits)
-        wave, flux = self.getArrays()
-        self.convert(u)
+        wave, flux = self.getArrays(fluxunits=fluxunits)
         # then do the integration
         return self.trapezoidIntegration(wave, flux)
 
@@ -680,20 +1259,14 @@ class SourceSpectrum(Integrator):
 
         """
         # By default, apply only the doppler shift.
-
-        waveunits = self.waveunits
-        fluxunits = self.fluxunits
-        self.convert('angstrom')
-        self.convert('photlam')
-        newwave = self.wave.astype(N.float64) * (1.0 + z)
+        wave, flux = self.getArrays('angstrom', 'photlam')
+        newwave = wave.astype(N.float64) * (1.0 + z)
         copy = ArraySourceSpectrum(wave=newwave,
-                                   flux=self.flux,
-                                   waveunits=self.waveunits,
-                                   fluxunits=self.fluxunits,
+                                   flux=flux,
+                                   waveunits='angstrom',
+                                   fluxunits='photlam',
                                    name="%s at z=%g" % (self.name, z))
 
-        self.convert(waveunits)
-        self.convert(fluxunits)
         return copy
 
     def setMagnitude(self, band, value):
@@ -877,13 +1450,50 @@ class CompositeSourceSpectrum(SourceSpectrum):
 
     def __call__(self, wavelength):
         """Add or multiply components, delegating the function calculation
-        to the individual objects.
+        to the individual objects through the evaluation plan.
         """
-        if self.operation == 'add':
-            return self.component1(wavelength) + self.component2(wavelength)
+        return self.compile()(wavelength)
+
+    def compile(self):
+        """Return the flat evaluation plan for this spectrum.
 
-        if self.operation == 'multiply':
-            return self.component1(wavelength) * self.component2(wavelength)
+        The plan is built on first use and cached. It is rebuilt if any
+        composite node in the tree has been given new components.
+
+        Returns
+        -------
+        plan : `EvaluationPlan`
+
+        """
+        plan = getattr(self, '_plan', None)
+        if plan is None or not plan.isvalid():
+            plan = EvaluationPlan(self)
+            self._plan = plan
+        return plan
+
+    def invalidate(self):
+        """Discard the cached evaluation plan and wavelength set.
+        See :meth:`Integrator.invalidate`."""
+        self._plan = None
+        SourceSpectrum.invalidate(self)
+
+    def __copy__(self):
+        return _copycomposite(self)
+
+    def _arraystate(self):
+        """Return the state of the evaluation plan and of all its leaves.
+        See :meth:`Integrator._arraystate`."""
+        return _planstate(self)
+
+    def _getInternalArrays(self):
+        # Evaluate on the plan's own wavelength set, which keeps its
+        # identity between calls so that cached interpolation plans apply.
+        plan = self.compile()
+        flux = plan()
+        wave = plan.waveset
+        if wave is not None:
+            wave = wave.copy()
+        return wave, flux
 
     def __iter__(self):
         """Allow iteration over each component."""
@@ -906,17 +1516,19 @@ class CompositeSourceSpectrum(SourceSpectrum):
     def GetWaveSet(self):
         """Obtain the wavelength set for the composite spectrum.
         This is done by using :func:`MergeWaveSets` to form a union of
-        wavelength sets from its components.
+        wavelength sets from its components. The union is cached in the
+        evaluation plan (see :meth:`compile`).
 
         Returns
         -------
         waveset : array_like
-            Composite wavelength set.
+            Composite wavelength set (a copy of the cached one).
 
         """
-        waveset1 = self.component1.GetWaveSet()
-        waveset2 = self.component2.GetWaveSet()
-        return MergeWaveSets(waveset1, waveset2)
+        waveset = self.compile().waveset
+        if waveset is not None:
+            waveset = waveset.copy()
+        return waveset
 
     def tabulate(self):
         """Return a simplified version of the spectrum.
@@ -982,15 +1594,18 @@ class TabularSourceSpectrum(SourceSpectrum):
         self.isAnalytic = False
         self.warnings = {}
         if filename:
-            self._readSpectrumFile(filename, fluxname)
-            self.filename = filename
-            self.validate_units()
-            self.validate_wavetable()
-            if not keepneg:
-                self.validate_fluxtable()
-            self.ToInternal()
-            self.name = self.filename
-            self.isAnalytic = False
+            key = Cache.reffile_key(filename, type(self), fluxname, keepneg)
+            if not self._fromReffileCache(key):
+                self._readSpectrumFile(filename, fluxname)
+                self.filename = filename
+                self.validate_units()
+                self.validate_wavetable()
+                if not keepneg:
+                    self.validate_fluxtable()
+                self.ToInternal()
+                self.name = self.filename
+                self.isAnalytic = False
+                self._toReffileCache(key)
         else:
             self._wavetable = None
             self._fluxtable = None
@@ -1001,6 +1616,7 @@ class TabularSourceSpectrum(SourceSpectrum):
 
     def _reverse_wave(self):
         self._wavetable = self._wavetable[::-1]
+        self.invalidate()
 
     def __str__(self):
         return str(self.name)
@@ -1012,19 +1628,18 @@ class TabularSourceSpectrum(SourceSpectrum):
             self._readASCII(filename)
 
     def _readFITS(self, filename, fluxname):
-        fs = pyfits.open(filename)
-
-        # pyfits cannot close the file on .close() if there are still
-        # references to mmapped data
-        self._wavetable = fs[1].data.field('wavelength').copy()
         if fluxname is None:
             fluxname = 'flux'
-        self._fluxtable = fs[1].data.field(fluxname).copy()
 
-        self.waveunits = units.Units(fs[1].header['tunit1'].lower())
-        self.fluxunits = units.Units(fs[1].header['tunit2'].lower())
+        with pyfits.open(filename) as fs:
+            # pyfits cannot close the file on .close() if there are still
+            # references to mmapped data, so these are copies or views of
+            # native-endian files (see Cache.set_mmap_dir).
+            self._wavetable, self._fluxtable = Cache.read_columns(
+                fs, ['wavelength', fluxname])
 
-        fs.close()
+            self.waveunits = units.Units(fs[1].header['tunit1'].lower())
+            self.fluxunits = units.Units(fs[1].header['tunit2'].lower())
 
     def _readASCII(self, filename):
         """ASCII files have no headers. Following synphot, this
@@ -1044,14 +1659,10 @@ class TabularSourceSpectrum(SourceSpectrum):
         the wavelength values input.
 
         """
-        if N.isscalar(wavelengths):
-            delta = 0.0001
-            ww = N.array([wavelengths - delta, wavelengths,
-                          wavelengths + delta])
-            tmp = self.resample(ww)
-            return tmp._fluxtable[1]
-        else:
-            return self.resample(wavelengths)._fluxtable
+        # Interpolate directly on the internal tables; this gives the
+        # same values as resample() without building a new spectrum.
+        wave, flux = self._ascendingTables(self._fluxtable)
+        return _interp(wavelengths, wave, flux, self._version)
 
     def taper(self):
         """Taper the spectrum by adding zero flux to each end.
@@ -1108,28 +1719,10 @@ class TabularSourceSpectrum(SourceSpectrum):
             Resampled spectrum.
 
         """
-        # Check whether the input wavetab is in descending order
-        if resampledWaveTab[0] < resampledWaveTab[-1]:
-            newwave = resampledWaveTab
-            newasc = True
-        else:
-            newwave = resampledWaveTab[::-1]
-            newasc = False
-
-        # Use numpy interpolation function
-        if self._wavetable[0] < self._wavetable[-1]:
-            oldasc = True
-            ans = N.interp(newwave, self._wavetable, self._fluxtable)
-        else:
-            oldasc = False
-            rev = N.interp(newwave, self._wavetable[::-1],
-                           self._fluxtable[::-1])
-            ans = rev[::-1]
-
-        # If the new and old waveset don't have the same parity,
-        # the answer has to be flipped again
-        if (newasc != oldasc):
-            ans = ans[::-1]
+        # Interpolate on the internal tables in ascending order; the
+        # new wavelength set may be in either order.
+        wave, flux = self._ascendingTables(self._fluxtable)
+        ans = _interp(resampledWaveTab, wave, flux, self._version)
 
         # Finally, make the new object
         # NB: these manipulations were done using the internal
@@ -1180,11 +1773,17 @@ class TabularSourceSpectrum(SourceSpectrum):
         phoflux = self.fluxunits.Convert(angwave, self._fluxtable, 'photlam',
                                          area=area)
 
-        self._wavetable = angwave.copy()
-        self._fluxtable = phoflux.copy()
+        # Memory-mapped tables already in internal units are kept as is.
+        if not (_ismapped(self._wavetable) and
+                self.waveunits.name == 'angstrom'):
+            self._wavetable = angwave.copy()
+        if not (_ismapped(self._fluxtable) and
+                self.fluxunits.name == 'photlam'):
+            self._fluxtable = phoflux.copy()
 
         self.waveunits = savewunits
         self.fluxunits = savefunits
+        self.invalidate()
 
 
 class ArraySourceSpectrum(TabularSourceSpectrum):
@@ -1245,105 +1844,583 @@ class ArraySourceSpectrum(TabularSourceSpectrum):
         self.isAnalytic = False
         self.warnings = {}
 
-        # must do before validate_fluxtable because it tests against unit type
-        self.validate_units()
-        # must do before ToInternal in case of descending
-        self.validate_wavetable()
-        if not keepneg:
-            self.validate_fluxtable()
+        # must do before validate_fluxtable because it tests against unit type
+        self.validate_units()
+        # must do before ToInternal in case of descending
+        self.validate_wavetable()
+        if not keepneg:
+            self.validate_fluxtable()
+
+        self.ToInternal()
+
+
+class FileSourceSpectrum(TabularSourceSpectrum):
+    """Class to handle
+    :ref:`source spectrum loaded from ASCII or FITS table <pysynphot-source-from-file>`.
+    Also see :ref:`pysynphot-io`.
+
+    Parameters
+    ----------
+    filename : str
+        File with spectral data (can be ASCII or FITS).
+
+    fluxname : str or `None`
+        Column name containing flux data. This is only used if the given
+        file is in FITS format.
+
+    keepneg : bool
+        Keep negative flux values instead of setting them to zero with
+        a warning. Default is `False`.
+
+    Attributes
+    ----------
+    name : str
+        Resolved filename; i.e., IRAF-style directory name is expanded to actual path name.
+
+    fheader : dict
+        For FITS file, this contains headers from both extensions 0 and 1. If the extensions have the same keyword, the one from the latter is used.
+
+    warnings : dict
+        To store warnings.
+
+    isAnalytic : bool
+        This is always `False`.
+
+    waveunits, fluxunits : `~pysynphot.units.Units`
+        User units for wavelength and flux.
+
+    wave, flux : array_like
+        Wavelength set and associated flux in user units.
+
+    """
+    def __init__(self, filename, fluxname=None, keepneg=False):
+        self.name = locations.irafconvert(filename)
+        key = Cache.reffile_key(self.name, type(self), fluxname, keepneg)
+        if not self._fromReffileCache(key):
+            self._readSpectrumFile(self.name, fluxname)
+            self.validate_units()
+            self.validate_wavetable()
+            if not keepneg:
+                self.validate_fluxtable()
+            self.ToInternal()
+            self._toReffileCache(key)
+        self.isAnalytic = False
+        self.warnings = {}
+
+    def _readSpectrumFile(self, filename, fluxname):
+        if filename.endswith('.fits') or filename.endswith('.fit'):
+            self._readFITS(filename, fluxname)
+        else:
+            self._readASCII(filename)
+
+    def _readFITS(self, filename, fluxname):
+        if fluxname is None:
+            fluxname = 'flux'
+
+        with pyfits.open(filename) as fs:
+            # pyfits cannot close the file on .close() if there are still
+            # references to mmapped data, so these are copies or views of
+            # native-endian files (see Cache.set_mmap_dir).
+            self._wavetable, self._fluxtable = Cache.read_columns(
+                fs, ['wavelength', fluxname])
+            self.waveunits = units.Units(fs[1].header['tunit1'].lower())
+            self.fluxunits = units.Units(fs[1].header['tunit2'].lower())
+
+            # Retain the header information as a convenience for the user.
+            # If duplicate keywords exist, the value in the extension
+            # header will override that in the primary.
+            self.fheader = dict(fs[0].header)
+            self.fheader.update(dict(fs[1].header))
+
+    def _readASCII(self, filename):
+        """ASCII files have no headers. Following synphot, this
+        routine will assume the first column is wavelength in Angstroms,
+        and the second column is flux in Flam."""
+
+        self.waveunits = units.Units('angstrom')
+        self.fluxunits = units.Units('flam')
+        wlist, flist = self._columnsFromASCII(filename)
+        self._wavetable = N.array(wlist, dtype=N.float64)
+        self._fluxtable = N.array(flist, dtype=N.float64)
+
+        # We don't support headers from ascii files
+        self.fheader = dict()
+
+
+class SpectrumGrid(Integrator):
+    """Class to handle many source spectra sharing one wavelength set.
+
+    The fluxes are stored as a single 2-D array with one row per
+    spectrum, so that operations on the whole set are done with
+    array arithmetic rather than one spectrum object at a time.
+    As with other source spectra, the data are kept in internal
+    units (Angstrom and ``photlam``) and only converted to user
+    units on output.
+
+    Multiplying by a `SpectralElement` evaluates every row on the
+    merged wavelength set, as `CompositeSourceSpectrum` would for a
+    single spectrum. :meth:`integrate`, :meth:`effstim`, and
+    :meth:`renorm` work on all rows at once.
+
+    Parameters
+    ----------
+    wave : array_like
+        Wavelength values, shared by all spectra.
+
+    flux : array_like
+        Flux values with shape ``(nspec, nwave)``. A 1-D array is
+        treated as a single spectrum.
+
+    waveunits, fluxunits : str
+        Wavelength and flux units, as accepted by `~pysynphot.units.Units`.
+        Defaults are Angstrom and ``photlam``.
+
+    names : list of str or `None`
+        Name of each spectrum.
+
+    keepneg : bool
+        Keep negative flux values instead of setting them to zero with
+        a warning. Default is `False`.
+
+    Attributes
+    ----------
+    names
+        Same as input, or generated names if not given.
+
+    name : str
+        Short description of the grid.
+
+    warnings : dict
+        To store warnings.
+
+    isAnalytic : bool
+        This is always `False`.
+
+    primary_area : number or `None`
+        :ref:`pysynphot-area` of the telescope, if available.
+
+    waveunits, fluxunits : `~pysynphot.units.Units`
+        User units for wavelength and flux.
+
+    wave, flux : array_like
+        Wavelength set and associated 2-D flux in user units.
+
+    Raises
+    ------
+    ValueError
+        Mismatched wavelength and flux arrays.
+
+    """
+    def __init__(self, wave, flux, waveunits='angstrom', fluxunits='photlam',
+                 names=None, keepneg=False, name='UnnamedSpectrumGrid'):
+        wave = N.asarray(wave, dtype=N.float64)
+        flux = N.array(flux, dtype=N.float64, ndmin=2)
+        if flux.ndim != 2 or flux.shape[1] != wave.size:
+            raise ValueError("flux must have shape (nspec, %d)" % wave.size)
+
+        self._wavetable = wave
+        self._fluxtable = flux
+        self.waveunits = units.Units(waveunits)
+        self.fluxunits = units.Units(fluxunits)
+        self.name = name
+        self.isAnalytic = False
+        self.warnings = {}
+        self.primary_area = None
+
+        if names is None:
+            names = ['%s[%d]' % (name, i) for i in range(len(flux))]
+        elif len(names) != len(flux):
+            raise ValueError("names must have one entry per spectrum")
+        self.names = list(names)
+
+        self.validate_units()
+        self.validate_wavetable()
+        if not keepneg:
+            self.validate_fluxtable()
+
+        self.ToInternal()
+
+    @classmethod
+    def from_spectra(cls, spectra, wave=None, name='UnnamedSpectrumGrid'):
+        """Sample a list of source spectra on a common wavelength set.
+
+        Parameters
+        ----------
+        spectra : list of `SourceSpectrum`
+            Spectra to combine. User units and
+            :ref:`pysynphot-area` are taken from the first one.
+
+        wave : array_like or `None`
+            Wavelength set in Angstrom. If `None`, the union of the
+            wavelength sets of all the spectra is used.
+
+        name : str
+            Name of the grid.
+
+        Returns
+        -------
+        grid : `SpectrumGrid`
+
+        """
+        spectra = list(spectra)
+        if wave is None:
+            for sp in spectra:
+                wave = MergeWaveSets(wave, sp.GetWaveSet())
+
+        wave = N.asarray(wave, dtype=N.float64)
+        flux = N.empty((len(spectra), wave.size), dtype=N.float64)
+        for i, sp in enumerate(spectra):
+            flux[i] = sp(wave)
+
+        grid = cls(wave, flux, names=[str(sp) for sp in spectra],
+                   keepneg=True, name=name)
+        grid.waveunits = spectra[0].waveunits
+        grid.fluxunits = spectra[0].fluxunits
+        grid.primary_area = getattr(spectra[0], 'primary_area', None)
+        return grid
+
+    def _copy(self, wave, flux, names=None, name=None):
+        """Return a new grid with the given internal arrays and
+        the units and area of ``self``."""
+        if names is None:
+            names = self.names
+        if name is None:
+            name = self.name
+        grid = SpectrumGrid(wave, flux, names=names, keepneg=True, name=name)
+        grid.waveunits = self.waveunits
+        grid.fluxunits = self.fluxunits
+        grid.primary_area = self.primary_area
+        return grid
+
+    def __str__(self):
+        return str(self.name)
+
+    def __len__(self):
+        return len(self._fluxtable)
+
+    def __getitem__(self, index):
+        """Return one spectrum as `ArraySourceSpectrum`, or a subset
+        of the grid as `SpectrumGrid`."""
+        if isinstance(index, (int, N.integer)):
+            sp = ArraySourceSpectrum(wave=self._wavetable.copy(),
+                                     flux=self._fluxtable[index].copy(),
+                                     waveunits='angstrom',
+                                     fluxunits='photlam',
+                                     name=self.names[index],
+                                     keepneg=True)
+            sp.convert(self.waveunits)
+            sp.convert(self.fluxunits)
+            if self.primary_area is not None:
+                sp.primary_area = self.primary_area
+            return sp
+
+        rows = N.arange(len(self))[index]
+        return self._copy(self._wavetable, self._fluxtable[rows],
+                          names=[self.names[i] for i in rows])
+
+    def validate_units(self):
+        """Ensure that wavelength and flux units belong to the
+        correct classes.
+
+        Raises
+        ------
+        TypeError
+            Wavelength unit is not `~pysynphot.units.WaveUnits` or
+            flux unit is not `~pysynphot.units.FluxUnits`.
+
+        """
+        if (not isinstance(self.waveunits, units.WaveUnits)):
+            raise TypeError("%s is not a valid WaveUnit" % self.waveunits)
+        if (not isinstance(self.fluxunits, units.FluxUnits)):
+            raise TypeError("%s is not a valid FluxUnit" % self.fluxunits)
+
+    def validate_fluxtable(self):
+        """Check for non-negative fluxes. See
+        :meth:`~Integrator.validate_fluxtable`."""
+        if ((not self.fluxunits.isMag) and (self._fluxtable.min() < 0)):
+            idx = N.where(self._fluxtable < 0)
+            self._fluxtable[idx] = 0.0
+            print("Warning, %d of %d bins contained negative fluxes; they "
+                  "have been set to zero." % (
+                      len(idx[0]), self._fluxtable.size))
+
+    def ToInternal(self):
+        """Convert to the internal representation of (angstroms, photlam),
+        with wavelengths in ascending order. This is for internal use only.
+
+        """
+        angwave = self.waveunits.Convert(self._wavetable, 'angstrom')
+        phoflux = self.fluxunits.Convert(angwave, self._fluxtable, 'photlam',
+                                         area=self.primary_area)
+        if angwave[0] > angwave[-1]:
+            angwave = angwave[::-1]
+            phoflux = phoflux[:, ::-1]
+
+        self._wavetable = N.ascontiguousarray(angwave, dtype=N.float64)
+        self._fluxtable = N.ascontiguousarray(phoflux, dtype=N.float64)
+        self.invalidate()
+
+    def GetWaveSet(self):
+        """Return the wavelength set for the grid.
+
+        Returns
+        -------
+        waveset : array_like
+            Wavelength set (a copy of the internal wavelength table).
+
+        """
+        return self._wavetable.copy()
+
+    def __call__(self, wavelengths):
+        """Interpolate all spectra at the given wavelengths in Angstrom.
+        Values outside the wavelength set are extrapolated at constant
+        value, as with `TabularSourceSpectrum`.
+
+        Returns
+        -------
+        flux : array_like
+            Flux in ``photlam`` with shape ``(nspec, nwave)``.
+
+        """
+        return _interprows(N.asarray(wavelengths, dtype=N.float64),
+                           self._wavetable, self._fluxtable)
+
+    def _convertflux(self, fluxunits):
+        """Return the internal flux converted to the given unit."""
+        return units.Photlam().Convert(self._wavetable, self._fluxtable,
+                                       units.Units(fluxunits).name,
+                                       area=self.primary_area)
+
+    def getArrays(self, waveunits=None, fluxunits=None):
+        """Return wavelength and flux arrays in user units.
+
+        Parameters
+        ----------
+        waveunits, fluxunits : str or `None`
+            See :meth:`SourceSpectrum.getArrays`.
+
+        Returns
+        -------
+        wave : array_like
+            Wavelength array in the requested unit.
+
+        flux : array_like
+            Flux array in the requested unit, with one row per spectrum.
+
+        """
+        if waveunits is None:
+            waveunits = self.waveunits
+        else:
+            waveunits = units.Units(waveunits)
+        if fluxunits is None:
+            fluxunits = self.fluxunits
+        else:
+            fluxunits = units.Units(fluxunits)
+
+        flux = self._convertflux(fluxunits)
+        wave = units.Angstrom().Convert(self._wavetable, waveunits.name)
+        return wave, flux
+
+    def _getWaveProp(self):
+        wave, flux = self.getArrays()
+        return wave
+
+    def _getFluxProp(self):
+        wave, flux = self.getArrays()
+        return flux
+
+    wave = property(_getWaveProp, doc="Wavelength property.")
+    flux = property(_getFluxProp, doc="Flux property.")
+
+    def convert(self, targetunits):
+        """Set new user unit, for either wavelength or flux.
+        See :meth:`SourceSpectrum.convert`.
+
+        Parameters
+        ----------
+        targetunits : str
+            New unit name, as accepted by `~pysynphot.units.Units`.
+
+        """
+        nunits = units.Units(targetunits)
+
+        if nunits.isFlux:
+            self.fluxunits = nunits
+        else:
+            self.waveunits = nunits
+
+    def __mul__(self, other):
+        """Multiply all spectra by a `SpectralElement`, a constant,
+        or an array with one factor per spectrum.
+        """
+        if isinstance(other, SpectralElement):
+            area = getattr(other, 'primary_area', None)
+            if area and self.primary_area and area != self.primary_area:
+                raise exceptions.IncompatibleSources(
+                    'Components have different area attributes: '
+                    '%s: %f, %s: %f' % (str(self), self.primary_area,
+                                        str(other), area))
+
+            wave = MergeWaveSets(self._wavetable, other.GetWaveSet())
+            flux = self(wave)
+            flux *= other(wave)
+            grid = self._copy(wave, flux, name='%s * %s' % (self, other))
+            grid.primary_area = self.primary_area or area
+            return grid
+
+        if N.isscalar(other):
+            factor = other
+        else:
+            factor = N.asarray(other, dtype=N.float64)
+            if factor.shape != (len(self),):
+                raise TypeError("SpectrumGrid can only be multiplied by "
+                                "SpectralElement objects, constants, or "
+                                "arrays of length %d" % len(self))
+            factor = factor[:, N.newaxis]
+
+        return self._copy(self._wavetable, self._fluxtable * factor)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def addmag(self, magval):
+        """Add magnitude(s) to existing flux values.
+        See :meth:`SourceSpectrum.addmag`.
+
+        Parameters
+        ----------
+        magval : number or array_like
+            Magnitude value, or one value per spectrum.
+
+        Returns
+        -------
+        grid : `SpectrumGrid`
+            New grid with adjusted flux values.
+
+        """
+        return self * 10**(-0.4 * N.asarray(magval, dtype=N.float64))
+
+    def redshift(self, z):
+        """Apply :ref:`redshift <pysynphot-redshift>` to all spectra.
+        As with :meth:`SourceSpectrum.redshift`, output units are always
+        Angstrom and ``photlam`` regardless of user units.
 
-        self.ToInternal()
+        Parameters
+        ----------
+        z : number
+            Redshift value.
 
+        Returns
+        -------
+        grid : `SpectrumGrid`
+            Redshifted grid.
 
-class FileSourceSpectrum(TabularSourceSpectrum):
-    """Class to handle
-    :ref:`source spectrum loaded from ASCII or FITS table <pysynphot-source-from-file>`.
-    Also see :ref:`pysynphot-io`.
+        """
+        newwave = self._wavetable * (1.0 + z)
+        grid = SpectrumGrid(newwave, self._fluxtable.copy(),
+                            names=self.names, keepneg=True,
+                            name='%s at z=%g' % (self.name, z))
+        grid.primary_area = self.primary_area
+        return grid
 
-    Parameters
-    ----------
-    filename : str
-        File with spectral data (can be ASCII or FITS).
+    def renorm(self, RNval, RNUnits, band, force=False):
+        """:ref:`Renormalize <pysynphot-renorm>` all spectra to the
+        specified value(s), unit, and bandpass.
+        See :meth:`SourceSpectrum.renorm`.
 
-    fluxname : str or `None`
-        Column name containing flux data. This is only used if the given
-        file is in FITS format.
+        Parameters
+        ----------
+        RNval : number or array_like
+            Flux value for renormalization, or one value per spectrum.
 
-    keepneg : bool
-        Keep negative flux values instead of setting them to zero with
-        a warning. Default is `False`.
+        RNUnits, band, force
+            See :meth:`SourceSpectrum.renorm`.
 
-    Attributes
-    ----------
-    name : str
-        Resolved filename; i.e., IRAF-style directory name is expanded to actual path name.
+        Returns
+        -------
+        grid : `SpectrumGrid`
+            Renormalized grid.
 
-    fheader : dict
-        For FITS file, this contains headers from both extensions 0 and 1. If the extensions have the same keyword, the one from the latter is used.
+        """
+        from .renorm import StdRenorm
+        return StdRenorm(self, band, RNval, RNUnits, force=force)
 
-    warnings : dict
-        To store warnings.
+    def _trapezoid(self, wave, flux):
+        """Trapezoid integration of every row of ``flux``.
+        See :meth:`~Integrator.trapezoidIntegration`."""
+        if wave.size == 0:
+            return N.zeros(len(flux))
+        deltas = wave[1:] - wave[:-1]
+        ans = (0.5 * (flux[:, 1:] + flux[:, :-1]) * deltas).sum(axis=-1)
+        if wave[-1] < wave[0]:
+            ans *= -1.0
+        return ans
 
-    isAnalytic : bool
-        This is always `False`.
+    def integrate(self, fluxunits='photlam'):
+        """Integrate the flux of every spectrum in given unit.
+        See :meth:`SourceSpectrum.integrate`.
 
-    waveunits, fluxunits : `~pysynphot.units.Units`
-        User units for wavelength and flux.
+        Parameters
+        ----------
+        fluxunits : str
+            Flux unit to integrate in.
 
-    wave, flux : array_like
-        Wavelength set and associated flux in user units.
+        Returns
+        -------
+        result : array_like
+            Integrated sum of each spectrum.
 
-    """
-    def __init__(self, filename, fluxname=None, keepneg=False):
-        self.name = locations.irafconvert(filename)
-        self._readSpectrumFile(self.name, fluxname)
-        self.validate_units()
-        self.validate_wavetable()
-        if not keepneg:
-            self.validate_fluxtable()
-        self.ToInternal()
-        self.isAnalytic = False
-        self.warnings = {}
+        """
+        wave = units.Angstrom().Convert(self._wavetable, self.waveunits.name)
+        return self._trapezoid(wave, self._convertflux(fluxunits))
 
-    def _readSpectrumFile(self, filename, fluxname):
-        if filename.endswith('.fits') or filename.endswith('.fit'):
-            self._readFITS(filename, fluxname)
-        else:
-            self._readASCII(filename)
+    def effstim(self, band, fluxunits='photlam'):
+        """Compute :ref:`effective stimulus <pysynphot-formula-effstim>`
+        of every spectrum through the given bandpass.
 
-    def _readFITS(self, filename, fluxname):
-        fs = pyfits.open(filename)
+        This gives the same result as
+        :meth:`~pysynphot.observation.Observation.effstim` for each
+        spectrum, using the native dataset.
 
-        # pyfits cannot close the file on .close() if there are still
-        # references to mmapped data
-        self._wavetable = fs[1].data.field('wavelength').copy()
-        if fluxname is None:
-            fluxname = 'flux'
-        self._fluxtable = fs[1].data.field(fluxname).copy()
-        self.waveunits = units.Units(fs[1].header['tunit1'].lower())
-        self.fluxunits = units.Units(fs[1].header['tunit2'].lower())
+        Parameters
+        ----------
+        band : `SpectralElement`
+            Bandpass.
 
-        # Retain the header information as a convenience for the user.
-        # If duplicate keywords exist, the value in the extension
-        # header will override that in the primary.
-        self.fheader = dict(fs[0].header)
-        self.fheader.update(dict(fs[1].header))
+        fluxunits : str
+            Flux unit.
 
-        fs.close()
+        Returns
+        -------
+        ans : array_like
+            Effective stimulus of each spectrum.
 
-    def _readASCII(self, filename):
-        """ASCII files have no headers. Following synphot, this
-        routine will assume the first column is wavelength in Angstroms,
-        and the second column is flux in Flam."""
+        Raises
+        ------
+        ValueError
+            Invalid integrated flux.
 
-        self.waveunits = units.Units('angstrom')
-        self.fluxunits = units.Units('flam')
-        wlist, flist = self._columnsFromASCII(filename)
-        self._wavetable = N.array(wlist, dtype=N.float64)
-        self._fluxtable = N.array(flist, dtype=N.float64)
+        """
+        obs = self * band
+        x = units.Units(fluxunits)
+        if x.isDensity:
+            rate = obs.integrate()
+            _fluxcheck(rate)
+            if x.isMag:
+                ans = x.unitResponse(band) - 2.5 * N.log10(rate)
+            else:
+                ans = rate * x.unitResponse(band)
+        else:
+            if x.isMag:
+                # its linear unit must be counts
+                total = obs._convertflux('counts').sum(axis=-1)
+                _fluxcheck(total)
+                ans = -2.5 * N.log10(total)
+            else:
+                ans = obs._convertflux(fluxunits).sum(axis=-1)
+                _fluxcheck(ans)
 
-        # We don't support headers from ascii files
-        self.fheader = dict()
+        return ans
 
 
 class AnalyticSpectrum(SourceSpectrum):
@@ -1380,6 +2457,10 @@ class AnalyticSpectrum(SourceSpectrum):
         self.isAnalytic = True
         self.warnings = {}
 
+    def _parameters(self):
+        """See :meth:`Integrator._parameters`."""
+        return _scalarstate(self)
+
     def GetWaveSet(self):
         """Return the wavelength set for the spectrum.
 
@@ -1502,6 +2583,16 @@ class GaussianSource(AnalyticSpectrum):
         waveset = N.arange(first, last, increment)
         return self._input_wave_units.Convert(waveset, 'angstrom')
 
+    def _breakpoints(self):
+        """Split the integration range at every :math:`\\sigma` within
+        :math:`10 \\sigma` of the center, unless the Gaussian is defined
+        in a flux unit that depends on sampling.
+        See :meth:`Integrator._breakpoints`."""
+        if not _smoothunits(self._input_flux_units):
+            return None
+        wave = self.center + self.sigma * N.arange(-10.0, 11.0)
+        return self._input_wave_units.Convert(wave[wave > 0], 'angstrom')
+
 
 class FlatSpectrum(AnalyticSpectrum):
     """Class to handle a :ref:`flat source spectrum <pysynphot-flat-spec>`.
@@ -1563,6 +2654,13 @@ class FlatSpectrum(AnalyticSpectrum):
 
         return self._input_flux_units.ToPhotlam(wave, flux, area=area)
 
+    def _breakpoints(self):
+        """Flat spectrum is smooth, unless defined in a flux unit that
+        depends on sampling. See :meth:`Integrator._breakpoints`."""
+        if _smoothunits(self._input_flux_units):
+            return N.array([])
+        return None
+
     def redshift(self, z):
         """Apply redshift to the flat spectrum.
 
@@ -1658,6 +2756,13 @@ class Powerlaw(AnalyticSpectrum):
         # convert flux to photlam before returning
         return self._input_flux_units.ToPhotlam(wave, flux, area=area)
 
+    def _breakpoints(self):
+        """Power law is smooth, unless defined in a flux unit that
+        depends on sampling. See :meth:`Integrator._breakpoints`."""
+        if _smoothunits(self._input_flux_units):
+            return N.array([])
+        return None
+
 
 class BlackBody(AnalyticSpectrum):
     """Class to handle a :ref:`blackbody source <pysynphot-planck-law>`.
@@ -1709,6 +2814,10 @@ class BlackBody(AnalyticSpectrum):
     def __call__(self, wavelength):
         return planck.bbfunc(wavelength, self.temperature) * RENORM
 
+    def _breakpoints(self):
+        """Blackbody is smooth. See :meth:`Integrator._breakpoints`."""
+        return N.array([])
+
 
 class SpectralElement(Integrator):
     """This is the base class for all :ref:`bandpasses <pysynphot-bandpass>`
@@ -1748,6 +2857,9 @@ class SpectralElement(Integrator):
         if isinstance(other, SourceSpectrum):
             return CompositeSourceSpectrum(self, other, 'multiply')
 
+        if isinstance(other, SpectrumGrid):
+            return other * self
+
         # Multiplying by a constant is the same as multiplying by a
         # UniformTransmission object
         if isinstance(other, (int, float)):
@@ -1765,7 +2877,10 @@ class SpectralElement(Integrator):
         If no wavelength set is specified, the built-in one is used.
 
         Integration is done using :meth:`~Integrator.trapezoidIntegration`
-        with ``x=wave`` and ``y=throughput``.
+        with ``x=wave`` and ``y=throughput``. If no wavelength set is given,
+        the bandpass and all its components are analytic, and the
+        wavelength is in a metric unit, the integral over the range of the
+        built-in wavelength set is calculated in closed form instead.
         Also see :ref:`pysynphot-formula-equvw`.
 
         Parameters
@@ -1781,6 +2896,11 @@ class SpectralElement(Integrator):
         """
 
         if wave is None:
+            scale = _linearwaveunits(self.waveunits)
+            quad = self._quadrature() if scale is not None else None
+            if quad is not None:
+                wave, weights, thru = quad
+                return (weights * thru).sum() * scale
             wave = self.wave
         ans = self.trapezoidIntegration(wave, self(wave))
         return ans
@@ -1797,15 +2917,16 @@ class SpectralElement(Integrator):
             Average wavelength.
 
         """
-        mywaveunits = self.waveunits.name
-        self.convert('angstroms')
-
-        wave = self.wave
-        thru = self.throughput
-        self.convert(mywaveunits)
+        quad = self._quadrature()
+        if quad is not None:
+            wave, weights, thru = quad
+            num = (weights * thru * wave).sum()
+            den = (weights * thru).sum()
+        else:
+            wave, thru = self._getInternalArrays()
 
-        num = self.trapezoidIntegration(wave, thru*wave)
-        den = self.trapezoidIntegration(wave, thru)
+            num = self.trapezoidIntegration(wave, thru*wave)
+            den = self.trapezoidIntegration(wave, thru)
 
         if 0.0 in (num, den):
             return 0.0
@@ -1835,6 +2956,7 @@ class SpectralElement(Integrator):
             Binned wavelength set requested but not found.
 
         """
+        quad = None
         if binned:
             try:
                 wave = self.binwave
@@ -1842,13 +2964,20 @@ class SpectralElement(Integrator):
                 raise AttributeError('Class ' + str(type(self)) +
                                      ' does not support binning.')
         else:
-            wave = self.wave
-
-        countmulwave = self(wave)*wave
-        countdivwave = self(wave)/wave
+            quad = self._quadrature()
+            if quad is None:
+                wave = self.wave
+
+        if quad is not None:
+            wave, weights, thru = quad
+            num = (weights * thru * wave).sum()
+            den = (weights * thru / wave).sum()
+        else:
+            countmulwave = self(wave)*wave
+            countdivwave = self(wave)/wave
 
-        num = self.trapezoidIntegration(wave, countmulwave)
-        den = self.trapezoidIntegration(wave, countdivwave)
+            num = self.trapezoidIntegration(wave, countmulwave)
+            den = self.trapezoidIntegration(wave, countdivwave)
 
         if num == 0.0 or den == 0.0:
             return 0.0
@@ -1871,21 +3000,22 @@ class SpectralElement(Integrator):
             RMS band width.
 
         """
-        mywaveunits = self.waveunits.name
-        self.convert('angstroms')
-
-        wave = self.wave
-        thru = self.throughput
-        self.convert(mywaveunits)
+        quad = self._quadrature() if floor == 0 else None
+        if quad is not None:
+            wave, weights, thru = quad
+            num = (weights * (wave - self.avgwave())**2 * thru).sum()
+            den = (weights * thru).sum()
+        else:
+            wave, thru = self._getInternalArrays()
 
-        if floor != 0:
-            idx = N.where(thru >= floor)
-            wave = wave[idx]
-            thru = thru[idx]
+            if floor != 0:
+                idx = N.where(thru >= floor)
+                wave = wave[idx]
+                thru = thru[idx]
 
-        integrand = (wave-self.avgwave())**2 * thru
-        num = self.trapezoidIntegration(wave, integrand)
-        den = self.trapezoidIntegration(wave, thru)
+            integrand = (wave-self.avgwave())**2 * thru
+            num = self.trapezoidIntegration(wave, integrand)
+            den = self.trapezoidIntegration(wave, thru)
 
         if 0.0 in (num, den):
             return 0.0
@@ -1909,16 +3039,20 @@ class SpectralElement(Integrator):
             RMS band width (deprecated).
 
         """
-        mywaveunits = self.waveunits.name
-        self.convert('angstroms')
+        quad = self._quadrature() if floor == 0 else None
+        if quad is not None:
+            wave, weights, thru = quad
 
-        wave = self.wave
-        thru = self.throughput
-        self.convert(mywaveunits)
+            def integrate(x, y):
+                return (weights * y).sum()
+        else:
+            wave, thru = self._getInternalArrays()
+
+            integrate = self.trapezoidIntegration
 
         # calculate the average wavelength
-        num = self.trapezoidIntegration(wave, thru * N.log(wave) / wave)
-        den = self.trapezoidIntegration(wave, thru / wave)
+        num = integrate(wave, thru * N.log(wave) / wave)
+        den = integrate(wave, thru / wave)
 
         if num == 0 or den == 0:
             return 0.0
@@ -1932,7 +3066,7 @@ class SpectralElement(Integrator):
 
         # calcualte the rms width
         integrand = thru * N.log(wave / avg_wave)**2 / wave
-        num = self.trapezoidIntegration(wave, integrand)
+        num = integrate(wave, integrand)
 
         if num == 0 or den == 0:
             return 0.0
@@ -1948,12 +3082,7 @@ class SpectralElement(Integrator):
             Bandpass rectangular width.
 
         """
-        mywaveunits = self.waveunits.name
-        self.convert('angstroms')
-
-        wave = self.wave
-        thru = self.throughput
-        self.convert(mywaveunits)
+        wave, thru = self._getInternalArrays()
 
         num = self.trapezoidIntegration(wave, thru)
         den = thru.max()
@@ -1984,12 +3113,12 @@ class SpectralElement(Integrator):
             Bandpass dimensionless efficiency.
 
         """
-        mywaveunits = self.waveunits.name
-        self.convert('angstroms')
+        quad = self._quadrature()
+        if quad is not None:
+            wave, weights, thru = quad
+            return (weights * thru / wave).sum()
 
-        wave = self.wave
-        thru = self.throughput
-        self.convert(mywaveunits)
+        wave, thru = self._getInternalArrays()
 
         ans = self.trapezoidIntegration(wave, thru/wave)
         return ans
@@ -2147,6 +3276,7 @@ class SpectralElement(Integrator):
         angwave = self.waveunits.Convert(self.GetWaveSet(), 'angstrom')
         self._wavetable = angwave.copy()
         self.waveunits = savewunits
+        self.invalidate()
 
     def __call__(self, wavelengths):
         """This is where the throughput array is calculated for a given
@@ -2159,14 +3289,10 @@ class SpectralElement(Integrator):
             throughput should be sampled.
 
         """
-        if N.isscalar(wavelengths):
-            delta = 0.0001
-            ww = N.array([wavelengths - delta, wavelengths,
-                          wavelengths + delta])
-            tmp = self.resample(ww)
-            return tmp._throughputtable[1]
-        else:
-            return self.resample(wavelengths)._throughputtable
+        # Interpolate directly on the internal tables; this gives the
+        # same values as resample() without building a new element.
+        wave, thru = self._ascendingTables(self._throughputtable)
+        return _interp(wavelengths, wave, thru, self._version)
 
     def sample(self, wave):
         """Sample the spectrum.
@@ -2387,28 +3513,10 @@ class SpectralElement(Integrator):
             Resampled spectrum.
 
         """
-        # Check whether the input wavetab is in descending order
-        if resampledWaveTab[0] < resampledWaveTab[-1]:
-            newwave = resampledWaveTab
-            newasc = True
-        else:
-            newwave = resampledWaveTab[::-1]
-            newasc = False
-
-        # Use numpy interpolation function
-        if self._wavetable[0] < self._wavetable[-1]:
-            oldasc = True
-            ans = N.interp(newwave, self._wavetable, self._throughputtable)
-        else:
-            oldasc = False
-            rev = N.interp(newwave, self._wavetable[::-1],
-                           self._throughputtable[::-1])
-            ans = rev[::-1]
-
-        # If the new and old waveset don't have the same parity,
-        # the answer has to be flipped again
-        if (newasc != oldasc):
-            ans = ans[::-1]
+        # Interpolate on the internal tables in ascending order; the
+        # new wavelength set may be in either order.
+        wave, thru = self._ascendingTables(self._throughputtable)
+        ans = _interp(resampledWaveTab, wave, thru, self._version)
 
         # Finally, make the new object.
         # NB: these manipulations were done using the internal
@@ -2458,6 +3566,39 @@ class SpectralElement(Integrator):
         """
         return self._wavetable
 
+    def getArrays(self, waveunits=None):
+        """Return wavelength and throughput arrays.
+
+        Parameters
+        ----------
+        waveunits : str or `None`
+            Unit of the returned wavelength array. If `None`,
+            ``self.waveunits`` is used. Passing a unit here does not
+            change the unit of the bandpass.
+
+        Returns
+        -------
+        wave : array_like
+            Wavelength array in the requested unit.
+
+        throughput : array_like
+            Throughput array.
+
+        """
+        if waveunits is None:
+            waveunits = self.waveunits
+        else:
+            waveunits = units.Units(waveunits)
+
+        wave, thru = self._getInternalArrays()
+        return units.Angstrom().Convert(wave, waveunits.name), thru
+
+    def _getInternalArrays(self):
+        """Return wavelength and throughput arrays, with wavelength
+        in Angstrom. For internal use only."""
+        wave = self.GetWaveSet()
+        return wave, self(wave)
+
     # Define properties for consistent UI
     def _getWaveProp(self):
         """Return wavelength in user units."""
@@ -2600,7 +3741,36 @@ class CompositeSpectralElement(SpectralElement):
 
     def __call__(self, wavelength):
         """This is where the throughput calculation is delegated."""
-        return self.component1(wavelength) * self.component2(wavelength)
+        return self.compile()(wavelength)
+
+    def compile(self):
+        """Return the flat evaluation plan for this bandpass.
+        See :meth:`CompositeSourceSpectrum.compile`.
+
+        Returns
+        -------
+        plan : `EvaluationPlan`
+
+        """
+        plan = getattr(self, '_plan', None)
+        if plan is None or not plan.isvalid():
+            plan = EvaluationPlan(self)
+            self._plan = plan
+        return plan
+
+    def invalidate(self):
+        """Discard the cached evaluation plan and wavelength set.
+        See :meth:`Integrator.invalidate`."""
+        self._plan = None
+        SpectralElement.invalidate(self)
+
+    def __copy__(self):
+        return _copycomposite(self)
+
+    def _arraystate(self):
+        """Return the state of the evaluation plan and of all its leaves.
+        See :meth:`Integrator._arraystate`."""
+        return _planstate(self)
 
     def __str__(self):
         return self.name
@@ -2623,12 +3793,13 @@ class CompositeSpectralElement(SpectralElement):
         Returns
         -------
         waveset : array_like
-            Composite wavelength set.
+            Composite wavelength set (a copy of the cached one).
 
         """
-        wave1 = self.component1.GetWaveSet()
-        wave2 = self.component2.GetWaveSet()
-        return MergeWaveSets(wave1, wave2)
+        waveset = self.compile().waveset
+        if waveset is not None:
+            waveset = waveset.copy()
+        return waveset
 
     wave = property(GetWaveSet, doc='Wavelength property.')
 
@@ -2694,6 +3865,10 @@ class UniformTransmission(SpectralElement):
         finally:
             self.wave = old_wave
 
+    def _parameters(self):
+        """See :meth:`Integrator._parameters`."""
+        return _scalarstate(self)
+
     @property
     def wave(self):
         """``waveset`` for uniform transmission."""
@@ -2745,6 +3920,11 @@ class UniformTransmission(SpectralElement):
 
         return thru
 
+    def _breakpoints(self):
+        """Uniform transmission is constant.
+        See :meth:`Integrator._breakpoints`."""
+        return N.array([])
+
 
 class TabularSpectralElement(SpectralElement):
     """Base class for `ArraySpectralElement` and `FileSpectralElement`.
@@ -2790,11 +3970,14 @@ class TabularSpectralElement(SpectralElement):
         self.isAnalytic = False
         self.warnings = {}
         if fileName:
-            if fileName.endswith('.fits') or fileName.endswith('.fit'):
-                self._readFITS(fileName, thrucol)
-            else:
-                self._readASCII(fileName)
-            self.name = fileName
+            key = Cache.reffile_key(fileName, type(self), thrucol)
+            if not self._fromReffileCache(key):
+                if fileName.endswith('.fits') or fileName.endswith('.fit'):
+                    self._readFITS(fileName, thrucol)
+                else:
+                    self._readASCII(fileName)
+                self.name = fileName
+                self._toReffileCache(key)
 
         else:
             self.name = None
@@ -2805,6 +3988,7 @@ class TabularSpectralElement(SpectralElement):
 
     def _reverse_wave(self):
         self._wavetable = self._wavetable[::-1]
+        self.invalidate()
 
     def __str__(self):
         return str(self.name)
@@ -2814,9 +3998,13 @@ class TabularSpectralElement(SpectralElement):
         For internal use only."""
         self.validate_units()
         savewunits = self.waveunits
-        angwave = self.waveunits.Convert(self._wavetable, 'angstrom')
-        self._wavetable = angwave.copy()
+        # Memory-mapped tables already in internal units are kept as is.
+        if not (_ismapped(self._wavetable) and
+                self.waveunits.name == 'angstrom'):
+            angwave = self.waveunits.Convert(self._wavetable, 'angstrom')
+            self._wavetable = angwave.copy()
         self.waveunits = savewunits
+        self.invalidate()
 
     def _readASCII(self, filename):
         """ASCII files have no headers. Following synphot, this
@@ -2829,19 +4017,17 @@ class TabularSpectralElement(SpectralElement):
         self._throughputtable = N.array(tlist, dtype=N.float64)
 
     def _readFITS(self, filename, thrucol='throughput'):
-        fs = pyfits.open(filename)
+        with pyfits.open(filename) as fs:
+            # pyfits cannot close the file on .close() if there are still
+            # references to mmapped data, so these are copies or views of
+            # native-endian files (see Cache.set_mmap_dir).
+            self._wavetable, self._throughputtable = Cache.read_columns(
+                fs, ['wavelength', thrucol])
 
-        # pyfits cannot close the file on .close() if there are still
-        # references to mmapped data
-        self._wavetable = fs[1].data.field('wavelength').copy()
-        self._throughputtable = fs[1].data.field(thrucol).copy()
+            self.waveunits = units.Units(fs[1].header['tunit1'].lower())
+            self.throughputunits = 'none'
 
-        self.waveunits = units.Units(fs[1].header['tunit1'].lower())
-        self.throughputunits = 'none'
-
-        self.getHeaderKeywords(fs[1].header)
-
-        fs.close()
+            self.getHeaderKeywords(fs[1].header)
 
     def getHeaderKeywords(self, header):
         """This is a placeholder for subclasses to get header keywords without
@@ -2952,11 +4138,14 @@ class FileSpectralElement(TabularSpectralElement):
     """
     def __init__(self, filename, thrucol=None):
         self.name = locations.irafconvert(filename)
-        self._readThroughputFile(self.name, thrucol)
+        key = Cache.reffile_key(self.name, type(self), thrucol)
+        if not self._fromReffileCache(key):
+            self._readThroughputFile(self.name, thrucol)
 
-        self.validate_units()
-        self.validate_wavetable()
-        self.ToInternal()
+            self.validate_units()
+            self.validate_wavetable()
+            self.ToInternal()
+            self._toReffileCache(key)
         self.isAnalytic = False
         self.warnings = {}
 
@@ -2967,23 +4156,22 @@ class FileSpectralElement(TabularSpectralElement):
             self._readASCII(filename)
 
     def _readFITS(self, filename, throughputname):
-        fs = pyfits.open(filename)
-
-        # pyfits cannot close the file on .close() if there are still
-        # references to mmapped data
-        self._wavetable = fs[1].data.field('wavelength').copy()
         if throughputname is None:
             throughputname = 'throughput'
-        self._throughputtable = fs[1].data.field(throughputname).copy()
-        self.waveunits = units.Units(fs[1].header['tunit1'].lower())
 
-        # Retain the header information as a convenience for the user.
-        # If duplicate keywords exist, the value in the extension
-        # header will override that in the primary.
-        self.fheader = dict(fs[0].header)
-        self.fheader.update(dict(fs[1].header))
+        with pyfits.open(filename) as fs:
+            # pyfits cannot close the file on .close() if there are still
+            # references to mmapped data, so these are copies or views of
+            # native-endian files (see Cache.set_mmap_dir).
+            self._wavetable, self._throughputtable = Cache.read_columns(
+                fs, ['wavelength', throughputname])
+            self.waveunits = units.Units(fs[1].header['tunit1'].lower())
 
-        fs.close()
+            # Retain the header information as a convenience for the user.
+            # If duplicate keywords exist, the value in the extension
+            # header will override that in the primary.
+            self.fheader = dict(fs[0].header)
+            self.fheader.update(dict(fs[1].header))
 
     def _readASCII(self, filename):
         """ Ascii files have no headers. Following synphot, this
@@ -2999,10 +4187,247 @@ class FileSpectralElement(TabularSpectralElement):
         self.fheader = dict()
 
 
+class InterpolatedThroughputTable(object):
+    """Class to handle all the columns of a
+    :ref:`parameterized <pysynphot-parameterized>` throughput table at once.
+
+    The parameterized columns are read once into a 2-D array, ordered by
+    parameter value, so that throughputs for many parameter values (e.g.,
+    a range of MJDs) are computed with array arithmetic instead of one
+    `InterpolatedSpectralElement` at a time. The same rules apply:
+    a value matching a column uses it as is, a value between columns is
+    interpolated (after shifting wavelengths if ``PARAMS = 'WAVELENGTH'``),
+    a value outside the columns is extrapolated from the two nearest
+    columns if ``EXTRAP`` is set, and the ``THROUGHPUT`` column is used
+    otherwise.
+
+    Tables are cached in ``pysynphot.Cache.REFFILE_CACHE``, so a file
+    is only read once.
+
+    Parameters
+    ----------
+    fileName : str
+        Filename followed by a column name specification between square
+        brackets. For example: "mythru_syn.fits[fr388n#]"
+
+    Attributes
+    ----------
+    name : str
+        Expanded filename.
+
+    colspec : str
+        Column name specification, e.g., ``'fr388n#'``.
+
+    params : array_like
+        Parameter values of the columns, in ascending order.
+
+    table : array_like
+        Throughput columns with shape ``(ncols, nwave)``, in the order of
+        ``params``.
+
+    default : array_like or `None`
+        Default throughput column, if present.
+
+    doshift : bool
+        Whether wavelengths are shifted before interpolation.
+
+    extrapolate : bool
+        Whether extrapolation is allowed.
+
+    waveunits : `~pysynphot.units.Units`
+        Unit of ``wave``.
+
+    wave : array_like
+        Wavelength set shared by all columns.
+
+    Raises
+    ------
+    Exception
+        File does not have columns needed for interpolation.
+
+    """
+    def __init__(self, fileName):
+        xre = re.search(r'\[(?P<col>.*?)\]', fileName)
+        self.name = os.path.expandvars(fileName[0:(xre.start())])
+        self.colspec = xre.group('col')
+        self._fileName = fileName
+
+        key = Cache.reffile_key(self.name, type(self), self.colspec)
+        state = None if key is None else Cache.REFFILE_CACHE.get(key)
+        if state is not None:
+            self.__dict__.update(state)
+            return
+
+        with pyfits.open(self.name) as fs:
+            # if the file has the PARAMS header keyword and if it is set to
+            # WAVELENGTH then we want to perform a wavelength shift before
+            # interpolation, otherwise we don't want to shift.
+            self.doshift = ('PARAMS' in fs[0].header and
+                            fs[0].header['PARAMS'].lower() == 'wavelength')
+
+            # extrapolation is assumed to false if the EXTRAP keyword is
+            # missing.
+            self.extrapolate = ('EXTRAP' in fs[0].header and
+                                fs[0].header['EXTRAP'] is True)
+
+            # grab all columns that begin with the parameter name
+            # (e.g. 'MJD#') then split off the numbers after the '#'
+            colNames = [n for n in fs[1].data.names
+                        if n.startswith(self.colspec.upper())]
+            if colNames == []:
+                raise Exception(
+                    'File %s contains no interpolated columns.' % (fileName, ))
+            colWaves = N.array([float(cn.split('#')[1]) for cn in colNames])
+            order = N.argsort(colWaves, kind='stable')
+            self.params = colWaves[order]
+
+            columns = Cache.read_columns(fs, [colNames[i] for i in order])
+            dtype = N.result_type(*columns).newbyteorder('=')
+            self.table = N.array(columns, dtype=dtype)
+
+            if 'THROUGHPUT' in fs[1].data.names:
+                self.default, = Cache.read_columns(fs, ['THROUGHPUT'])
+            else:
+                self.default = None
+
+            self.wave, = Cache.read_columns(fs, ['wavelength'])
+            self.waveunits = units.Units(fs[1].header['tunit1'].lower())
+
+        if key is not None:
+            # Shared with every later table of the same file.
+            nbytes = 0
+            for value in (self.params, self.table, self.default, self.wave):
+                if isinstance(value, N.ndarray):
+                    value.flags.writeable = False
+                    if not _ismapped(value):
+                        nbytes += value.nbytes
+            Cache.REFFILE_CACHE.put(key, self.__dict__.copy(), nbytes)
+
+    def __len__(self):
+        return self.params.size
+
+    def __call__(self, values):
+        """Calculate throughputs for the given parameter values.
+
+        Parameters
+        ----------
+        values : number or array_like
+            Parameter value(s).
+
+        Returns
+        -------
+        throughput : array_like
+            Throughput on ``wave``, with shape ``(nwave,)`` for a
+            single value or ``(nvalues, nwave)`` otherwise.
+
+        Raises
+        ------
+        pysynphot.exceptions.ExtrapolationNotAllowed
+            A value needs extrapolation, which is not allowed, and no
+            default throughput column is present.
+
+        """
+        ans, usedDefault = self._evaluate(values)
+        if usedDefault:
+            s = ('Extrapolation not allowed, using default throughput '
+                 'for %s' % (self._fileName, ))
+            warnings.warn(s, UserWarning)
+        return ans
+
+    def _evaluate(self, values):
+        """Return the throughputs for the given parameter values, and
+        whether the default column was used. A single value gives the
+        same array as before this class existed, including its data
+        type. For internal use only."""
+        scalar = N.ndim(values) == 0
+        v = N.array(values, dtype=N.float64, ndmin=1)
+        params = self.params
+        n = params.size
+
+        idx = N.searchsorted(params, v)
+        exact = params[N.minimum(idx, n - 1)] == v
+        inside = ~exact & (v > params[0]) & (v < params[-1])
+        if self.extrapolate:
+            below = ~exact & (v < params[0])
+            above = ~exact & (v > params[-1])
+        else:
+            below = above = N.zeros(v.shape, dtype=bool)
+        rest = ~(exact | inside | below | above)
+
+        if rest.any() and self.default is None:
+            s = ('Cannot extrapolate and no default throughput '
+                 'for %s' % (self._fileName, ))
+            raise exceptions.ExtrapolationNotAllowed(s)
+
+        ans = N.empty(v.shape + self.wave.shape, dtype=N.float64)
+        ans[exact] = self.table[idx[exact]]
+        if inside.any():
+            upper = idx[inside]
+            ans[inside] = self._interpolate(v[inside], upper - 1, upper)
+        outside = below | above
+        if outside.any():
+            lower = N.where(below, 0, n - 2)[outside]
+            ans[outside] = self._extrapolate(v[outside], lower, lower + 1)
+        ans[rest] = self.default
+
+        if scalar:
+            ans = ans[0]
+            # Keep the precision of the columns where no arithmetic
+            # in double precision was done.
+            if exact[0] or (inside[0] and not self.doshift):
+                ans = ans.astype(self.table.dtype)
+            elif rest[0]:
+                ans = ans.astype(self.default.dtype)
+        return ans, bool(rest.any())
+
+    def _interpolate(self, v, lower, upper):
+        """Interpolate between the given columns. For internal use only."""
+        lower_val = self.params[lower][:, N.newaxis]
+        upper_val = self.params[upper][:, N.newaxis]
+        v = v[:, N.newaxis]
+        lower_thru = self.table[lower]
+        upper_thru = self.table[upper]
+
+        w = (v - lower_val) / (upper_val - lower_val)
+        if self.doshift:
+            # Shift the wavelength table to bracket the range, then
+            # interpolate the columns at those wavelengths
+            waves = self.wave
+            lower_thru = N.array([
+                N.interp(waves + d, waves, t)
+                for d, t in zip((lower_val - v)[:, 0], lower_thru)])
+            upper_thru = N.array([
+                N.interp(waves + d, waves, t)
+                for d, t in zip((upper_val - v)[:, 0], upper_thru)])
+            return (upper_thru * w) + lower_thru * (1.0 - w)
+
+        # Weights in the precision of the columns, as for a single
+        # value given as a Python float
+        dtype = self.table.dtype
+        return (upper_thru * w.astype(dtype) +
+                lower_thru * (1.0 - w).astype(dtype))
+
+    def _extrapolate(self, v, lower, upper):
+        """Extrapolate linearly from the given columns. For internal
+        use only."""
+        lower_val = self.params[lower][:, N.newaxis]
+        upper_val = self.params[upper][:, N.newaxis]
+        lower_thru = self.table[lower]
+        upper_thru = self.table[upper]
+
+        m = (upper_thru - lower_thru).astype(N.float64) / (upper_val -
+                                                           lower_val)
+        b = lower_thru.astype(N.float64) - m * lower_val
+        return m * v[:, N.newaxis] + b
+
+
 class InterpolatedSpectralElement(SpectralElement):
     """Class to handle :ref:`parameterized keyword <pysynphot-parameterized>`
     in an observation mode.
 
+    The file is read through the cached `InterpolatedThroughputTable`,
+    which can also compute throughputs for many values at once.
+
     Parameters
     ----------
     fileName : str
@@ -3062,126 +4487,32 @@ class InterpolatedSpectralElement(SpectralElement):
 
         self.interpval = wavelength
 
-        fs = pyfits.open(self.name)
-
-        # if the file has the PARAMS header keyword and if it is set to
-        # WAVELENGTH then we want to perform a wavelength shift before
-        # interpolation, otherwise we don't want to shift.
-        if ('PARAMS' in fs[0].header and
-                fs[0].header['PARAMS'].lower() == 'wavelength'):
-            doshift = True
-        else:
-            doshift = False
-
-        # check whether we are supposed to extrapolate when we're given an
-        # interpolation value beyond the columns of the table.
-        # extrapolation is assumed to false if the EXTRAP keyword is missing.
-        if 'EXTRAP' in fs[0].header and fs[0].header['EXTRAP'] is True:
-            extrapolate = True
-        else:
-            extrapolate = False
-
-        # The wavelength table will have to be adjusted before use.
-
-        # pyfits cannot close the file on .close() if there are still
-        # references to mmapped data
-        wave0 = fs[1].data.field('wavelength').copy()
-
-        # Determine the columns that bracket the desired value
-        # grab all columns that beging with the parameter name (e.g. 'MJD#')
-        # then split off the numbers after the '#'
-        colNames = [n for n in fs[1].data.names
-                    if n.startswith(colSpec.upper())]
-        colWaves = [float(cn.split('#')[1]) for cn in colNames]
-
-        if colNames == []:
-            raise Exception(
-                'File %s contains no interpolated columns.' % (fileName, ))
-
-        # easy case: wavelength matches a column
-        if self.interpval in colWaves:
-            self._no_interp_init(
-                wave0, fs[1].data[colNames[colWaves.index(wavelength)]])
-
-        # need interpolation
-        elif self.interpval > colWaves[0] and self.interpval < colWaves[-1]:
-            upper_ind = N.searchsorted(colWaves, self.interpval)
-            lower_ind = upper_ind - 1
-
-            self._interp_init(wave0, colWaves[lower_ind], colWaves[upper_ind],
-                              fs[1].data[colNames[lower_ind]],
-                              fs[1].data[colNames[upper_ind]], doshift)
-
-        # extrapolate below lowest columns
-        elif extrapolate and self.interpval < colWaves[0]:
-            self._extrap_init(wave0, colWaves[0], colWaves[1],
-                              fs[1].data[colNames[0]],
-                              fs[1].data[colNames[1]])
-
-        # extrapolate above highest columns
-        elif extrapolate and self.interpval > colWaves[-1]:
-            self._extrap_init(wave0, colWaves[-2], colWaves[-1],
-                              fs[1].data[colNames[-2]],
-                              fs[1].data[colNames[-1]])
-
-        # can't extrapolate, use default
-        elif not extrapolate and 'THROUGHPUT' in fs[1].data.names:
+        key = Cache.reffile_key(self.name, type(self), colSpec, wavelength)
+        if self._fromReffileCache(key):
+            if self.warnings.get('DefaultThroughput'):
+                s = ('Extrapolation not allowed, using default throughput '
+                     'for %s' % (fileName, ))
+                warnings.warn(s, UserWarning)
+            return
+
+        table = InterpolatedThroughputTable(fileName)
+        self._wavetable = table.wave
+        self._throughputtable, usedDefault = table._evaluate(wavelength)
+        if usedDefault:
             s = ('Extrapolation not allowed, using default throughput '
                  'for %s' % (fileName, ))
             warnings.warn(s, UserWarning)
             self.warnings['DefaultThroughput'] = True
-            self._no_interp_init(wave0, fs[1].data['THROUGHPUT'])
-
-        # can't extrapolate and no default
-        elif not extrapolate and 'THROUGHPUT' not in fs[1].data.names:
-            s = ('Cannot extrapolate and no default throughput '
-                 'for %s' % (fileName, ))
-            raise exceptions.ExtrapolationNotAllowed(s)
 
         # assign units
-        self.waveunits = units.Units(fs[1].header['tunit1'].lower())
+        self.waveunits = table.waveunits
         self.throughputunits = 'none'
 
-        fs.close()
+        self._toReffileCache(key)
 
     def __str__(self):
         return "%s#%g" % (self.name, self.interpval)
 
-    def _no_interp_init(self, waves, throughput):
-        self._wavetable = waves
-        self._throughputtable = throughput
-
-    def _interp_init(self, waves, lower_val, upper_val, lower_thru,
-                     upper_thru, doshift):
-        self._wavetable = waves
-
-        if doshift:
-            # Adjust the wavelength table to bracket the range
-            lwave = waves + (lower_val - self.interpval)
-            uwave = waves + (upper_val - self.interpval)
-
-            # Interpolate the columns at those ranges
-            lower_thru = N.interp(lwave, waves, lower_thru)
-            upper_thru = N.interp(uwave, waves, upper_thru)
-
-        # Then interpolate between the two columns
-        w = (self.interpval - lower_val) / (upper_val - lower_val)
-        self._throughputtable = (upper_thru * w) + lower_thru * (1.0 - w)
-
-    def _extrap_init(self, waves, lower_val, upper_val, lower_thru,
-                     upper_thru):
-        self._wavetable = waves
-
-        throughput = []
-
-        for y1, y2 in zip(lower_thru, upper_thru):
-            m = (y2 - y1) / (upper_val - lower_val)
-            b = y1 - m * lower_val
-
-            throughput.append(m*self.interpval + b)
-
-        self._throughputtable = N.array(throughput)
-
 
 class ThermalSpectralElement(TabularSpectralElement):
     """Class to handle
@@ -3314,6 +4645,15 @@ class Box(SpectralElement):
 
         return thru
 
+    def _parameters(self):
+        """See :meth:`Integrator._parameters`."""
+        return _scalarstate(self)
+
+    def _breakpoints(self):
+        """Box is constant between its edges.
+        See :meth:`Integrator._breakpoints`."""
+        return N.array([self.lower, self.upper])
+
     def sample(self, wavelength):
         """Input wavelengths assumed to be in user unit."""
         wave = self.waveunits.Convert(wavelength, 'angstrom')
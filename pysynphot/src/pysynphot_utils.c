@@ -1,75 +1,138 @@
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+
 #include "Python.h"
 #include <numpy/arrayobject.h>
 
+/* Return a new reference to a writable, contiguous float64 array of the
+   given length, reusing "obj" when it is such an array already. */
+static PyArrayObject * output_array(PyObject *obj, npy_intp len) {
+  PyArrayObject *arr;
+
+  if (obj == NULL || obj == Py_None) {
+    return (PyArrayObject *) PyArray_SimpleNew(1, &len, NPY_FLOAT64);
+  }
+
+  if (!PyArray_Check(obj) ||
+      PyArray_TYPE((PyArrayObject *) obj) != NPY_FLOAT64 ||
+      PyArray_NDIM((PyArrayObject *) obj) != 1 ||
+      PyArray_DIM((PyArrayObject *) obj, 0) != len ||
+      !PyArray_ISCARRAY((PyArrayObject *) obj)) {
+    PyErr_SetString(PyExc_ValueError,
+                    "Output arrays must be writable, contiguous float64 "
+                    "arrays with one value per bin.");
+    return NULL;
+  }
+
+  arr = (PyArrayObject *) obj;
+  Py_INCREF(arr);
+  return arr;
+}
+
 static PyObject * py_calcbinflux(PyObject *self, PyObject *args) {
   /* input variables */
-  const int out_arr_len;
+  int out_arr_len;
   PyObject *oindices, *oindices_last, *oavflux, *odeltaw;
-  PyArrayObject *indices, *indices_last, *avflux, *deltaw;
+  PyObject *obinflux = NULL, *ointwave = NULL;
+  PyArrayObject *indices = NULL, *indices_last = NULL;
+  PyArrayObject *avflux = NULL, *deltaw = NULL;
 
   /* local variables */
   npy_intp i, j;
-  npy_intp num_indices, first, last;
+  npy_intp num_indices, num_values, first, last;
+  npy_int64 *pindices, *pindices_last;
+  double *pavflux, *pdeltaw, *pbinflux, *pintwave;
   double flux_sum, delta_sum;
+  int status = 0;
 
   /* return variables */
-  npy_intp *out_dim;
-  PyArrayObject *binflux, *intwave;
+  PyArrayObject *binflux = NULL, *intwave = NULL;
 
   /* put arguments into variables */
-  if (!PyArg_ParseTuple(args, "iOOOO", &out_arr_len, &oindices, &oindices_last,
-                        &oavflux, &odeltaw)) {
+  if (!PyArg_ParseTuple(args, "iOOOO|OO", &out_arr_len, &oindices,
+                        &oindices_last, &oavflux, &odeltaw,
+                        &obinflux, &ointwave)) {
     return NULL;
   }
 
   /* turn inputs into numpy array types */
-  indices = (PyArrayObject *) PyArray_FROMANY(oindices, PyArray_INT64, 1, 1,
-                                              NPY_IN_ARRAY);
-  indices_last = (PyArrayObject *) PyArray_FROMANY(oindices_last, PyArray_INT64,
-                                                   1, 1, NPY_IN_ARRAY);
-  avflux = (PyArrayObject *) PyArray_FROMANY(oavflux, PyArray_FLOAT64, 1, 1,
-                                             NPY_IN_ARRAY);
-  deltaw = (PyArrayObject *) PyArray_FROMANY(odeltaw, PyArray_FLOAT64, 1, 1,
-                                             NPY_IN_ARRAY);
+  indices = (PyArrayObject *) PyArray_FROMANY(oindices, NPY_INT64, 1, 1,
+                                              NPY_ARRAY_IN_ARRAY);
+  indices_last = (PyArrayObject *) PyArray_FROMANY(oindices_last, NPY_INT64,
+                                                   1, 1, NPY_ARRAY_IN_ARRAY);
+  avflux = (PyArrayObject *) PyArray_FROMANY(oavflux, NPY_FLOAT64, 1, 1,
+                                             NPY_ARRAY_IN_ARRAY);
+  deltaw = (PyArrayObject *) PyArray_FROMANY(odeltaw, NPY_FLOAT64, 1, 1,
+                                             NPY_ARRAY_IN_ARRAY);
   if (!indices || !indices_last || !avflux || !deltaw) {
-    return NULL;
+    goto fail;
   }
 
-  /* finish creating return variables */
-  out_dim = (npy_intp *) malloc(1 * sizeof(npy_intp));
-  out_dim[0] = (npy_intp) out_arr_len;
-  binflux = (PyArrayObject *) PyArray_SimpleNew(1, out_dim, PyArray_FLOAT64);
-  intwave = (PyArrayObject *) PyArray_SimpleNew(1, out_dim, PyArray_FLOAT64);
-  if (!binflux || !intwave) {
-    return NULL;
+  num_indices = PyArray_DIM(indices, 0);
+  num_values = PyArray_DIM(deltaw, 0);
+  if (PyArray_DIM(indices_last, 0) != num_indices ||
+      PyArray_DIM(avflux, 0) != num_values ||
+      num_indices > (npy_intp) out_arr_len) {
+    PyErr_SetString(PyExc_ValueError,
+                    "Input array lengths do not match.");
+    goto fail;
   }
 
-  num_indices = indices->dimensions[0];
+  /* get output arrays, allocating them if not given */
+  binflux = output_array(obinflux, (npy_intp) out_arr_len);
+  if (!binflux) {
+    goto fail;
+  }
+  intwave = output_array(ointwave, (npy_intp) out_arr_len);
+  if (!intwave) {
+    goto fail;
+  }
 
+  pindices = (npy_int64 *) PyArray_DATA(indices);
+  pindices_last = (npy_int64 *) PyArray_DATA(indices_last);
+  pavflux = (double *) PyArray_DATA(avflux);
+  pdeltaw = (double *) PyArray_DATA(deltaw);
+  pbinflux = (double *) PyArray_DATA(binflux);
+  pintwave = (double *) PyArray_DATA(intwave);
+
+  /* the loop only touches C arrays, so other threads may run meanwhile */
+  Py_BEGIN_ALLOW_THREADS
   for (i = 0; i < num_indices; i++) {
-    first = (npy_intp) *(npy_int64 *) PyArray_GETPTR1(indices,i);
-    last = (npy_intp) *(npy_int64 *) PyArray_GETPTR1(indices_last,i);
+    first = (npy_intp) pindices[i];
+    last = (npy_intp) pindices_last[i];
+
+    if (first < 0 || last > num_values || first > last) {
+      status = 1;
+      break;
+    }
 
     flux_sum = 0.0;
     delta_sum = 0.0;
 
     for (j = first; j < last; j++) {
-      delta_sum += *(double *) PyArray_GETPTR1(deltaw, j);
-      flux_sum += (*(double *) PyArray_GETPTR1(avflux, j)) *
-                  (*(double *) PyArray_GETPTR1(deltaw, j));
+      delta_sum += pdeltaw[j];
+      flux_sum += pavflux[j] * pdeltaw[j];
     }
 
     if (delta_sum == 0) {
-      PyErr_SetString(PyExc_ZeroDivisionError,
-                      "Division by zero in pysynphot_utils.calcbinflux.");
-      return NULL;
+      status = 2;
+      break;
     }
 
-    *(npy_float64 *) PyArray_GETPTR1(intwave,i) = (npy_float64) delta_sum;
-    *(npy_float64 *) PyArray_GETPTR1(binflux,i) = (npy_float64) (flux_sum/delta_sum);
+    pintwave[i] = delta_sum;
+    pbinflux[i] = flux_sum / delta_sum;
   }
+  Py_END_ALLOW_THREADS
 
-  free(out_dim);
+  if (status == 1) {
+    PyErr_SetString(PyExc_IndexError,
+                    "Bin index out of range in pysynphot_utils.calcbinflux.");
+    goto fail;
+  }
+  if (status == 2) {
+    PyErr_SetString(PyExc_ZeroDivisionError,
+                    "Division by zero in pysynphot_utils.calcbinflux.");
+    goto fail;
+  }
 
   Py_DECREF(indices);
   Py_DECREF(indices_last);
@@ -77,11 +140,25 @@ static PyObject * py_calcbinflux(PyObject *self, PyObject *args) {
   Py_DECREF(deltaw);
 
   return Py_BuildValue("NN", binflux, intwave);
+
+ fail:
+  Py_XDECREF(indices);
+  Py_XDECREF(indices_last);
+  Py_XDECREF(avflux);
+  Py_XDECREF(deltaw);
+  Py_XDECREF(binflux);
+  Py_XDECREF(intwave);
+  return NULL;
 }
 
 static PyMethodDef pysynphot_utils_methods[] =
 {
-  {"calcbinflux", py_calcbinflux, METH_VARARGS, "Calculate binned flux."},
+  {"calcbinflux", py_calcbinflux, METH_VARARGS,
+   "calcbinflux(nbins, indices, indices_last, avflux, deltaw"
+   "[, binflux, intwave])\n\n"
+   "Calculate binned flux. The optional output arrays are filled in\n"
+   "place instead of allocating new ones. The GIL is released while\n"
+   "summing."},
   {NULL, NULL, 0, NULL} /* sentinel */
 
 };
@@ -109,7 +186,7 @@ initpysynphot_utils(void)
 {
   PyObject* m;
   import_array(); /* Must be present for NumPy */
-  
+
 #if PY_MAJOR_VERSION >= 3
   m = PyModule_Create(&moduledef);
   return m;
@@ -4,9 +4,14 @@ They are discussed in detail in :ref:`pysynphot-appendixc`.
 """
 from __future__ import division, print_function
 
+import os
+import re
+
 import numpy as N
 from astropy.io import fits as pyfits
 
+from . import Cache, locations
+
 #Flag to control verbosity
 DEBUG = False
 
@@ -14,6 +19,10 @@ DEBUG = False
 class CompTable(object):
     """Class to handle a :ref:`component table <pysynphot-master-comp>`.
 
+    If :data:`pysynphot.Cache.SNAPSHOT_DIR` is set, the parsed table and
+    resolved file names are stored there and reused by later processes
+    (see :func:`~pysynphot.Cache.set_snapshot_dir`).
+
     Parameters
     ----------
     CFile : str
@@ -39,23 +48,102 @@ class CompTable(object):
         if CFile is None :
             raise TypeError('initializing CompTable with CFile=None; possible bad/missing PYSYN_CDBS')
 
+        snapshot = Cache.load_snapshot(CFile, 'CompTable')
+        if snapshot is not None:
+            self.__dict__.update(snapshot)
+            if self._paths[0] != self._pathstate():
+                self._resolveall()
+                Cache.save_snapshot(CFile, 'CompTable', self.__dict__)
+            return
+
         cp = pyfits.open(CFile)
 
         self.compnames = cp[1].data.field('compname')
         self.filenames = cp[1].data.field('filename')
 
-        # Is this necessary?
-        compdict = {}
-        for i in range(len(self.compnames)):
-            compdict[self.compnames[i]] = self.filenames[i]
+        # Map each component to its first filename, matching a
+        # N.where look-up on the columns.
+        self._compdict = {}
+        for compname, filename in zip(self.compnames, self.filenames):
+            self._compdict.setdefault(compname, filename)
 
         cp.close()
         self.name=CFile
 
+        # Environment variables used by "$VAR/file" style names.
+        self._envvars = set()
+        for filename in self._compdict.values():
+            match = re.match(r'\$(\w*)', filename)
+            if match:
+                self._envvars.add(match.group(1))
+
+        # Resolved file names, with the path mapping they were
+        # resolved with. Filled as components are looked up.
+        self._paths = (self._pathstate(), {})
+
+        if Cache.SNAPSHOT_DIR is not None:
+            self._resolveall()
+            Cache.save_snapshot(CFile, 'CompTable', self.__dict__)
+
+    def __contains__(self, compname):
+        return compname in self._compdict
+
+    def _pathstate(self):
+        """Return what file name resolution depends on."""
+        return (dict(locations.CONVERTDICT),
+                dict((var, os.environ.get(var)) for var in self._envvars))
+
+    def _resolveall(self):
+        """Resolve the file names of all components."""
+        paths = {}
+        for compname, filename in self._compdict.items():
+            try:
+                paths[compname] = locations.irafconvert(filename).lstrip()
+            except Exception:
+                # Reported if and when the component is used.
+                pass
+        self._paths = (self._pathstate(), paths)
+
+    def GetFileName(self, compname):
+        """Return the file name of a component, with IRAF-style
+        directories resolved by
+        :func:`~pysynphot.locations.irafconvert`.
+
+        Parameters
+        ----------
+        compname : str
+            Component name.
+
+        Returns
+        -------
+        filename : str
+            Resolved file name.
+
+        Raises
+        ------
+        KeyError
+            Component not in table.
+
+        """
+        state = self._pathstate()
+        if self._paths[0] != state:
+            self._paths = (state, {})
+        paths = self._paths[1]
+        try:
+            return paths[compname]
+        except KeyError:
+            filename = locations.irafconvert(self._compdict[compname])
+            paths[compname] = filename.lstrip()
+            return paths[compname]
+
 
 class GraphTable(object):
     """Class to handle a :ref:`graph table <pysynphot-graph>`.
 
+    If :data:`pysynphot.Cache.SNAPSHOT_DIR` is set, the parsed table and
+    its node index are stored there and reused by later processes
+    (see :func:`~pysynphot.Cache.set_snapshot_dir`).
+
     Parameters
     ----------
     GFile : str
@@ -84,6 +172,12 @@ class GraphTable(object):
         if GFile is None :
             raise TypeError('initializing GraphTable with GFile=None; possible bad/missing PYSYN_CDBS')
 
+        snapshot = Cache.load_snapshot(GFile, 'GraphTable')
+        if snapshot is not None:
+            self.__dict__.update(snapshot)
+            self._memo = {}
+            return
+
         gp = pyfits.open(GFile)
 
         if 'PRIMAREA' in gp[0].header:
@@ -97,8 +191,20 @@ class GraphTable(object):
 
         # keywords must be forced to lower case (STIS keywords are
         # mixed mode %^&^(*^*^%%%@#$!!!)
-        for i in range(len(self.keywords)):
-            self.keywords[i] = self.keywords[i].lower()
+        self.keywords = N.char.lower(self.keywords).view(N.chararray)
+
+        # Index rows by innode, then by keyword, so traversal does not
+        # have to scan the columns at every node.
+        self._nodes = {}
+        for row, (innode, keyword) in enumerate(zip(self.innodes,
+                                                    self.keywords)):
+            node = self._nodes.setdefault(int(innode), {})
+            node.setdefault(keyword, []).append(row)
+
+        Cache.save_snapshot(GFile, 'GraphTable', self.__dict__)
+
+        # Traversal results keyed by (innode, frozenset of keywords).
+        self._memo = {}
 
 
 ##        for comp in self.compnames:
@@ -160,10 +266,16 @@ class GraphTable(object):
             This prints extra information to screen if
             ``pysynphot.tables.DEBUG`` is set to `True`.
 
+        Results are memoized per starting node and keyword set, so
+        repeated look-ups (e.g., the same instrument with different
+        ``mjd#`` values) skip the traversal entirely.
+
         Parameters
         ----------
         modes : list of str
             List of individual keywords within the observation mode.
+            Parameterized keywords are given without their values
+            (e.g., ``aper#``).
 
         innode : int
             Starting node, usually 1.
@@ -181,38 +293,50 @@ class GraphTable(object):
         ValueError
             Incomplete observation mode or unused keyword(s) detected.
 
+        """
+        key = (innode, frozenset(modes))
+        try:
+            components, thcomponents = self._memo[key]
+        except KeyError:
+            components, thcomponents, ambiguous = self._traverse(modes, innode)
+            # When a node matched more than one keyword, the last one in
+            # ``modes`` wins, so the result depends on keyword order and
+            # cannot be shared between permutations of the same set.
+            if not ambiguous:
+                self._memo[key] = (components, thcomponents)
+
+        return (list(components), list(thcomponents))
+
+    def _traverse(self, modes, innode):
+        """Walk the graph using the node index; see
+        :meth:`GetComponentsFromGT`. Also returns whether any node
+        matched more than one keyword.
+
         """
         components = []
         thcomponents = []
         outnode = 0
         inmodes=set(modes)
         used_modes=set()
+        ambiguous = False
         count = 0
         while outnode >= 0:
-            if (DEBUG and (outnode < 0)):
-                print("outnode == %d: stop condition"%outnode)
-
             previous_outnode = outnode
 
-            nodes = N.where(self.innodes == innode)
-
             # If there are no entries with this innode, we're done
-            if nodes[0].size == 0:
+            node = self._nodes.get(innode)
+            if node is None:
                 if DEBUG:
                     print("no such innode %d: stop condition"%innode)
-                #return (components,thcomponents)
                 break
 
-            # Find the entry corresponding to the component named
-            # 'default', bacause thats the one we'll use if we don't
-            # match anything in the modes list
-            defaultindex = N.where(self.keywords[nodes] =='default')
-
-            if 'default' in self.keywords[nodes]:
-                dfi=N.where(self.keywords[nodes] == 'default')[0][0]
-                outnode = self.outnodes[nodes[0][dfi]]
-                component = self.compnames[nodes[0][dfi]]
-                thcomponent = self.thcompnames[nodes[0][dfi]]
+            # Use the entry corresponding to the component named
+            # 'default' if we don't match anything in the modes list
+            if 'default' in node:
+                row = node['default'][0]
+                outnode = self.outnodes[row]
+                component = self.compnames[row]
+                thcomponent = self.thcompnames[row]
                 used_default=True
             else:
                 #There's no default, so fail if you don't match anything
@@ -221,25 +345,26 @@ class GraphTable(object):
                 component = thcomponent = None
 
             # Now try and match something from the modes list
+            matched = set()
             for mode in modes:
-
-                if mode in self.keywords[nodes]:
+                rows = node.get(mode)
+                if rows is not None:
                     used_modes.add(mode)
-                    index = N.where(self.keywords[nodes]==mode)
-                    if len(index[0])>1:
-                        raise KeyError('%d matches found for %s'%(len(index[0]),mode))
-                    idx=index[0][0]
-                    component = self.compnames[nodes[0][idx]]
-                    thcomponent = self.thcompnames[nodes[0][idx]]
-                    outnode = self.outnodes[nodes[0][idx]]
+                    matched.add(mode)
+                    if len(rows)>1:
+                        raise KeyError('%d matches found for %s'%(len(rows),mode))
+                    row = rows[0]
+                    component = self.compnames[row]
+                    thcomponent = self.thcompnames[row]
+                    outnode = self.outnodes[row]
                     used_default=False
+            ambiguous = ambiguous or len(matched) > 1
 
             if DEBUG:
                 print("Innode %d  Outnode %d  Compname %s"%(innode, outnode, component))
             components.append(component)
             thcomponents.append(thcomponent)
 
-
             innode = outnode
 
             if outnode == previous_outnode:
@@ -262,4 +387,4 @@ class GraphTable(object):
             unused=str(inmodes.difference(used_modes))
             raise ValueError("Warning: unused keywords %s"%unused)
 
-        return (components,thcomponents)
+        return (components, thcomponents, ambiguous)
@@ -3,7 +3,8 @@ from __future__ import absolute_import, division, print_function
 import numpy as np
 from numpy.testing import assert_allclose
 
-from ..spectrum import BlackBody, FlatSpectrum, GaussianSource, Powerlaw
+from ..spectrum import (ArraySpectralElement, BlackBody, Box, FlatSpectrum,
+                        GaussianSource, Powerlaw)
 
 
 class TestPowerLaw(object):
@@ -104,3 +105,45 @@ class TestBlackBody(object):
             0.00020861, 0.00021175, 0.00021491, 0.00021809, 0.00022128])
         ans = self.bb.sample(self.wave[:10])
         assert_allclose(ans, ref, rtol=3e-5)
+
+
+class TestClosedFormIntegration(object):
+    def setup_class(self):
+        self.box = Box(5000, 100)
+        self.flat = FlatSpectrum(1, fluxunits='flam')
+
+    def test_box(self):
+        assert_allclose(self.box.integrate(), 100, rtol=1e-12)
+        assert_allclose(self.box.avgwave(), 5000, rtol=1e-12)
+        assert_allclose(self.box.rmswidth(), 100 / np.sqrt(12), rtol=1e-10)
+        assert_allclose(self.box.pivot(),
+                        np.sqrt(5e5 / np.log(5050 / 4950.)), rtol=1e-12)
+        assert_allclose(self.box.efficiency(), np.log(5050 / 4950.),
+                        rtol=1e-12)
+        assert_allclose((self.box * 0.5).equivwidth(), 50, rtol=1e-12)
+
+    def test_box_subset(self):
+        # An explicit wavelength set is still integrated numerically,
+        # including the ramp at the lower edge of the box.
+        w = self.box.wave
+        assert_allclose(self.box.integrate(w[:w.size // 2]), 50.005)
+
+    def test_flat_in_box(self):
+        sp = self.flat * self.box
+        assert_allclose(sp.integrate('flam'), 100, rtol=1e-12)
+        sp2 = self.flat.renorm(10, 'flam', self.box)
+        assert_allclose((sp2 * self.box).integrate('flam'), 1000, rtol=1e-12)
+
+    def test_gaussian(self):
+        g = GaussianSource(1e-14, 5000, 30)
+        assert_allclose(g.integrate('flam'), 1e-14, rtol=1e-6)
+
+    def test_matches_trapezoid(self):
+        sp = BlackBody(5000) + Powerlaw(5000, -2, fluxunits='flam') * 1e-3
+        assert_allclose(sp.integrate(), sp._sampledIntegral(), rtol=1e-5)
+
+    def test_not_analytic(self):
+        bp = self.box * ArraySpectralElement(np.array([4000., 6000.]),
+                                             np.array([1., 1.]))
+        assert bp._quadrature() is None
+        assert FlatSpectrum(1, fluxunits='counts')._quadrature() is None
@@ -0,0 +1,69 @@
+"""Tests for BandpassBank against the equivalent Observation results."""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+
+from ..bandpassbank import BandpassBank
+from ..observation import Observation
+from ..spectrum import (ArraySourceSpectrum, ArraySpectralElement, Box,
+                        SpectrumGrid)
+
+
+class TestBandpassBank(object):
+    def setup_class(self):
+        self.bands = [
+            ArraySpectralElement(np.arange(4500, 6500, 2.5),
+                                 np.sin(np.linspace(0, np.pi, 800)) ** 2,
+                                 name='sin2'),
+            Box(6000, 500),
+            Box(4000, 200)]
+        self.bank = BandpassBank(self.bands)
+        wave = self.bank.wave
+        self.spectra = [
+            ArraySourceSpectrum(
+                wave=wave, fluxunits='flam',
+                flux=np.exp(-((wave - center) / 2000.0) ** 2) + 0.1)
+            for center in (4000, 5000, 7000)]
+
+    def _expected(self, func):
+        return np.array([[func(Observation(sp, bp)) for bp in self.bands]
+                         for sp in self.spectra])
+
+    def test_shape(self):
+        assert len(self.bank) == 3
+        assert self.bank.weights.shape == (3, self.bank.wave.size)
+        assert self.bank.names[0] == 'sin2'
+
+    @pytest.mark.parametrize(
+        'fluxunits',
+        ['photlam', 'flam', 'fnu', 'jy', 'abmag', 'stmag', 'vegamag',
+         'counts', 'obmag'])
+    def test_effstim(self, fluxunits):
+        expected = self._expected(lambda obs: obs.effstim(fluxunits))
+        np.testing.assert_allclose(
+            self.bank.effstim(self.spectra, fluxunits), expected, rtol=1e-12)
+
+    def test_countrate(self):
+        expected = self._expected(lambda obs: obs.countrate(binned=False))
+        np.testing.assert_allclose(
+            self.bank.countrate(self.spectra), expected, rtol=1e-12)
+
+    def test_inputs(self):
+        expected = self.bank.countrate(self.spectra)
+        flux = np.array([sp.flux for sp in self.spectra])
+        np.testing.assert_allclose(
+            self.bank.countrate(flux, fluxunits='flam'), expected,
+            rtol=1e-12)
+        grid = SpectrumGrid.from_spectra(self.spectra)
+        np.testing.assert_allclose(
+            self.bank.countrate(grid), expected, rtol=1e-12)
+        np.testing.assert_allclose(
+            self.bank.effstim(self.spectra[1], 'abmag'),
+            self.bank.effstim(flux, 'abmag', influxunits='flam')[1],
+            rtol=1e-12)
+
+    def test_mag_input(self):
+        with pytest.raises(ValueError):
+            self.bank.countrate(np.ones(self.bank.wave.size),
+                                fluxunits='abmag')
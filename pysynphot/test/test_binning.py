@@ -49,3 +49,43 @@ def test_calculate_bin_raises(a):
 
     with pytest.raises(ValueError):
         binning.calculate_bin_centers(a)
+
+
+def test_calculate_binflux():
+    """Test binned flux against a per-bin loop, with gaps between bins."""
+    avflux = np.linspace(1, 2, 10)
+    deltaw = np.linspace(0.5, 1.5, 10)
+    indices = np.array([0, 3, 7])
+    indices_last = np.array([3, 6, 10])
+
+    binflux, intwave = binning.calculate_binflux(
+        indices, indices_last, avflux, deltaw)
+
+    for i, (first, last) in enumerate(zip(indices, indices_last)):
+        w = deltaw[first:last]
+        np.testing.assert_allclose(intwave[i], w.sum(), rtol=1e-14)
+        np.testing.assert_allclose(
+            binflux[i], (avflux[first:last] * w).sum() / w.sum(), rtol=1e-14)
+
+
+def test_calculate_binflux_out():
+    """Test that given output arrays are filled in place."""
+    binflux = np.zeros(2)
+    intwave = np.zeros(2)
+    res = binning.calculate_binflux(
+        [0, 2], [2, 4], [1., 1., 3., 3.], [1., 1., 1., 1.],
+        binflux=binflux, intwave=intwave)
+
+    assert res[0] is binflux and res[1] is intwave
+    assert_array_equal(binflux, [1, 3])
+    assert_array_equal(intwave, [2, 2])
+
+
+@pytest.mark.parametrize(('indices_last', 'deltaw'),
+                         [([0, 2], [1., 1.]),
+                          ([1, 1], [1., 1.]),
+                          ([1, 2], [1., 0.])])
+def test_calculate_binflux_raises(indices_last, deltaw):
+    """Test we get a ZeroDivisionError for an empty or zero-width bin."""
+    with pytest.raises(ZeroDivisionError):
+        binning.calculate_binflux([0, 1], indices_last, [1., 1.], deltaw)
@@ -0,0 +1,491 @@
+"""Tests for in-memory caching of tables and arrays."""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from .. import Cache, locations, spectrum, tables
+from ..obsbandpass import ObsBandpass, ObsModeBandpass
+from ..spectrum import (ArraySourceSpectrum, ArraySpectralElement,
+                        BlackBody, Box, FileSourceSpectrum,
+                        FileSpectralElement, GaussianSource)
+from ..tables import CompTable, GraphTable
+
+
+def test_lru_budget():
+    cache = Cache.LRUCache(100)
+    cache.put('a', 1, 40)
+    cache.put('b', 2, 40)
+    assert cache.get('a') == 1  # 'b' is now least recently used
+    cache.put('c', 3, 40)
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.nbytes == 80
+    cache.put('huge', 4, 1000)
+    assert 'huge' not in cache
+    assert cache.stats() == {'entries': 2, 'nbytes': 80, 'maxbytes': 100,
+                             'hits': 1, 'misses': 1, 'evictions': 1}
+    assert cache.pop('a') == 1
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 0
+
+
+def _frozen(a):
+    a = np.array(a)
+    a.flags.writeable = False
+    return a
+
+
+class TestInterpCache(object):
+    def setup_method(self, method):
+        Cache.reset_interp_cache()
+        # Only read-only arrays are cached.
+        self.bp = ArraySpectralElement(np.arange(1000, 2000, 10.0),
+                                       np.linspace(0, 1, 100))
+        self.bp._wavetable = _frozen(self.bp._wavetable)
+        self.bp._throughputtable = _frozen(self.bp._throughputtable)
+        self.wave = _frozen(np.linspace(900, 2100, 333))
+        self.expected = np.interp(self.wave, self.bp._wavetable,
+                                  self.bp._throughputtable)
+
+    def teardown_method(self, method):
+        Cache.reset_interp_cache()
+
+    def test_stored_on_second_call(self):
+        for i in range(3):
+            ans = self.bp(self.wave)
+            np.testing.assert_array_equal(ans, self.expected)
+            ans[:] = -1  # callers get their own copy
+        stats = Cache.INTERP_CACHE.stats()
+        assert stats['entries'] == 1
+        assert stats['nbytes'] == (self.expected.nbytes +
+                                   spectrum._INTERP_ENTRY_BYTES)
+        assert stats['hits'] == 2
+
+    def test_dropped_with_array(self):
+        self.bp(self.wave)
+        assert len(Cache.INTERP_CACHE) == 1
+        del self.wave
+        assert len(Cache.INTERP_CACHE) == 0
+
+    def test_bounded(self, monkeypatch):
+        monkeypatch.setattr(Cache.INTERP_CACHE, 'maxbytes',
+                            10 * spectrum._INTERP_ENTRY_BYTES)
+        waves = [_frozen(self.wave + i) for i in range(100)]
+        for wave in waves:
+            self.bp(wave)
+        stats = Cache.INTERP_CACHE.stats()
+        assert stats['entries'] == 10
+        assert stats['evictions'] == 90
+
+    def test_writable(self):
+        wave = np.linspace(900, 2100, 333)
+        for i in range(2):
+            self.bp(wave)
+        wave[10:40] += 37
+        np.testing.assert_array_equal(
+            self.bp(wave),
+            np.interp(wave, self.bp._wavetable, self.bp._throughputtable))
+
+        # A read-only view of a writable array is not frozen either.
+        view = wave.view()
+        view.flags.writeable = False
+        self.bp(view)
+        wave[50:60] -= 11
+        np.testing.assert_array_equal(
+            self.bp(view),
+            np.interp(wave, self.bp._wavetable, self.bp._throughputtable))
+        assert len(Cache.INTERP_CACHE) == 0
+
+    def test_invalidate(self):
+        self.bp(self.wave)
+        self.bp(self.wave)
+        self.bp._throughputtable.flags.writeable = True
+        self.bp._throughputtable[:] = 0.5
+        self.bp._throughputtable.flags.writeable = False
+        self.bp.invalidate()
+        np.testing.assert_array_equal(self.bp(self.wave), 0.5)
+
+
+class TestArraysCache(object):
+    def setup_method(self, method):
+        self.arr = ArraySourceSpectrum(np.arange(3000, 8000, 10.0),
+                                       np.linspace(1, 2, 500))
+        self.sp = self.arr * Box(5000, 1000)
+
+    def test_cached(self):
+        wave, flux = self.sp.getArrays()
+        self.sp._getInternalArrays = None  # must not be called again
+        w2, f2 = self.sp.getArrays()
+        np.testing.assert_array_equal(w2, wave)
+        np.testing.assert_array_equal(f2, flux)
+        wave[:] = 0  # callers get their own copy
+        assert self.sp.wave[0] > 0
+
+    def test_units(self):
+        wave, flux = self.sp.getArrays(waveunits='nm', fluxunits='flam')
+        assert self.sp.waveunits.name == 'angstrom'
+        assert self.sp.fluxunits.name == 'photlam'
+        self.sp.convert('nm')
+        self.sp.convert('flam')
+        np.testing.assert_array_equal(self.sp.wave, wave)
+        np.testing.assert_array_equal(self.sp.flux, flux)
+
+    def test_invalidate_on_leaf(self):
+        flux = self.sp.flux
+        self.arr._fluxtable = self.arr._fluxtable * 2
+        np.testing.assert_allclose(self.sp.flux, flux * 2)
+        self.arr._fluxtable *= 2
+        self.arr.invalidate()
+        np.testing.assert_allclose(self.sp.flux, flux * 4)
+
+    def test_parameters(self):
+        bb = BlackBody(5000)
+        flux = bb.flux
+        bb.temperature = 10000
+        np.testing.assert_array_equal(bb.flux, bb(bb.wave))
+        assert not np.array_equal(bb.flux, flux)
+
+        gs = GaussianSource(1, 5000, 10)
+        sp = gs + self.arr
+        wave = sp.wave
+        gs.center = 6000
+        ref = GaussianSource(1, 6000, 10)
+        np.testing.assert_array_equal(gs.wave, ref.wave)
+        np.testing.assert_array_equal(gs.flux, ref.flux)
+        np.testing.assert_array_equal(sp.wave, (ref + self.arr).wave)
+        np.testing.assert_array_equal(sp.flux, (ref + self.arr).flux)
+        assert not np.array_equal(sp.wave, wave)
+
+        box = Box(5000, 1000)
+        sp = self.arr * box
+        flux = sp.flux
+        box.lower = 5200
+        np.testing.assert_array_equal(sp.flux, sp(sp.wave))
+        assert not np.array_equal(sp.flux, flux)
+
+
+class TestMmap(object):
+    def setup_method(self, method):
+        self.savedir = Cache.MMAP_DIR
+
+    def teardown_method(self, method):
+        Cache.MMAP_DIR = self.savedir
+
+    def _write(self, path, fluxunit, fluxname='flux'):
+        wave = np.arange(1000, 2000, 10.0)
+        flux = np.linspace(-0.1, 1, wave.size).astype('>f4')
+        hdu = fits.BinTableHDU.from_columns([
+            fits.Column(name='WAVELENGTH', format='D', array=wave,
+                        unit='ANGSTROM'),
+            fits.Column(name=fluxname.upper(), format='E', array=flux,
+                        unit=fluxunit)])
+        hdu.writeto(str(path))
+        return wave, np.clip(flux, 0, None)
+
+    def test_bandpass(self, tmpdir):
+        fname = tmpdir.join('bp.fits')
+        wave, thru = self._write(fname, '', fluxname='throughput')
+        Cache.set_mmap_dir(str(tmpdir.join('mmap')))
+        for i in range(2):  # store, then load the stored copy
+            bp = FileSpectralElement(str(fname))
+            assert isinstance(bp._wavetable, np.memmap)
+            assert isinstance(bp._throughputtable, np.memmap)
+            assert bp._throughputtable.dtype.isnative
+            np.testing.assert_array_equal(bp.wave, wave)
+        assert len(tmpdir.join('mmap').listdir()) == 2
+
+        Cache.set_mmap_dir(None)
+        bp2 = FileSpectralElement(str(fname))
+        assert not isinstance(bp2._wavetable, np.memmap)
+        np.testing.assert_array_equal(bp(wave), bp2(wave))
+
+    def test_source(self, tmpdir):
+        fname = tmpdir.join('sp.fits')
+        wave, flux = self._write(fname, 'PHOTLAM')
+        Cache.set_mmap_dir(str(tmpdir.join('mmap')))
+        sp = FileSourceSpectrum(str(fname))  # negative flux is clipped
+        assert isinstance(sp._wavetable, np.memmap)
+        np.testing.assert_array_equal(sp(wave), flux)
+        sp = FileSourceSpectrum(str(fname), keepneg=True)
+        assert isinstance(sp._fluxtable, np.memmap)
+
+    def test_unwritable(self, tmpdir, monkeypatch):
+        fname = tmpdir.join('sp.fits')
+        wave, flux = self._write(fname, 'PHOTLAM')
+        monkeypatch.setattr(Cache, 'MMAP_DIR', str(tmpdir.join('no', 'dir')))
+        with pytest.warns(UserWarning, match='Cannot store column'):
+            sp = FileSourceSpectrum(str(fname))
+        assert not isinstance(sp._wavetable, np.memmap)
+        np.testing.assert_array_equal(sp(wave), flux)
+
+        monkeypatch.setenv('PYSYN_MMAP_DIR', str(tmpdir.join('env', 'mmap')))
+        assert Cache._env_dir('PYSYN_MMAP_DIR') == str(tmpdir.join('env', 'mmap'))
+        assert tmpdir.join('env', 'mmap').isdir()
+
+
+class TestReffileCache(object):
+    def setup_method(self, method):
+        Cache.reset_reffile_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_reffile_cache()
+
+    def _write(self, path, thru):
+        with open(str(path), 'w') as f:
+            for w, t in zip(np.arange(1000, 1000 + 10 * len(thru), 10), thru):
+                f.write('%g %g\n' % (w, t))
+
+    def test_shared(self, tmpdir):
+        fname = str(tmpdir.join('bp.dat'))
+        self._write(fname, [0, 0.5, 1, 0.5, 0])
+        bp1 = FileSpectralElement(fname)
+        bp2 = FileSpectralElement(fname)
+        assert bp2._throughputtable is bp1._throughputtable
+        assert not bp1._throughputtable.flags.writeable
+        assert Cache.REFFILE_CACHE.stats()['hits'] == 1
+
+        # Different loading options are cached separately.
+        sp = FileSourceSpectrum(fname)
+        assert sp._wavetable is not bp1._wavetable
+
+    def test_file_changed(self, tmpdir):
+        fname = str(tmpdir.join('bp.dat'))
+        self._write(fname, [0, 0.5, 1, 0.5, 0])
+        bp1 = FileSpectralElement(fname)
+        self._write(fname, [0, 0.25, 0.5, 0.75, 1, 0])
+        bp2 = FileSpectralElement(fname)
+        assert bp2._throughputtable.size == 6
+        assert bp1._throughputtable.size == 5
+
+
+class TestBandpassCache(object):
+    def setup_method(self, method):
+        Cache.reset_bandpass_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_bandpass_cache()
+
+    def _write(self, tmpdir, keywords=('inst', 'f1', 'f2', 'default')):
+        """Write a graph table for ``inst,f1`` and ``inst,f2`` with
+        a default detector, and the matching component table."""
+        compnames = ['inst', 'filt1', 'filt2', 'det']
+        filenames = []
+        for i, name in enumerate(compnames):
+            fname = str(tmpdir.join(name + '.dat'))
+            thru = np.full(21, 0.2 * (i + 1))
+            thru[[0, -1]] = 0
+            with open(fname, 'w') as f:
+                for w, t in zip(np.arange(4000, 6001, 100.0), thru):
+                    f.write('%g %g\n' % (w, t))
+            filenames.append(fname)
+
+        tmg = str(tmpdir.join('test_tmg.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A',
+                        array=compnames),
+            fits.Column(name='KEYWORD', format='10A',
+                        array=list(keywords)),
+            fits.Column(name='INNODE', format='J', array=[1, 2, 2, 3]),
+            fits.Column(name='OUTNODE', format='J', array=[2, 3, 3, 4]),
+            fits.Column(name='THCOMPNAME', format='10A',
+                        array=['clear'] * 4)]).writeto(tmg)
+
+        tmc = str(tmpdir.join('test_tmc.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A', array=compnames),
+            fits.Column(name='FILENAME', format='200A',
+                        array=filenames)]).writeto(tmc)
+        return tmg, tmc
+
+    def test_shared(self, tmpdir):
+        tmg, tmc = self._write(tmpdir)
+        bp1 = ObsBandpass('inst,f1', graphtable=tmg, comptable=tmc)
+        bp2 = ObsBandpass('Inst,F1', graphtable=tmg, comptable=tmc)
+
+        stats = Cache.BANDPASS_CACHE.stats()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+        assert bp2 is not bp1
+        assert bp2.component2 is bp1.component2
+        assert str(bp1) == 'inst,f1'
+        assert str(bp2) == 'Inst,F1'
+        np.testing.assert_allclose(bp2.throughput[1:-1], 0.2 * 0.4 * 0.8)
+
+        # Changing the units of a copy does not affect the others.
+        bp2.convert('nm')
+        assert bp1.waveunits.name == 'angstrom'
+        assert ObsBandpass('inst,f1', graphtable=tmg,
+                           comptable=tmc).waveunits.name == 'angstrom'
+
+        bp3 = ObsBandpass('inst,f2', graphtable=tmg, comptable=tmc)
+        np.testing.assert_allclose(bp3.throughput[1:-1], 0.2 * 0.6 * 0.8)
+        assert len(Cache.BANDPASS_CACHE.keys()) == 2
+
+    def test_keyword_order(self, tmpdir):
+        # Both keywords match the filter node; the last one wins.
+        tmg, tmc = self._write(tmpdir, keywords=('inst', 'hi', 'lo',
+                                                 'default'))
+        bp1 = ObsBandpass('inst,hi,lo', graphtable=tmg, comptable=tmc)
+        bp2 = ObsBandpass('inst,lo,hi', graphtable=tmg, comptable=tmc)
+        np.testing.assert_allclose(bp1.throughput[1:-1], 0.2 * 0.6 * 0.8)
+        np.testing.assert_allclose(bp2.throughput[1:-1], 0.2 * 0.4 * 0.8)
+        assert len(Cache.BANDPASS_CACHE) == 2
+
+    def test_component_dict(self, tmpdir):
+        tmg, tmc = self._write(tmpdir)
+        ObsBandpass('inst,f1', graphtable=tmg, comptable=tmc,
+                    component_dict={})
+        assert Cache.BANDPASS_CACHE.stats()['misses'] == 0
+        assert len(Cache.BANDPASS_CACHE) == 0
+
+    def test_collapse(self, tmpdir):
+        tmg, tmc = self._write(tmpdir)
+        bp = ObsBandpass('inst,f1', graphtable=tmg, comptable=tmc)
+        chain = ObsModeBandpass(bp.obsmode, collapse=False)
+        wave = np.linspace(3900, 6100, 1001)
+        np.testing.assert_array_equal(bp(wave), chain(wave))
+        np.testing.assert_array_equal(bp.throughput, chain.throughput)
+        assert bp._table[2] is ObsBandpass(
+            'inst,f1', graphtable=tmg, comptable=tmc)._table[2]
+
+        # The table is rebuilt when a component changes.
+        comp = bp.complist()[0]
+        comp._throughputtable = comp._throughputtable * 0.5
+        comp.invalidate()
+        np.testing.assert_array_equal(bp(wave), chain(wave))
+
+
+class TestGraphTable(object):
+    def setup_class(self):
+        rows = [('inst', 1, 2, 'inst'),
+                ('f1', 2, 3, 'filt1'),
+                ('f2', 2, 3, 'filt2'),
+                ('default', 3, 4, 'det'),
+                ('aper#', 3, 4, 'det_ap'),
+                ('HI', 4, 5, 'hi'),
+                ('lo', 4, 5, 'lo'),
+                ('default', 4, 5, 'none'),
+                ('dup', 5, 6, 'dup_a'),
+                ('dup', 5, 6, 'dup_b'),
+                ('default', 5, 6, 'clear')]
+        keywords, innodes, outnodes, compnames = zip(*rows)
+        self.hdu = fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A', array=compnames),
+            fits.Column(name='KEYWORD', format='10A', array=keywords),
+            fits.Column(name='INNODE', format='J', array=innodes),
+            fits.Column(name='OUTNODE', format='J', array=outnodes),
+            fits.Column(name='THCOMPNAME', format='10A',
+                        array=['clear'] * len(rows))])
+
+    def _table(self, tmpdir):
+        fname = str(tmpdir.join('test_tmg.fits'))
+        self.hdu.writeto(fname)
+        return GraphTable(fname)
+
+    def test_memoized(self, tmpdir):
+        gt = self._table(tmpdir)
+        comps, thcomps = gt.GetComponentsFromGT(['inst', 'f1'], 1)
+        assert comps == ['inst', 'filt1', 'det', 'none', 'clear']
+        assert thcomps == ['clear'] * 5
+
+        # Keyword order does not matter, and callers get their own lists.
+        comps.append('extra')
+        assert gt.GetComponentsFromGT(['f1', 'inst'], 1)[0] == [
+            'inst', 'filt1', 'det', 'none', 'clear']
+        assert len(gt._memo) == 1
+
+        assert gt.GetComponentsFromGT(['inst', 'f2', 'aper#'], 1)[0] == [
+            'inst', 'filt2', 'det_ap', 'none', 'clear']
+        assert len(gt._memo) == 2
+
+    def test_last_match_wins(self, tmpdir):
+        gt = self._table(tmpdir)
+        assert gt.GetComponentsFromGT(['inst', 'f1', 'hi', 'lo'],
+                                      1)[0][3] == 'lo'
+        assert gt.GetComponentsFromGT(['inst', 'f1', 'lo', 'hi'],
+                                      1)[0][3] == 'hi'
+        assert len(gt._memo) == 0
+
+    @pytest.mark.parametrize(('modes', 'exc'), [
+        (['inst', 'f1', 'dup'], KeyError),
+        (['inst'], ValueError),
+        (['inst', 'f1', 'bogus'], ValueError)])
+    def test_errors(self, tmpdir, modes, exc):
+        gt = self._table(tmpdir)
+        for i in range(2):
+            with pytest.raises(exc):
+                gt.GetComponentsFromGT(modes, 1)
+        assert len(gt._memo) == 0
+
+
+class TestSnapshot(object):
+    def teardown_method(self, method):
+        Cache.set_snapshot_dir(None)
+
+    def _write(self, tmpdir, dirname='crtest'):
+        tmc = str(tmpdir.join('test_tmc.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A',
+                        array=['inst', 'filt', 'bad']),
+            fits.Column(name='FILENAME', format='40A',
+                        array=[dirname + '$inst.dat', '/abs/filt.dat',
+                               'nosuchdir$bad.dat'])]).writeto(tmc)
+        return tmc
+
+    def test_graph_table(self, tmpdir, monkeypatch):
+        tmg, tmc = TestBandpassCache()._write(tmpdir)
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        gt1 = GraphTable(tmg)
+        assert len(tmpdir.join('snap').listdir()) == 1
+
+        # The second table never opens the FITS file.
+        def fail(*args, **kwargs):
+            raise AssertionError('table was read again')
+        monkeypatch.setattr(tables.pyfits, 'open', fail)
+        gt2 = GraphTable(tmg)
+        np.testing.assert_array_equal(gt2.keywords, gt1.keywords)
+        assert gt2._nodes == gt1._nodes
+        assert gt2._memo == {}
+        assert (gt2.GetComponentsFromGT(['inst', 'f2'], 1) ==
+                gt1.GetComponentsFromGT(['inst', 'f2'], 1))
+
+    def test_comp_table(self, tmpdir, monkeypatch):
+        tmc = self._write(tmpdir)
+        monkeypatch.setitem(locations.CONVERTDICT, 'crtest', '/one')
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        ct = CompTable(tmc)
+        assert ct.GetFileName('inst') == '/one/inst.dat'
+        assert 'inst' in ct and 'none' not in ct
+        with pytest.raises(KeyError):
+            ct.GetFileName('bad')
+
+        # The stored file names are redone when the mapping changes.
+        monkeypatch.setitem(locations.CONVERTDICT, 'crtest', '/two')
+        assert ct.GetFileName('inst') == '/two/inst.dat'
+        assert CompTable(tmc)._paths[1]['inst'] == '/two/inst.dat'
+        monkeypatch.setattr(tables.pyfits, 'open', None)
+        assert CompTable(tmc)._paths[1]['inst'] == '/two/inst.dat'
+        assert CompTable(tmc).GetFileName('filt') == '/abs/filt.dat'
+        assert len(tmpdir.join('snap').listdir()) == 1
+
+    def test_file_changed(self, tmpdir):
+        tmc = self._write(tmpdir)
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        CompTable(tmc)
+        tmpdir.join('test_tmc.fits').remove()
+        tmc = self._write(tmpdir, dirname='crrefer')
+        assert CompTable(tmc)._compdict['inst'] == 'crrefer$inst.dat'
+        assert len(tmpdir.join('snap').listdir()) == 2
+
+    def test_unwritable(self, tmpdir, monkeypatch):
+        tmc = self._write(tmpdir)
+        monkeypatch.setattr(Cache, 'SNAPSHOT_DIR', str(tmpdir.join('no', 'dir')))
+        ct = CompTable(tmc)  # the snapshot is skipped
+        assert ct._compdict['inst'] == 'crtest$inst.dat'
+        assert not tmpdir.join('no').exists()
+
+        monkeypatch.setenv('PYSYN_SNAPSHOT_DIR', str(tmpdir.join('env')))
+        assert Cache._env_dir('PYSYN_SNAPSHOT_DIR') == str(tmpdir.join('env'))
+        assert tmpdir.join('env').isdir()
@@ -7,7 +7,7 @@ import pytest
 import numpy as np
 from numpy.testing import assert_allclose, assert_array_equal
 
-from .. import Cache
+from .. import Cache, locations
 from ..exceptions import ParameterOutOfBounds
 from ..catalog import Icat
 
@@ -124,3 +124,185 @@ class TestCatalogCache(object):
 
         Cache.reset_catalog_cache()
         assert len(Cache.CATALOG_CACHE) == 0
+
+
+class TestCatalogGrid(object):
+    """Test the parameter grid on a small catalog where the available
+    metallicities and gravities depend on the temperature."""
+    def setup_method(self, method):
+        Cache.reset_catalog_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_catalog_cache()
+
+    @pytest.fixture
+    def catdir(self, tmpdir, monkeypatch):
+        from astropy.io import fits
+
+        grid = {3500.0: {0.0: [3.0, 4.5]},
+                5000.0: {-1.0: [1.5, 3.0, 4.5], 0.0: [3.0, 4.5]},
+                6500.0: {-1.0: [3.0], 0.0: [0.0, 3.0, 4.5]}}
+        wave = np.linspace(1000, 10000, 50)
+        catdir = tmpdir.mkdir('testcat')
+        index, names = [], []
+        for teff, zgrid in grid.items():
+            for z, loggs in zgrid.items():
+                fname = 't%d_z%g.fits' % (teff, z)
+                cols = [fits.Column(name='WAVELENGTH', format='D',
+                                    array=wave, unit='ANGSTROM')]
+                for logg in loggs:
+                    col = 'G%02d' % (logg * 10)
+                    flux = teff * (1 + z) + logg + wave * 1e-4
+                    if logg == 0:
+                        flux[:] = 0  # no valid data
+                    cols.append(fits.Column(name=col, format='D',
+                                            array=flux * 1e-15, unit='FLAM'))
+                    index.append('%g,%g,%g' % (teff, z, logg))
+                    names.append('%s[%s]' % (fname, col))
+                fits.BinTableHDU.from_columns(cols).writeto(
+                    str(catdir.join(fname)))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='INDEX', format='20A', array=index),
+            fits.Column(name='FILENAME', format='40A',
+                        array=names)]).writeto(str(catdir.join('catalog.fits')))
+
+        monkeypatch.setattr(locations, 'CAT_TEMPLATE',
+                            str(tmpdir.join('*', 'catalog.fits')))
+        monkeypatch.setattr(locations, 'KUR_TEMPLATE', str(tmpdir.join('*')))
+        return 'testcat'
+
+    def _reference(self, catdir, teff, z, logg):
+        """Interpolate with the composite spectrum of the original
+        implementation."""
+        sp = Icat.__new__(Icat)
+        sp.parameter_names = ['Teff', 'metallicity', 'log G']
+        indices = Cache.CATALOG_CACHE[
+            locations.CAT_TEMPLATE.replace('*', catdir)]
+        list0, list1 = sp._breakList(indices, 0, teff)
+        lists = [sp._breakList(sp._breakList(l, 1, z)[i], 2, logg)
+                 for l in (list0, list1) for i in (0, 1)]
+        spectra = [sp._getSpectrum(pair[i][0], catdir)
+                   for pair in lists for i in (0, 1)]
+        sp._interpolateSpectra(spectra, teff, z, logg)
+        return sp
+
+    @pytest.mark.parametrize(('teff', 'z', 'logg'),
+                             [(5000, -1, 3), (4200, 0, 3.7),
+                              (5500, -0.4, 3), (3500, 0, 4.5),
+                              (5800, 0, 4)])
+    def test_interpolation(self, catdir, teff, z, logg):
+        sp = Icat(catdir, teff, z, logg)
+        ref = self._reference(catdir, teff, z, logg)
+        assert_array_equal(sp._wavetable, ref._wavetable)
+        assert_array_equal(sp._fluxtable, ref._fluxtable)
+        assert sp._fluxtable.flags.writeable
+
+    @pytest.mark.parametrize(('teff', 'z', 'logg'),
+                             [(7000, 0, 3), (3000, 0, 3), (4000, -0.5, 3),
+                              (6000, 0.5, 3), (6000, -1, 4), (6000, 0, 5),
+                              (6000, -0.5, 1)])
+    def test_exceptions(self, catdir, teff, z, logg):
+        Icat(catdir, 5000, 0, 3)
+        with pytest.raises(ParameterOutOfBounds) as exc:
+            self._reference(catdir, teff, z, logg)
+        with pytest.raises(ParameterOutOfBounds) as exc2:
+            Icat(catdir, teff, z, logg)
+        assert str(exc2.value) == str(exc.value)
+
+    def test_batch(self, catdir):
+        teff = [5000, 4200, 5500, 7000, 3500, 5800, 6000]
+        z = [-1, 0, -0.4, 0, 0, 0, -0.5]
+        logg = [3, 3.7, 3, 3, 4.5, 4, 1]
+        grid, valid = Icat.batch(catdir, teff, z, logg)
+        assert len(grid) == len(teff)
+        assert_array_equal(valid, [True, True, True, False, True, True,
+                                   False])
+        for i in range(len(teff)):
+            if valid[i]:
+                sp = Icat(catdir, teff[i], z[i], logg[i])
+                assert_array_equal(grid._wavetable, sp._wavetable)
+                assert_array_equal(grid._fluxtable[i], sp._fluxtable)
+                assert grid.names[i] == sp.name
+            else:
+                assert_array_equal(grid._fluxtable[i], 0)
+        assert grid.fluxunits.name == 'flam'
+
+        # Corner with no valid data
+        grid, valid = Icat.batch(catdir, [6000, 6000], 0, [2, 3])
+        assert_array_equal(valid, [False, True])
+
+        with pytest.raises(ParameterOutOfBounds):
+            Icat.batch(catdir, 7000, 0, [3, 4])
+
+    def test_snapshot(self, catdir, tmpdir, monkeypatch):
+        from .. import catalog
+
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        try:
+            catalog.preload([catdir])
+            assert len(Cache.CATALOG_CACHE) == 1
+            assert len(tmpdir.join('snap').listdir()) == 1
+            sp1 = Icat(catdir, 4200, 0, 3.7)
+
+            # A new process loads the index without reading the catalog.
+            Cache.reset_catalog_cache()
+
+            monkeypatch.setattr(catalog, 'pyfits', None)
+            sp2 = Icat(catdir, 4200, 0, 3.7)
+            assert_array_equal(sp2._fluxtable, sp1._fluxtable)
+            assert isinstance(Cache.CATALOG_CACHE[
+                locations.CAT_TEMPLATE.replace('*', catdir)], list)
+        finally:
+            Cache.set_snapshot_dir(None)
+
+    def test_isvalid(self, catdir, tmpdir, monkeypatch):
+        from .. import catalog
+
+        teff = [5000, 4200, 5500, 7000, 6000, 6000, 6000]
+        z = [-1, 0, -0.4, 0, -0.5, 0, 0]
+        logg = [3, 3.7, 3, 3, 1, 2, 3]
+        valid = Icat.isvalid(catdir, teff, z, logg)
+        assert_array_equal(valid, Icat.batch(catdir, teff, z, logg)[1])
+        assert_array_equal(valid, [True, True, True, False, False, False,
+                                   True])
+
+        Cache.reset_catalog_cache()
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        try:
+            catalog.preload([catdir], validate=True)
+
+            # The validity of all entries is stored with the snapshot,
+            # so invalid grid points are rejected without any reads.
+            Cache.reset_catalog_cache()
+            monkeypatch.setattr(catalog, 'pyfits', None)
+            assert_array_equal(Icat.isvalid(catdir, teff, z, logg), valid)
+            with pytest.raises(ParameterOutOfBounds) as exc:
+                Icat(catdir, 6500, 0, 2)
+            assert 'no valid data' in str(exc.value)
+        finally:
+            Cache.set_snapshot_dir(None)
+
+    def test_replaced_file(self, catdir, tmpdir):
+        from astropy.io import fits
+        from .. import catalog
+
+        Cache.set_snapshot_dir(str(tmpdir.join('snap')))
+        try:
+            catalog.preload([catdir], validate=True)
+            Icat(catdir, 4200, 0, 3.7)
+
+            # Stored validity only rejects entries; a basis spectrum
+            # replaced with bad data is still checked when first read.
+            fname = str(tmpdir.join('testcat', 't5000_z0.fits'))
+            with fits.open(fname) as hdul:
+                data = hdul[1].data.copy()
+            for name in data.names[1:]:
+                data[name] = 0
+            fits.BinTableHDU(data).writeto(fname, overwrite=True)
+
+            Cache.reset_catalog_cache()
+            with pytest.raises(ParameterOutOfBounds) as exc:
+                Icat(catdir, 4200, 0, 3.7)
+            assert 'no valid data' in str(exc.value)
+        finally:
+            Cache.set_snapshot_dir(None)
@@ -0,0 +1,110 @@
+"""Tests for the flattened evaluation plan of composite spectra."""
+from __future__ import absolute_import, division, print_function
+
+import copy
+
+import numpy as np
+
+from ..spectrum import (ArraySourceSpectrum, ArraySpectralElement, BlackBody,
+                        Box, EvaluationPlan, GaussianSource)
+
+
+class TestEvaluationPlan(object):
+    def setup_class(self):
+        self.bb = BlackBody(5000)
+        self.gs = GaussianSource(1e-14, 5000, 100, fluxunits='flam')
+        self.box = Box(5000, 2000)
+        self.arr = ArraySourceSpectrum(
+            wave=np.arange(3000, 8000, 10.0),
+            flux=np.linspace(1, 2, 500), fluxunits='photlam')
+        self.sp = (self.bb * 0.5 + self.gs + self.arr) * self.box
+        self.wave = np.arange(3500, 7500, 1.5)
+
+    def test_matches_recursive(self):
+        expected = ((self.bb(self.wave) * 0.5 + self.gs(self.wave) +
+                     self.arr(self.wave)) * self.box(self.wave))
+        np.testing.assert_array_equal(self.sp(self.wave), expected)
+
+    def test_shared_leaf_evaluated_once(self):
+        sp = self.bb + self.bb * 2
+        plan = sp.compile()
+        assert isinstance(plan, EvaluationPlan)
+        assert len(plan.leaves) == 2  # bb and the scalar element
+        np.testing.assert_array_equal(sp(self.wave), 3 * self.bb(self.wave))
+
+    def test_waveset(self):
+        plan = self.sp.compile()
+        np.testing.assert_array_equal(plan.waveset, self.sp.GetWaveSet())
+        np.testing.assert_array_equal(plan(), self.sp(self.sp.GetWaveSet()))
+
+    def test_plan_is_cached(self):
+        assert self.sp.compile() is self.sp.compile()
+
+    def test_bandpass_plan(self):
+        el = ArraySpectralElement(np.arange(4000, 6000, 10.0),
+                                  np.linspace(0, 1, 200))
+        bp = el * self.box * 0.5
+        expected = el(self.wave) * self.box(self.wave) * 0.5
+        np.testing.assert_array_equal(bp(self.wave), expected)
+
+
+class TestWaveSetCache(object):
+    def setup_method(self, method):
+        self.el = ArraySpectralElement(np.arange(4000, 6000, 10.0),
+                                       np.linspace(0, 1, 200))
+        self.bp = self.el * Box(5000, 100)
+
+    def test_cached(self):
+        plan = self.bp.compile()
+        w1 = self.bp.GetWaveSet()
+        w2 = self.bp.GetWaveSet()
+        assert self.bp.compile() is plan
+        np.testing.assert_array_equal(w1, w2)
+        assert w1 is not w2  # callers get copies
+
+    def test_convert_keeps_plan(self):
+        # Only user units change; internal tables stay in Angstrom.
+        plan = self.bp.compile()
+        self.el.convert('nm')
+        self.bp.convert('micron')
+        assert self.bp.compile() is plan
+        np.testing.assert_array_equal(self.bp.GetWaveSet(), plan.waveset)
+
+    def test_invalidate_on_tointernal(self):
+        plan = self.bp.compile()
+        self.el.ToInternal()
+        assert not plan.isvalid()
+        assert self.bp.compile() is not plan
+
+    def test_explicit_invalidate(self):
+        self.el._wavetable = self.el._wavetable + 5000
+        self.el.invalidate()
+        assert self.bp.GetWaveSet().max() == 10990
+
+    def test_invalidate_composite(self):
+        outer = self.bp * 0.5
+        plan = outer.compile()
+        self.bp.invalidate()
+        assert not plan.isvalid()
+
+    def test_reverse_wave(self):
+        plan = self.bp.compile()
+        self.el._reverse_wave()
+        assert not plan.isvalid()
+
+
+def test_copy_rebinds_plan():
+    """Test that a shallow copy of a composite checks its shared plan
+    against its own components."""
+    wave = np.arange(3000, 8000, 10.0)
+    bp = (ArraySpectralElement(wave, np.linspace(0, 1, wave.size)) *
+          Box(5000, 2000))
+    thru = bp(wave)
+    new = copy.copy(bp)
+    assert new.compile() is not bp.compile()
+    np.testing.assert_array_equal(new(wave), thru)
+
+    new.component2 = Box(5000, 1000)
+    assert bp.compile().isvalid()
+    np.testing.assert_array_equal(bp(wave), thru)
+    assert new(wave).sum() < thru.sum()
@@ -25,6 +25,18 @@ class TestFlip(object):
         assert_array_equal(down(self.waveup), self.t_up)
         assert_array_equal(down(self.wavedown), self.t_flip)
 
+    @pytest.mark.parametrize(
+        ('cls', 'attr'),
+        [(ArraySpectralElement, '_throughputtable'),
+         (ArraySourceSpectrum, '_fluxtable')])
+    def test_call_matches_resample(self, cls, attr):
+        wave = np.array([9990, 10004.5, 10050, 10077.7, 10200.0])
+        for sp in (cls(self.waveup, self.t_up),
+                   cls(self.wavedown, self.t_up[::-1])):
+            for w in (wave, wave[::-1]):
+                assert_array_equal(sp(w), getattr(sp.resample(w), attr))
+            assert sp(10004.5) == getattr(sp.resample(wave), attr)[1]
+
 
 class TestNumpyInterp(object):
     def setup_class(self):
@@ -2,13 +2,18 @@ from __future__ import absolute_import, division, print_function
 
 import os
 
+import warnings
+
 import numpy as np
 import pytest
+from astropy.io import fits
 from numpy.testing import assert_allclose
 
+from .. import Cache, spectrum
 from ..exceptions import ExtrapolationNotAllowed
 from ..obsbandpass import ObsBandpass
-from ..spectrum import InterpolatedSpectralElement
+from ..spectrum import (InterpolatedSpectralElement,
+                        InterpolatedThroughputTable)
 
 
 @pytest.mark.remote_data
@@ -289,3 +294,132 @@ def test_wfpc2_cont():
     bp = ObsBandpass('wfpc2,1,a2d7,f300w,cont#49892.0')
     ur = bp.unit_response()
     assert_allclose(ur, 6.3011E-17, rtol=1e-4)
+
+
+def _write_param_table(fname, doshift=False, extrap=False, default=True):
+    """Write a table parameterized by MJD, with columns out of order."""
+    wave = np.arange(4000, 6001, 50.0)
+    rng = np.random.RandomState(0)
+    cols = [fits.Column(name='WAVELENGTH', format='D', array=wave,
+                        unit='ANGSTROM')]
+    for mjd in (52000, 50000, 51000):
+        thru = rng.uniform(0.1, 0.9, wave.size)
+        thru[[0, -1]] = 0
+        cols.append(fits.Column(name='MJD#%d' % mjd, format='E',
+                                array=thru))
+    if default:
+        cols.append(fits.Column(name='THROUGHPUT', format='E',
+                                array=np.full(wave.size, 0.5)))
+    hdr = fits.Header()
+    if doshift:
+        hdr['PARAMS'] = 'WAVELENGTH'
+    hdr['EXTRAP'] = extrap
+    fits.HDUList([fits.PrimaryHDU(header=hdr),
+                  fits.BinTableHDU.from_columns(cols)]).writeto(fname)
+    return fname + '[mjd#]'
+
+
+class TestThroughputTable(object):
+    def setup_method(self, method):
+        Cache.reset_reffile_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_reffile_cache()
+
+    @pytest.mark.parametrize('doshift', [False, True])
+    @pytest.mark.parametrize('extrap', [False, True])
+    def test_same_as_element(self, tmpdir, doshift, extrap):
+        fname = _write_param_table(str(tmpdir.join('mjd.fits')),
+                                   doshift=doshift, extrap=extrap)
+        table = InterpolatedThroughputTable(fname)
+        np.testing.assert_array_equal(table.params, [50000, 51000, 52000])
+        assert table.table.shape == (3, table.wave.size)
+
+        values = np.array([49000.0, 50000, 50250.5, 51000, 51999.9, 52000,
+                           53000.25])
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            thru = table(values)
+        assert len(w) == (0 if extrap else 1)
+        assert thru.shape == (values.size, table.wave.size)
+        for v, row in zip(values, thru):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                el = InterpolatedSpectralElement(fname, v)
+            np.testing.assert_array_equal(row, el._throughputtable)
+        assert table(51000.0).dtype == np.float32
+
+    def test_no_default(self, tmpdir):
+        fname = _write_param_table(str(tmpdir.join('mjd.fits')),
+                                   default=False)
+        table = InterpolatedThroughputTable(fname)
+        table([50000, 51500])
+        with pytest.raises(ExtrapolationNotAllowed):
+            table([50000, 53000])
+
+    def test_read_once(self, tmpdir, monkeypatch):
+        fname = _write_param_table(str(tmpdir.join('mjd.fits')))
+        InterpolatedSpectralElement(fname, 50500.0)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('table was read again')
+        monkeypatch.setattr(spectrum.pyfits, 'open', fail)
+        el = InterpolatedSpectralElement(fname, 51500.0)
+        assert InterpolatedThroughputTable(fname).table is not None
+        assert el.interpval == 51500.0
+
+
+class TestBandpassStack(object):
+    def setup_method(self, method):
+        Cache.reset_reffile_cache()
+
+    def _write(self, tmpdir):
+        """Write graph and component tables for ``inst,mjd#`` with
+        a default detector."""
+        filenames = [_write_param_table(str(tmpdir.join('mjd.fits')))]
+        for name, scale in (('inst', 0.8), ('det', 0.6)):
+            fname = str(tmpdir.join(name + '.dat'))
+            wave = np.arange(3000, 7001, 125.0)
+            thru = np.full(wave.size, scale)
+            thru[[0, -1]] = 0
+            np.savetxt(fname, np.column_stack([wave, thru]))
+            filenames.append(fname)
+        compnames = ['mjdcomp', 'inst', 'det']
+
+        tmg = str(tmpdir.join('test_tmg.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A',
+                        array=['inst', 'mjdcomp', 'det']),
+            fits.Column(name='KEYWORD', format='10A',
+                        array=['inst', 'mjd#', 'default']),
+            fits.Column(name='INNODE', format='J', array=[1, 2, 3]),
+            fits.Column(name='OUTNODE', format='J', array=[2, 3, 4]),
+            fits.Column(name='THCOMPNAME', format='10A',
+                        array=['clear'] * 3)]).writeto(tmg)
+
+        tmc = str(tmpdir.join('test_tmc.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A', array=compnames),
+            fits.Column(name='FILENAME', format='200A',
+                        array=filenames)]).writeto(tmc)
+        return tmg, tmc
+
+    def test_stack(self, tmpdir):
+        tmg, tmc = self._write(tmpdir)
+        mjds = np.array([50000.0, 50500.5, 51750.0])
+        bank = ObsBandpass('inst,mjd#', graphtable=tmg, comptable=tmc,
+                           params={'MJD': mjds})
+        assert len(bank) == 3
+        assert bank.names[1] == 'inst,mjd#50500.5'
+        for mjd, thru in zip(mjds, bank.throughput):
+            bp = ObsBandpass('inst,mjd#%r' % mjd, graphtable=tmg,
+                             comptable=tmc)
+            np.testing.assert_array_equal(bp.wave, bank.wave)
+            np.testing.assert_allclose(thru, bp(bank.wave), rtol=1e-14)
+            assert bank.bandpasses[0].primary_area == bp.primary_area
+
+    def test_bad_keyword(self, tmpdir):
+        tmg, tmc = self._write(tmpdir)
+        with pytest.raises(ValueError):
+            ObsBandpass('inst,mjd#', graphtable=tmg, comptable=tmc,
+                        params={'aper': [0.1, 0.2]})
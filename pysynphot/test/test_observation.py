@@ -2,14 +2,17 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pytest
 from numpy.testing import assert_allclose, assert_array_equal
 
-from ..observation import Observation
+from .. import spectrum
+from ..observation import Observation, _merge_sorted
 from ..obsbandpass import ObsBandpass
-from ..spectrum import ArraySourceSpectrum, Box, FlatSpectrum
+from ..spectrum import (ArraySourceSpectrum, ArraySpectralElement, Box,
+                        FlatSpectrum)
 from ..spparser import parse_spec
 
 
@@ -65,6 +68,98 @@ class TestBinFlux(object):
         assert_array_equal(self.bp.binset, self.obs.binwave)
 
 
+class TestBinningPlan(object):
+    """Test that bin edges are cached on the bandpass."""
+    def setup_class(self):
+        wave = np.linspace(4000, 6000, 201)
+        self.bp = ArraySpectralElement(wave, np.ones_like(wave))
+        self.binset = np.arange(4010, 5990, 3.7)
+
+    def test_shared_plan(self):
+        sp1 = ArraySourceSpectrum(np.linspace(3000, 7000, 77),
+                                  np.linspace(1, 2, 77))
+        sp2 = FlatSpectrum(1)
+        obs1 = Observation(sp1, self.bp, binset=self.binset)
+        obs2 = Observation(sp2, self.bp, binset=self.binset.copy())
+        obs1.initbinflux()
+        obs2.initbinflux()
+        assert obs1._bin_edges is obs2._bin_edges
+
+        # same as merging the endpoints and binset into each waveset
+        for obs in (obs1, obs2):
+            spwave = spectrum.MergeWaveSets(obs.wave, obs._bin_edges)
+            spwave = spectrum.MergeWaveSets(spwave, self.binset)
+            assert_array_equal(obs._deltaw, np.diff(spwave))
+
+    def test_new_binset(self):
+        obs1 = Observation(FlatSpectrum(1), self.bp, binset=self.binset)
+        obs1.initbinflux()
+        obs2 = Observation(FlatSpectrum(1), self.bp, binset=self.binset[1:])
+        obs2.initbinflux()
+        assert_array_equal(obs2._bin_edges, obs1._bin_edges[1:])
+
+    def test_merge_sorted(self):
+        a = np.array([1, 2, 3, 5.])
+        b = np.array([2, 4, 5 + 1e-14, 6])
+        assert_array_equal(_merge_sorted(a, b),
+                           spectrum.MergeWaveSets(a, b))
+        assert _merge_sorted(a, None) is a
+
+
+class TestPhotometry(object):
+    """Test that Observation.photometry matches the individual methods."""
+    def setup_class(self):
+        wave = np.linspace(4000, 7000, 301)
+        bp = ArraySpectralElement(wave, np.exp(-((wave - 5500) / 500.) ** 2))
+        sp = ArraySourceSpectrum(np.linspace(3000, 8000, 50),
+                                 np.linspace(1, 3, 50), fluxunits='flam')
+        self.args = (sp, bp)
+        self.binset = np.arange(4100, 6900, 2.3)
+        self.units = ['photlam', 'flam', 'abmag', 'counts', 'obmag']
+
+    @pytest.mark.parametrize('binned', [True, False])
+    def test_photometry(self, binned):
+        obs = Observation(*self.args, binset=self.binset)
+        ans = obs.photometry(self.units, binned=binned)
+
+        assert obs.fluxunits.name == 'flam'
+        assert obs._binflux is None
+
+        assert ans['countrate'] == obs.countrate(binned=binned)
+        assert ans['pivot'] == obs.pivot(binned=binned)
+        assert ans['efflam'] == obs.efflam(binned=binned)
+        assert ans['equivwidth'] == obs.bandpass.equivwidth()
+        for u in self.units:
+            assert ans['effstim'][u] == obs.effstim(u)
+
+    def test_single_unit(self):
+        obs = Observation(*self.args, binset=self.binset)
+        ans = obs.photometry('stmag')
+        assert list(ans['effstim']) == ['stmag']
+
+
+def test_shared_units_threads():
+    """Test that the methods of a shared observation do not change its
+    units, so that they can be called from several threads."""
+    wave = np.linspace(4000, 7000, 301)
+    bp = ArraySpectralElement(wave, np.exp(-((wave - 5500) / 500.) ** 2))
+    sp = ArraySourceSpectrum(np.linspace(3000, 8000, 50),
+                             np.linspace(1, 3, 50), fluxunits='flam')
+    obs = Observation(sp, bp, binset=np.arange(4100, 6900, 2.3))
+
+    def calc(fluxunits):
+        return (obs.effstim(fluxunits), obs.countrate(), obs.efflam(),
+                obs.sample(5500.), obs.sample(5500., binned=False))
+
+    names = ['photlam', 'flam', 'abmag', 'counts', 'obmag'] * 20
+    ref = [calc(u) for u in names[:5]] * 20
+    with ThreadPoolExecutor(4) as pool:
+        ans = list(pool.map(calc, names))
+
+    assert ans == ref
+    assert obs.fluxunits.name == 'flam'
+
+
 @pytest.mark.remote_data
 class TestPixelWaveRangeMethods(object):
     """Test the Observation.pixel_range() and .wave_range() methods."""
@@ -43,3 +43,19 @@ def test_photbw(obsmode, ans):
     """
     band = ObsBandpass(obsmode)
     assert_allclose(band.photbw(), ans, rtol=1E-3)
+
+
+def test_get_arrays_units():
+    """Test that SpectralElement.getArrays does not change the units."""
+    wave = np.linspace(4000, 5000, 11)
+    s = ArraySpectralElement(wave, np.linspace(0.1, 1, 11), 'angstrom')
+    avg = s.avgwave()
+    s.convert('nm')
+
+    w, thru = s.getArrays('angstrom')
+    assert s.waveunits.name == 'nm'
+    assert_allclose(w, wave)
+    assert_allclose(thru, s.throughput)
+    assert_allclose(s.getArrays()[0], s.wave)
+    assert s.avgwave() == avg
+    assert s.waveunits.name == 'nm'
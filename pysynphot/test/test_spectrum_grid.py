@@ -0,0 +1,102 @@
+"""Tests for SpectrumGrid against the equivalent per-spectrum results."""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pytest
+
+from ..observation import Observation
+from ..spectrum import (ArraySourceSpectrum, ArraySpectralElement, Box,
+                        SpectrumGrid)
+
+
+class TestSpectrumGrid(object):
+    def setup_class(self):
+        self.wave = np.arange(3000, 9000, 5.0)
+        self.spectra = [
+            ArraySourceSpectrum(
+                wave=self.wave,
+                flux=np.exp(-((self.wave - center) / 2000.0) ** 2),
+                fluxunits='flam')
+            for center in (4000, 5000, 7000)]
+        self.grid = SpectrumGrid.from_spectra(self.spectra)
+        self.band = ArraySpectralElement(
+            np.arange(4500, 6500, 2.5),
+            np.sin(np.linspace(0, np.pi, 800)) ** 2)
+
+    def test_shape(self):
+        assert len(self.grid) == 3
+        assert self.grid.flux.shape == (3, self.wave.size)
+        assert self.grid.fluxunits.name == 'flam'
+        np.testing.assert_allclose(self.grid.flux[1], self.spectra[1].flux)
+
+    def test_getitem(self):
+        sp = self.grid[2]
+        assert isinstance(sp, ArraySourceSpectrum)
+        np.testing.assert_allclose(sp.flux, self.spectra[2].flux)
+        sub = self.grid[1:]
+        assert isinstance(sub, SpectrumGrid)
+        assert len(sub) == 2
+
+    def test_call(self):
+        w = np.array([2000.0, 4321.5, 8999.0, 9500.0])
+        ans = self.grid(w)
+        for i, sp in enumerate(self.spectra):
+            np.testing.assert_allclose(ans[i], sp(w), rtol=1e-12)
+        assert self.grid(5000.0).shape == (3,)
+
+    @pytest.mark.parametrize('fluxunits', ['photlam', 'flam', 'fnu'])
+    def test_integrate(self, fluxunits):
+        expected = [sp.integrate(fluxunits) for sp in self.spectra]
+        np.testing.assert_allclose(self.grid.integrate(fluxunits), expected,
+                                   rtol=1e-12)
+
+    @pytest.mark.parametrize(
+        'fluxunits',
+        ['photlam', 'flam', 'abmag', 'stmag', 'vegamag', 'counts', 'obmag'])
+    def test_effstim(self, fluxunits):
+        expected = [Observation(sp, self.band).effstim(fluxunits)
+                    for sp in self.spectra]
+        np.testing.assert_allclose(self.grid.effstim(self.band, fluxunits),
+                                   expected, rtol=1e-12)
+
+    @pytest.mark.parametrize(
+        ('values', 'fluxunits'),
+        [([15, 16, 17], 'vegamag'), ([1e-15, 2e-15, 3e-15], 'flam'),
+         (20, 'abmag')])
+    def test_renorm(self, values, fluxunits):
+        grid = self.grid.renorm(values, fluxunits, self.band)
+        values = np.broadcast_to(values, (3,))
+        for i, sp in enumerate(self.spectra):
+            expected = sp.renorm(values[i], fluxunits, self.band)
+            np.testing.assert_allclose(grid[i].flux, expected.flux,
+                                       rtol=1e-12)
+
+    def test_multiply(self):
+        box = Box(5000, 1000)
+        grid = self.grid * box
+        assert isinstance(box * self.grid, SpectrumGrid)
+        for i, sp in enumerate(self.spectra):
+            np.testing.assert_allclose(grid[i].flux, (sp * box).flux,
+                                       rtol=1e-12)
+        np.testing.assert_allclose(
+            (self.grid * np.array([1, 2, 3])).flux[2], 3 * self.grid.flux[2])
+
+    def test_redshift(self):
+        grid = self.grid.redshift(0.3)
+        for i, sp in enumerate(self.spectra):
+            expected = sp.redshift(0.3)
+            np.testing.assert_array_equal(grid[i].wave, expected.wave)
+            np.testing.assert_allclose(grid[i].flux, expected.flux,
+                                       rtol=1e-12)
+
+    def test_descending_waveunits(self):
+        hz = 2.99792458e18 / self.wave
+        grid = SpectrumGrid(hz, [sp.flux for sp in self.spectra],
+                            waveunits='hz', fluxunits='flam')
+        assert grid.GetWaveSet()[0] < grid.GetWaveSet()[-1]
+        np.testing.assert_allclose(grid(5000.0), self.grid(5000.0),
+                                   rtol=1e-10)
+
+    def test_mismatched(self):
+        with pytest.raises(ValueError):
+            SpectrumGrid(self.wave, np.ones((2, 3)))
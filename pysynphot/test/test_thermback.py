@@ -1,7 +1,10 @@
 from __future__ import absolute_import, division, print_function
 
+import numpy as np
 import pytest
+from astropy.io import fits
 
+from .. import Cache, refs
 from ..obsbandpass import ObsBandpass
 from ..observationmode import _ThermalObservationMode
 
@@ -31,3 +34,116 @@ def test_therm():
     _ThermalObservationMode(obsmode)
 
     assert bp.thermback() > 0
+
+
+class TestThermalCache(object):
+    def setup_method(self, method):
+        Cache.reset_thermal_cache()
+        Cache.reset_detector_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_thermal_cache()
+        Cache.reset_detector_cache()
+
+    def _write(self, tmpdir):
+        """Write graph, component, and thermal component tables for
+        ``nicmos,3,f1``, with emitting ``pri`` and ``filt`` components
+        and a transmissive detector after them."""
+        compnames = ['pri', 'relay', 'filt', 'det']
+        thcompnames = ['pri_th', 'clear', 'filt_th', 'clear']
+        wave = np.arange(10000, 30001, 500.0)
+        filenames = []
+        for i, name in enumerate(compnames):
+            fname = str(tmpdir.join(name + '.dat'))
+            thru = np.linspace(0.5, 0.9, wave.size) ** (i + 1)
+            with open(fname, 'w') as f:
+                for w, t in zip(wave, thru):
+                    f.write('%g %g\n' % (w, t))
+            filenames.append(fname)
+
+        thfilenames = []
+        for i, name in enumerate(['pri_th', 'filt_th']):
+            fname = str(tmpdir.join(name + '.fits'))
+            thwave = np.arange(9000 + 700 * i, 31000, 300.0 + 100 * i)
+            hdu = fits.BinTableHDU.from_columns([
+                fits.Column(name='WAVELENGTH', format='D', array=thwave,
+                            unit='ANGSTROM'),
+                fits.Column(name='EMISSIVITY', format='D',
+                            array=np.linspace(0.05, 0.2, thwave.size))])
+            hdu.header['DEFT'] = 280.0 - 30 * i
+            hdu.header['BEAMFILL'] = 1.0
+            hdu.writeto(fname)
+            thfilenames.append(fname)
+
+        tmg = str(tmpdir.join('test_tmg.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A', array=compnames),
+            fits.Column(name='KEYWORD', format='10A',
+                        array=['nicmos', '3', 'f1', 'default']),
+            fits.Column(name='INNODE', format='J', array=[1, 2, 3, 4]),
+            fits.Column(name='OUTNODE', format='J', array=[2, 3, 4, 5]),
+            fits.Column(name='THCOMPNAME', format='10A',
+                        array=thcompnames)]).writeto(tmg)
+
+        tmc = str(tmpdir.join('test_tmc.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A', array=compnames),
+            fits.Column(name='FILENAME', format='200A',
+                        array=filenames)]).writeto(tmc)
+
+        tmt = str(tmpdir.join('test_tmt.fits'))
+        fits.BinTableHDU.from_columns([
+            fits.Column(name='COMPNAME', format='10A',
+                        array=['pri_th', 'filt_th']),
+            fits.Column(name='FILENAME', format='200A',
+                        array=thfilenames)]).writeto(tmt)
+        return tmg, tmc, tmt
+
+    def test_cached(self, tmpdir, monkeypatch):
+        tmg, tmc, tmt = self._write(tmpdir)
+        monkeypatch.setattr(refs, 'THERMTABLE', tmt)
+        bp = ObsBandpass('nicmos,3,f1', graphtable=tmg, comptable=tmc)
+        ans = bp.thermback()
+        assert ans > 0
+        assert bp.obsmode.pixscale == 0.2
+        assert len(Cache.DETECTOR_CACHE) == 1
+
+        sp1 = bp.obsmode.ThermalSpectrum()
+        sp2 = bp.obsmode.ThermalSpectrum()
+        assert sp2 is not sp1
+        stats = Cache.THERMAL_CACHE.stats()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (1, 2, 1)
+        assert bp.thermback() == ans
+
+        # Same as building the thermal model from scratch.
+        thom = _ThermalObservationMode('nicmos,3,f1', graphtable=tmg,
+                                       comptable=tmc, thermtable=tmt)
+        np.testing.assert_array_equal(thom._getSpectrum()(sp1.wave),
+                                      sp1(sp1.wave))
+
+    def test_temperatures(self, tmpdir, monkeypatch):
+        tmg, tmc, tmt = self._write(tmpdir)
+        monkeypatch.setattr(refs, 'THERMTABLE', tmt)
+        bp = ObsBandpass('nicmos,3,f1', graphtable=tmg, comptable=tmc)
+        temps = np.linspace(240, 300, 7)
+
+        ans = bp.thermback(temperatures={'PRI_TH': temps})
+        assert ans.shape == (7,)
+        assert bp.thermback(temperatures={}) == bp.thermback()
+
+        # Same as changing the default temperature of the component.
+        for t, x in zip(temps, ans):
+            thom = _ThermalObservationMode('nicmos,3,f1', graphtable=tmg,
+                                           comptable=tmc, thermtable=tmt)
+            thom.components[0].emissivity.temperature = t
+            sp = thom._getSpectrum()
+            assert x == sp.integrate() * 0.2 ** 2 * bp.obsmode.primary_area
+
+        grid = bp.obsmode.ThermalSpectrum(
+            temperatures={'pri_th': temps, 'filt_th': temps[::-1]})
+        assert len(grid) == 7
+        assert grid.flux[3].tolist() == bp.obsmode.ThermalSpectrum(
+            temperatures={'filt_th': 270.0, 'pri_th': 270.0}).flux[0].tolist()
+
+        with pytest.raises(KeyError):
+            bp.thermback(temperatures={'det': 300})
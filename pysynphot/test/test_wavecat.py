@@ -1,8 +1,13 @@
 from __future__ import absolute_import, division, print_function
 
+import os
+
+import numpy as np
 import pytest
 from numpy.testing import assert_array_equal
 
+from .. import Cache
+from ..observationmode import BaseObservationMode
 from ..wavetable import wavetable
 
 
@@ -20,3 +25,89 @@ def test_match(obs, ans):
 def test_missing():
     with pytest.raises(KeyError):
         wavetable.__getitem__('johnson,v')
+
+
+def _linear_lookup(obs):
+    """Partial look-up by scanning every key, as done before the
+    inverted index."""
+    setkey = set(obs.split(','))
+    candidates = [k for k in wavetable.setlookup if k.issubset(setkey)]
+    if len(candidates) == 0:
+        raise KeyError("%s not found in %s; candidates:%s" %
+                       (setkey, wavetable.file, str(candidates)))
+    if len(candidates) == 1:
+        return wavetable.setlookup[candidates[0]]
+    setlens = np.array([len(k) for k in candidates])
+    srtlen = setlens.argsort()
+    k, j = srtlen[-2:]
+    if setlens[k] == setlens[j]:
+        raise ValueError("Ambiguous key %s; candidates %s" %
+                         (setkey, candidates))
+    return wavetable.setlookup[candidates[srtlen[-1]]]
+
+
+@pytest.mark.parametrize('obs', ['stis,g230l,extra', 'acs,hrc,f550m,mjd#54000',
+                                 'nicmos,3,f220m,x', 'wfc3,uvis1,f555w',
+                                 'stis,nuvmama,e230h,c2263,s02x02',
+                                 'stis,fuvmama,g140l,s52x2',
+                                 'cos,fuv,nuv', 'cos,fuv,wfc3,ir',
+                                 'johnson,v'])
+def test_index(obs):
+    """Look-up with the inverted index matches a linear scan."""
+    try:
+        ans = _linear_lookup(obs)
+    except (KeyError, ValueError) as e:
+        with pytest.raises(type(e)) as exc:
+            wavetable[obs]
+        assert str(exc.value) == str(e)
+    else:
+        assert wavetable[obs] == ans
+
+
+class TestBandWave(object):
+    def setup_method(self, method):
+        Cache.reset_binset_cache()
+
+    def teardown_method(self, method):
+        Cache.reset_binset_cache()
+
+    def _obsmode(self, binset):
+        ob = BaseObservationMode.__new__(BaseObservationMode)
+        ob.binset = binset
+        return ob
+
+    def test_coeffs(self):
+        coeff = '(1497.0,1699.0,0.0066,0.0075)'
+        ob = self._obsmode(coeff)
+        wave = ob.bandWave()
+        assert not wave.flags.writeable
+        assert self._obsmode(coeff).bandWave() is wave
+        stats = Cache.BINSET_CACHE.stats()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+        assert stats['nbytes'] == wave.nbytes
+
+        a, b, c, nwave = ob._computeQuadraticCoefficients(coeff)
+        assert_array_equal(wave, [((a * i) + b) * i + c for i in range(nwave)])
+
+    def test_file(self, tmpdir):
+        fname = str(tmpdir.join('bins.dat'))
+        with open(fname, 'w') as f:
+            f.write('# wave\n1000\n1010\n1030\n')
+        wave = self._obsmode(fname).bandWave()
+        assert_array_equal(wave, [1000, 1010, 1030])
+        assert self._obsmode(fname).bandWave() is wave
+
+        # A changed file is read again.
+        with open(fname, 'w') as f:
+            f.write('1000\n1020\n1030\n1040\n')
+        os.utime(fname, (0, 0))
+        assert_array_equal(self._obsmode(fname).bandWave(),
+                           [1000, 1020, 1030, 1040])
+
+    def test_budget(self, monkeypatch):
+        monkeypatch.setattr(Cache.BINSET_CACHE, 'maxbytes', 10000)
+        for i in range(5):
+            self._obsmode('(1000.0,%d.0,1.0,1.0)' % (2000 + i)).bandWave()
+        stats = Cache.BINSET_CACHE.stats()
+        assert stats['nbytes'] <= 10000
+        assert stats['evictions'] > 0
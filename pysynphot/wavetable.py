@@ -90,6 +90,12 @@ class Wavetable(object):
     setlookup : dict
         Same as ``lookup`` but the ``obsmode`` string is converted into a frozen set consisting of its components. This is used for partial look-up if there is no direct match.
 
+    keyindex : dict
+        Inverted index of ``setlookup``, mapping each ``obsmode``
+        component to the keys of ``setlookup`` that contain it. Partial
+        look-up only examines the keys sharing a component with the
+        input.
+
     Raises
     ------
     ValueError
@@ -108,6 +114,7 @@ class Wavetable(object):
         self.file=fname
         self.lookup={}
         self.setlookup={}
+        self.keyindex={}
         fs = open(wavecat_file, mode='r')
         lines = fs.readlines()
         fs.close()
@@ -122,6 +129,12 @@ class Wavetable(object):
                 except ValueError:
                     raise ValueError("Error processing line: %s"%line)
 
+        # Keys are listed in file order, as are the candidates below.
+        for k in self.setlookup:
+            for m in k:
+                self.keyindex.setdefault(m, []).append(k)
+        self._order = dict((k, i) for i, k in enumerate(self.setlookup))
+
     def __getitem__(self, key):
         """Fairly smart lookup: if no exact match, find the most complete
         match."""
@@ -134,10 +147,13 @@ class Wavetable(object):
             #Try a setwise match.
             #The correct key will be a subset of the input key.
             setkey=set(key.split(','))
-            candidates=[]
-            for k in self.setlookup:
-                if k.issubset(setkey):
-                    candidates.append(k)
+            #Count the components of each key found in the input key.
+            counts={}
+            for m in setkey:
+                for k in self.keyindex.get(m, ()):
+                    counts[k] = counts.get(k, 0) + 1
+            candidates=sorted([k for k in counts if counts[k] == len(k)],
+                              key=self._order.get)
             #We may have 1, 0, or >1 candidates.
             if len(candidates) == 1:
                 ans = self.setlookup[candidates[0]]